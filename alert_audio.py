@@ -0,0 +1,301 @@
+"""Spoken proximity alerts, composed on the server from the sound pack.
+
+The pack (see VOICE_GENERATION.md) holds one short clip per phrase:
+
+    sounds/<language>/intro/ufo_spotted.mp3
+    sounds/<language>/distances/25.mp3 ...
+    sounds/<language>/units/kilometers.mp3 ...
+    sounds/<language>/directions/north_northeast.mp3 ...
+
+Rather than have every phone fetch and queue half a dozen of them per
+alert, the segments of one alert are joined frame by frame into a single
+MP3 for each (language, distance bucket, direction, unit). Distances are
+rounded to DISTANCE_BUCKETS and bearings to 16 compass points, so the set
+of clips is small and finite. Composed clips are kept in an LRU in memory
+and under CACHE_DIR on disk, in a directory named after the pack's
+fingerprint so that a re-recorded pack never serves stale audio.
+
+Pre-compose every clip ahead of time with UFOBEEP_PREWARM_ALERT_AUDIO=1,
+or offline with:
+
+    python alert_audio.py prewarm
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from atomic_files import write_atomic
+
+SOUND_DIR = os.environ.get("UFOBEEP_SOUND_DIR", "sounds")
+CACHE_DIR = os.environ.get("UFOBEEP_ALERT_AUDIO_CACHE", "audio/alerts")
+PREWARM = os.environ.get("UFOBEEP_PREWARM_ALERT_AUDIO", "") not in ("", "0")
+ALERT_AUDIO_CACHE_SIZE = 256
+
+DISTANCE_BUCKETS = (1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 15, 20, 25, 30, 40, 50, 60, 70, 80, 90,
+                    100, 150, 200, 250, 300, 400, 500)
+DIRECTIONS = ("north", "north_northeast", "northeast", "east_northeast",
+              "east", "east_southeast", "southeast", "south_southeast",
+              "south", "south_southwest", "southwest", "west_southwest",
+              "west", "west_northwest", "northwest", "north_northwest")
+UNITS = {"km": ("units/kilometers", 1.0), "mi": ("units/miles", 0.621371)}
+DEFAULT_LANGUAGE = "en"
+DEFAULT_UNIT = "km"
+
+# Placeholders in an alert script, filled in per clip
+DISTANCE, UNIT, DIRECTION = "{distance}", "{unit}", "{direction}"
+ALERT_SCRIPTS = {
+    # "UFO spotted twenty five kilometers north northeast of you. Go outside and look up now!"
+    "en": ("intro/ufo_spotted", DISTANCE, UNIT, DIRECTION, "prepositions/of_you", "calls_to_action/go_outside_now"),
+    # "OVNI avistado veinticinco kilómetros. Mira hacia el noreste. ¡Sal afuera y mira hacia arriba ahora!"
+    "es": ("intro/ovni_avistado", DISTANCE, UNIT, "calls_to_action/mira_hacia", DIRECTION, "calls_to_action/sal_afuera"),
+}
+
+# (language, distance bucket, direction, unit)
+ClipKey = Tuple[str, int, str, str]
+
+# MPEG audio layer III frame headers: bitrates in kbps by version, sample rates in Hz
+_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+def distance_bucket(distance_km: float, unit: str = DEFAULT_UNIT) -> int:
+    """Nearest DISTANCE_BUCKETS entry to a distance, in the given unit"""
+    distance = distance_km * UNITS[unit][1]
+    index = bisect_left(DISTANCE_BUCKETS, distance)
+    if index == len(DISTANCE_BUCKETS):
+        return DISTANCE_BUCKETS[-1]
+    if index and distance - DISTANCE_BUCKETS[index - 1] < DISTANCE_BUCKETS[index] - distance:
+        return DISTANCE_BUCKETS[index - 1]
+    return DISTANCE_BUCKETS[index]
+
+def compass_direction(bearing: float) -> str:
+    return DIRECTIONS[int(round((bearing % 360) / 22.5)) % 16]
+
+def number_segments(number: int, spoken: set) -> List[str]:
+    """distances/ clips that read out a number, preferring whole-number clips when the pack has them"""
+    if str(number) in spoken:
+        return [f"distances/{number}"]
+    if number >= 100:
+        hundreds, rest = divmod(number, 100)
+        head = ([f"distances/{hundreds * 100}"] if str(hundreds * 100) in spoken
+                else [f"distances/{hundreds}", "distances/hundred"])
+        return head + (number_segments(rest, spoken) if rest else [])
+    if number > 20 and number % 10:
+        return [f"distances/{number - number % 10}", f"distances/{number % 10}"]
+    return [f"distances/{number}"]
+
+def _frame_length(header: bytes) -> Optional[int]:
+    """Length of the MPEG layer III frame starting with these four bytes, if it is one"""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x03
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (header[2] >> 1) & 0x01
+    return (144 if version == 3 else 72) * bitrate // sample_rate + padding
+
+def mp3_frames(data: bytes) -> bytes:
+    """The audio frames of an MP3 file, without ID3 tags or a Xing/Info/VBRI header frame.
+
+    Frames from several files can then be joined into one valid stream;
+    a leftover VBR header would make players stop after the first segment.
+    """
+    start, end = 0, len(data)
+    while data[start:start + 3] == b"ID3" and end - start >= 10:
+        size = data[start + 6] << 21 | data[start + 7] << 14 | data[start + 8] << 7 | data[start + 9]
+        footer = 10 if data[start + 5] & 0x10 else 0
+        start += 10 + size + footer
+    if end - start >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+
+    # Skip any junk before the first frame sync
+    while start < end - 4 and _frame_length(data[start:start + 4]) is None:
+        start += 1
+    length = _frame_length(data[start:start + 4])
+    if length is not None:
+        first_frame = data[start:start + length]
+        if b"Xing" in first_frame[:64] or b"Info" in first_frame[:64] or first_frame[36:40] == b"VBRI":
+            start += length
+    return data[start:end]
+
+class AlertAudio:
+    """Composed alert clips for the languages the sound pack covers.
+
+    load() scans the pack; a language only counts once every fixed segment
+    of its script is present, and clip_url() returns None for the rest, in
+    which case clients fall back to speech synthesis. Concurrent requests
+    for a clip that is not cached yet share one composition.
+    """
+
+    def __init__(self, sound_dir: str = SOUND_DIR, cache_dir: str = CACHE_DIR, size: int = ALERT_AUDIO_CACHE_SIZE):
+        self.sound_dir = sound_dir
+        self.cache_dir = cache_dir
+        self.size = size
+        self.clips: "OrderedDict[ClipKey, bytes]" = OrderedDict()
+        self.pending: Dict[ClipKey, asyncio.Future] = {}
+        # Language -> fingerprint of its pack, and the numbers it has clips for
+        self.versions: Dict[str, str] = {}
+        self.spoken: Dict[str, set] = {}
+        self.prewarm_task: Optional[asyncio.Task] = None
+        self.stopping = False
+
+    def load(self):
+        """Find the usable languages in sound_dir; blocking, so run it in a thread"""
+        self.versions.clear()
+        self.spoken.clear()
+        self.clips.clear()
+        for language, script in ALERT_SCRIPTS.items():
+            root = os.path.join(self.sound_dir, language)
+            fixed = [segment for segment in script if segment not in (DISTANCE, UNIT, DIRECTION)]
+            if not all(os.path.isfile(os.path.join(root, f"{segment}.mp3")) for segment in fixed):
+                continue
+
+            fingerprint = hashlib.sha1()
+            for directory, _, names in sorted(os.walk(root)):
+                for name in sorted(names):
+                    stat_result = os.stat(os.path.join(directory, name))
+                    fingerprint.update(f"{directory}/{name}:{stat_result.st_mtime_ns}:{stat_result.st_size}\n".encode())
+            self.versions[language] = fingerprint.hexdigest()[:12]
+
+            distances = os.path.join(root, "distances")
+            self.spoken[language] = {
+                os.path.splitext(name)[0] for name in (os.listdir(distances) if os.path.isdir(distances) else ())
+            }
+        print(f"Alert audio available for: {', '.join(self.versions) or 'no languages'}")
+
+    def clip_key(self, language: Optional[str], distance_km: float, bearing: float,
+                 unit: Optional[str] = None) -> Optional[ClipKey]:
+        language = language or DEFAULT_LANGUAGE
+        unit = unit if unit in UNITS else DEFAULT_UNIT
+        if language not in self.versions:
+            return None
+        return language, distance_bucket(distance_km, unit), compass_direction(bearing), unit
+
+    def clip_url(self, language: Optional[str], distance_km: float, bearing: float,
+                 unit: Optional[str] = None) -> Optional[str]:
+        key = self.clip_key(language, distance_km, bearing, unit)
+        if key is None:
+            return None
+        language, distance, direction, unit = key
+        return f"/alerts/audio/{language}/{unit}/{distance}/{direction}.mp3"
+
+    def is_valid(self, key: ClipKey) -> bool:
+        language, distance, direction, unit = key
+        return language in self.versions and distance in DISTANCE_BUCKETS and direction in DIRECTIONS and unit in UNITS
+
+    def etag(self, key: ClipKey) -> str:
+        return f'"{self.versions[key[0]]}-{"-".join(map(str, key))}"'
+
+    async def get(self, key: ClipKey) -> Optional[bytes]:
+        """The composed clip, or None if the pack is missing one of its segments"""
+        clip = self.clips.get(key)
+        if clip is not None:
+            self.clips.move_to_end(key)
+            return clip
+
+        pending = self.pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
+        try:
+            clip = await asyncio.to_thread(self.compose, key)
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters see the error; nobody else has to retrieve it
+            future.exception()
+            raise
+        else:
+            future.set_result(clip)
+        finally:
+            del self.pending[key]
+
+        if clip is not None:
+            self.clips[key] = clip
+            while len(self.clips) > self.size:
+                self.clips.popitem(last=False)
+        return clip
+
+    def compose(self, key: ClipKey) -> Optional[bytes]:
+        """Read a clip from the disk cache, or join its segments and store it there"""
+        language, distance, direction, unit = key
+        path = os.path.join(self.cache_dir, self.versions[language], f"{language}-{unit}-{distance}-{direction}.mp3")
+        try:
+            with open(path, "rb") as cached:
+                return cached.read()
+        except FileNotFoundError:
+            pass
+
+        segments = []
+        for segment in ALERT_SCRIPTS[language]:
+            if segment == DISTANCE:
+                segments.extend(number_segments(distance, self.spoken[language]))
+            elif segment == UNIT:
+                segments.append(UNITS[unit][0])
+            elif segment == DIRECTION:
+                segments.append(f"directions/{direction}")
+            else:
+                segments.append(segment)
+
+        frames = []
+        for segment in segments:
+            try:
+                with open(os.path.join(self.sound_dir, language, f"{segment}.mp3"), "rb") as source:
+                    frames.append(mp3_frames(source.read()))
+            except FileNotFoundError:
+                return None
+        clip = b"".join(frames)
+        write_atomic(path, clip, prefix=".clip-")
+        return clip
+
+    def keys(self):
+        for language in self.versions:
+            for unit in UNITS:
+                for distance in DISTANCE_BUCKETS:
+                    for direction in DIRECTIONS:
+                        yield language, distance, direction, unit
+
+    def prewarm(self) -> int:
+        """Compose every clip onto disk; blocking. Returns how many could be built"""
+        composed = 0
+        for key in self.keys():
+            if self.stopping:
+                break
+            composed += self.compose(key) is not None
+        return composed
+
+    async def start(self, prewarm: bool = PREWARM):
+        self.stopping = False
+        await asyncio.to_thread(self.load)
+        if prewarm and self.versions:
+            self.prewarm_task = asyncio.create_task(asyncio.to_thread(self.prewarm))
+
+    async def stop(self):
+        if self.prewarm_task is not None:
+            # The thread notices between clips
+            self.stopping = True
+            await asyncio.gather(self.prewarm_task, return_exceptions=True)
+            self.prewarm_task = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UFOBeep alert audio")
+    parser.add_argument("command", choices=["prewarm"])
+    parser.add_argument("--sound-dir", default=SOUND_DIR)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    args = parser.parse_args()
+
+    audio = AlertAudio(args.sound_dir, args.cache_dir)
+    audio.load()
+    print(f"Composed {audio.prewarm()} alert clips into {args.cache_dir}")
@@ -0,0 +1,291 @@
+"""Pub/sub between API workers for new-sighting events and WebSocket presence.
+
+Each uvicorn worker holds its own sockets, so an upload handled by one
+worker has to reach the others before they can alert their subscribers.
+Every worker publishes to the bus and handles every message, its own
+included; the handler is told whether a message came from this process.
+
+Pick the backend with UFOBEEP_ALERT_BUS:
+
+    local                  single process, no broker (default)
+    sqlite[:path]          SQLite broker file shared by the workers of one host
+    redis://host:port/db   Redis pub/sub, for workers spread across hosts
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+import aiosqlite
+
+ALERT_BUS_URL = os.environ.get("UFOBEEP_ALERT_BUS", "local")
+
+SQLITE_BUS_PATH = "alert_bus.db"
+POLL_INTERVAL_SECONDS = 0.05
+EVENT_RETENTION_SECONDS = 60
+
+# Each worker publishes how many subscribers it holds, refreshed this often;
+# a worker that stops doing so (e.g. it was killed) is left out of the count
+# after PRESENCE_TTL_SECONDS
+HEARTBEAT_SECONDS = 5
+PRESENCE_TTL_SECONDS = 3 * HEARTBEAT_SECONDS
+
+REDIS_CHANNEL = "ufobeep:alerts"
+REDIS_PRESENCE_KEY = "ufobeep:presence"
+
+Handler = Callable[[dict, bool], Awaitable[None]]
+
+class AlertBus:
+    """In-process bus: messages go straight to the handler.
+
+    Also the interface of the cross-process backends below.
+    """
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self.handler: Optional[Handler] = None
+        self.present: Dict[str, float] = {}
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+
+    async def stop(self):
+        self.handler = None
+
+    async def publish(self, message: dict):
+        # Local subscribers are served straight away, not after a round trip through the broker
+        await self._dispatch(message, self.worker_id)
+        await self._send(message)
+
+    async def _send(self, message: dict):
+        """Hand message to the other workers"""
+
+    async def connected(self, user_id: str):
+        self.present[user_id] = time.time()
+
+    async def disconnected(self, user_id: str):
+        self.present.pop(user_id, None)
+
+    async def connection_count(self) -> int:
+        """WebSocket subscribers across all workers"""
+        return len(self.present)
+
+    async def _dispatch(self, message: dict, origin: str):
+        if self.handler is None:
+            return
+        try:
+            await self.handler(message, origin == self.worker_id)
+        except Exception as e:
+            print(f"Alert bus handler failed: {e}")
+
+class SQLiteAlertBus(AlertBus):
+    """Broker table in a SQLite file that every worker polls.
+
+    Good for several workers on one host. Delivery lags by at most
+    POLL_INTERVAL_SECONDS; events are kept for EVENT_RETENTION_SECONDS.
+    """
+
+    def __init__(self, path: str = SQLITE_BUS_PATH):
+        super().__init__()
+        self.path = path
+        self.db: Optional[aiosqlite.Connection] = None
+        self.last_event_id = 0
+        self.tasks = []
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        self.db = await aiosqlite.connect(self.path)
+        await self.db.execute("PRAGMA journal_mode=WAL")
+        await self.db.execute("PRAGMA synchronous=NORMAL")
+        await self.db.execute("PRAGMA busy_timeout=5000")
+        await self.db.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                origin TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        # One row per worker, so counting reads a handful of rows rather than one per subscriber
+        await self.db.execute("""
+            CREATE TABLE IF NOT EXISTS workers (
+                worker TEXT PRIMARY KEY,
+                connections INTEGER NOT NULL,
+                updated REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        await self.db.commit()
+
+        # Only deliver what is published from now on
+        cursor = await self.db.execute("SELECT COALESCE(MAX(id), 0) FROM events")
+        self.last_event_id = (await cursor.fetchone())[0]
+
+        self.tasks = [asyncio.create_task(self._poll()), asyncio.create_task(self._heartbeat())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.db is not None:
+            await self.db.execute("DELETE FROM workers WHERE worker = ?", (self.worker_id,))
+            await self.db.commit()
+            await self.db.close()
+            self.db = None
+        await super().stop()
+
+    async def _send(self, message: dict):
+        await self.db.execute(
+            "INSERT INTO events (origin, payload, created) VALUES (?, ?, ?)",
+            (self.worker_id, json.dumps(message), time.time())
+        )
+        await self.db.commit()
+
+    async def connected(self, user_id: str):
+        await super().connected(user_id)
+        await self._write_presence()
+        await self.db.commit()
+
+    async def disconnected(self, user_id: str):
+        await super().disconnected(user_id)
+        await self._write_presence()
+        await self.db.commit()
+
+    async def connection_count(self) -> int:
+        cursor = await self.db.execute(
+            "SELECT COALESCE(SUM(connections), 0) FROM workers WHERE updated > ?", (time.time() - PRESENCE_TTL_SECONDS,)
+        )
+        return (await cursor.fetchone())[0]
+
+    async def _write_presence(self):
+        await self.db.execute(
+            "INSERT OR REPLACE INTO workers (worker, connections, updated) VALUES (?, ?, ?)",
+            (self.worker_id, len(self.present), time.time())
+        )
+
+    async def _poll(self):
+        while True:
+            try:
+                cursor = await self.db.execute(
+                    "SELECT id, origin, payload FROM events WHERE id > ? ORDER BY id", (self.last_event_id,)
+                )
+                rows = await cursor.fetchall()
+            except aiosqlite.OperationalError as e:
+                print(f"Alert bus poll failed: {e}")
+                rows = []
+            for event_id, origin, payload in rows:
+                self.last_event_id = event_id
+                if origin != self.worker_id:
+                    await self._dispatch(json.loads(payload), origin)
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            now = time.time()
+            try:
+                await self._write_presence()
+                await self.db.execute("DELETE FROM workers WHERE updated <= ?", (now - PRESENCE_TTL_SECONDS,))
+                await self.db.execute("DELETE FROM events WHERE created <= ?", (now - EVENT_RETENTION_SECONDS,))
+                await self.db.commit()
+            except aiosqlite.OperationalError as e:
+                print(f"Alert bus heartbeat failed: {e}")
+
+class RedisAlertBus(AlertBus):
+    """Redis pub/sub channel plus a presence hash with one field per worker.
+
+    Pass client to use an existing redis.asyncio client (or a fake in
+    tests); otherwise one is created from url. Requires the redis package.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", client=None):
+        super().__init__()
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url)
+        self.redis = client
+        self.pubsub = None
+        self.tasks = []
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        self.pubsub = self.redis.pubsub()
+        await self.pubsub.subscribe(REDIS_CHANNEL)
+        self.tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._heartbeat())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.pubsub is not None:
+            await self.pubsub.unsubscribe(REDIS_CHANNEL)
+            await self.pubsub.aclose()
+            self.pubsub = None
+        await self.redis.hdel(REDIS_PRESENCE_KEY, self.worker_id)
+        await super().stop()
+
+    async def _send(self, message: dict):
+        await self.redis.publish(REDIS_CHANNEL, json.dumps({"origin": self.worker_id, "message": message}))
+
+    async def connected(self, user_id: str):
+        await super().connected(user_id)
+        await self._write_presence()
+
+    async def disconnected(self, user_id: str):
+        await super().disconnected(user_id)
+        await self._write_presence()
+
+    async def connection_count(self) -> int:
+        fresh = time.time() - PRESENCE_TTL_SECONDS
+        total = 0
+        for value in (await self.redis.hgetall(REDIS_PRESENCE_KEY)).values():
+            connections, updated = json.loads(value)
+            if updated > fresh:
+                total += connections
+        return total
+
+    async def _write_presence(self):
+        await self.redis.hset(REDIS_PRESENCE_KEY, self.worker_id, json.dumps([len(self.present), time.time()]))
+
+    async def _listen(self):
+        while True:
+            try:
+                async for item in self.pubsub.listen():
+                    if item["type"] != "message":
+                        continue
+                    envelope = json.loads(item["data"])
+                    if envelope["origin"] != self.worker_id:
+                        await self._dispatch(envelope["message"], envelope["origin"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Connection dropped; the client reconnects on the next read
+                print(f"Alert bus subscription failed: {e}")
+                await asyncio.sleep(1)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                await self._write_presence()
+                # Workers that died without removing their field
+                stale = time.time() - PRESENCE_TTL_SECONDS
+                dead = [worker for worker, value in (await self.redis.hgetall(REDIS_PRESENCE_KEY)).items()
+                        if json.loads(value)[1] <= stale]
+                if dead:
+                    await self.redis.hdel(REDIS_PRESENCE_KEY, *dead)
+            except Exception as e:
+                print(f"Alert bus heartbeat failed: {e}")
+
+def create_alert_bus(url: str = ALERT_BUS_URL) -> AlertBus:
+    """Backend for a UFOBEEP_ALERT_BUS value"""
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisAlertBus(url)
+    if url == "sqlite" or url.startswith("sqlite:"):
+        return SQLiteAlertBus(url.partition(":")[2] or SQLITE_BUS_PATH)
+    if url == "local":
+        return AlertBus()
+    raise ValueError(f"Unknown UFOBEEP_ALERT_BUS: {url}")
@@ -0,0 +1,32 @@
+"""Writing files so that readers never see a partial one.
+
+Data goes to a temporary file in the target's directory, which is then
+renamed over the target: os.replace is atomic within one filesystem, so a
+concurrent reader (another worker, nginx) sees the old file or the new one.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator
+
+@contextmanager
+def atomic_path(path: str, prefix: str = ".", suffix: str = ".part") -> Iterator[str]:
+    """A temporary path to write to; moved onto path if the block succeeds, removed if it raises"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=prefix, suffix=suffix)
+    os.close(fd)
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+def write_atomic(path: str, data: bytes, prefix: str = "."):
+    with atomic_path(path, prefix) as temp_path:
+        with open(temp_path, "wb") as target:
+            target.write(data)
@@ -0,0 +1,55 @@
+"""Per-point cost of the vectorised distance/bearing kernels vs. the scalar loop.
+
+    python benchmarks/bench_geometry.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geometry import calculate_bearing, calculate_distance, haversine_km, initial_bearing_deg
+
+ORIGIN = (36.17, -115.14)
+
+def best_of(repeats, func):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def scalar_loop(lats, lons):
+    lat, lon = ORIGIN
+    for lat2, lon2 in zip(lats, lons):
+        calculate_distance(lat, lon, lat2, lon2)
+        calculate_bearing(lat, lon, lat2, lon2)
+
+def vectorised(lats, lons):
+    haversine_km(ORIGIN[0], ORIGIN[1], lats, lons)
+    initial_bearing_deg(ORIGIN[0], ORIGIN[1], lats, lons)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'points':>10}  {'loop ns/pt':>11}  {'numpy ns/pt':>11}  {'speedup':>8}")
+    for size in args.sizes:
+        lats = rng.uniform(-90, 90, size)
+        lons = rng.uniform(-180, 180, size)
+        # The loop gets Python floats, as it would from SQLite rows
+        lat_list, lon_list = lats.tolist(), lons.tolist()
+
+        loop = best_of(args.repeats, lambda: scalar_loop(lat_list, lon_list))
+        vector = best_of(args.repeats, lambda: vectorised(lats, lons))
+        print(f"{size:>10}  {loop / size * 1e9:>11.1f}  {vector / size * 1e9:>11.1f}  {loop / vector:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
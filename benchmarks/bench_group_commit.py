@@ -0,0 +1,65 @@
+"""Sustained save_sighting throughput with and without group commit.
+
+    python benchmarks/bench_group_commit.py [--clients 1 16 256] [--rows 5000]
+
+Each client inserts its share of rows back to back, like a burst of
+uploads. "per-row" commits every insert on its own (the old behaviour);
+"grouped" uses the default SightingWriter settings and "linger" also holds
+each batch open for 2ms.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import SightingWriter, save_sighting
+
+MODES = {
+    "per-row": dict(max_rows=1, delay=0),
+    "grouped": dict(),
+    "linger": dict(delay=0.002),
+}
+
+async def client(index: int, count: int):
+    for n in range(count):
+        await save_sighting(
+            f"burst-{index}-{n}.jpg", f"static/uploads/burst-{index}-{n}.jpg",
+            36.17 + (n % 100) * 0.001, -115.14 - index * 0.001, n % 360,
+            "2025-08-02T21:00:00Z", f"device-{index}", None
+        )
+
+async def run(mode: str, clients: int, rows: int) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        database.DB_PATH = os.path.join(directory, "bench.db")
+        await database.init_db()
+        try:
+            await database.writer.stop()
+            database.writer = SightingWriter(**MODES[mode])
+            database.writer.start()
+
+            per_client = rows // clients
+            start = time.perf_counter()
+            await asyncio.gather(*(client(index, per_client) for index in range(clients)))
+            return per_client * clients / (time.perf_counter() - start)
+        finally:
+            await database.close_db()
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16, 256])
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'clients':>8} {'mode':>8} {'inserts/s':>10}")
+    for clients in args.clients:
+        for mode in MODES:
+            rate = await run(mode, clients, args.rows)
+            print(f"{clients:>8} {mode:>8} {rate:>10.0f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,336 @@
+"""Load test of the API against a local uvicorn server.
+
+    python benchmarks/load_test.py [--rows 10000 100000 1000000] [--duration 10]
+                                   [--concurrency 32] [--ws-clients 500]
+                                   [--output benchmarks/results/<timestamp>.json]
+
+For every database size a copy of a seeded database (see seed.py; cached in
+--data-dir) is served by a fresh server in a scratch directory, so repeated
+runs start from identical data. Each HTTP scenario keeps --concurrency
+requests in flight for --duration seconds. The websocket scenario connects
+--ws-clients subscribers around one point and times alert delivery from the
+start of each upload until every subscriber has received it.
+
+Results are printed as a table and saved as JSON; compare two runs with
+
+    python benchmarks/load_test.py --compare old.json new.json
+
+Needs httpx and websockets on top of requirements.txt.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+import websockets
+from PIL import Image
+
+from seed import REPO, device_ids, load_templates, seed
+
+DATA_DIR = os.path.join(REPO, "benchmarks", "data")
+RESULTS_DIR = os.path.join(REPO, "benchmarks", "results")
+SERVER_START_TIMEOUT_SECONDS = 120
+ALERT_TIMEOUT_SECONDS = 10
+WS_ALERTS = 20
+WS_ORIGIN = (36.17, -115.14)
+
+SCENARIOS = ["sightings", "sightings_page", "nearby", "nearby_24h", "stats", "identicon", "upload"]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def jpeg_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (20, 20, 40)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+class Server:
+    """uvicorn serving main:app from a scratch directory with its own database copy"""
+
+    def __init__(self, db_source: str, workers: int):
+        self.db_source = db_source
+        self.workers = workers
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.directory = None
+        self.process = None
+
+    async def __aenter__(self):
+        self.directory = tempfile.mkdtemp(prefix="ufobeep-load-")
+        os.makedirs(os.path.join(self.directory, "static", "uploads"))
+        db_path = os.path.join(self.directory, "sightings.db")
+        shutil.copyfile(self.db_source, db_path)
+
+        env = dict(os.environ, PYTHONPATH=REPO, UFOBEEP_DB_PATH=db_path)
+        if self.workers > 1:
+            env.setdefault("UFOBEEP_ALERT_BUS", f"sqlite:{os.path.join(self.directory, 'alert_bus.db')}")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(self.port),
+             "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=self.directory, env=env, stdout=subprocess.DEVNULL
+        )
+
+        deadline = time.monotonic() + SERVER_START_TIMEOUT_SECONDS
+        async with httpx.AsyncClient() as client:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError("Server exited during startup")
+                try:
+                    await client.get(f"{self.url}/")
+                    return self
+                except httpx.TransportError:
+                    await asyncio.sleep(0.2)
+        raise RuntimeError("Server did not start in time")
+
+    async def __aexit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def summarize(latencies, errors: int, elapsed: float) -> dict:
+    values = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+def request_factory(scenario: str, max_id: int):
+    """Function issuing one request of a scenario on an httpx client"""
+    templates = load_templates()
+    devices = device_ids()
+    image = jpeg_bytes()
+
+    def near_template():
+        template = random.choice(templates)
+        return template["lat"] + random.uniform(-1, 1), template["lon"] + random.uniform(-1, 1)
+
+    async def sightings(client):
+        return await client.get("/sightings", params={"limit": 50})
+
+    async def sightings_page(client):
+        return await client.get("/sightings", params={"limit": 50, "before_id": random.randint(1, max_id + 1)})
+
+    async def nearby(client):
+        lat, lon = near_template()
+        return await client.get("/sightings/nearby", params={"lat": lat, "lon": lon, "radius": 50})
+
+    async def nearby_24h(client):
+        lat, lon = near_template()
+        return await client.get("/sightings/nearby", params={"lat": lat, "lon": lon, "radius": 50, "hours": 24})
+
+    async def stats(client):
+        return await client.get("/stats")
+
+    async def identicon(client):
+        return await client.get(f"/identicon/{random.choice(devices)}.png")
+
+    async def upload(client):
+        lat, lon = near_template()
+        # A random trailer keeps the JPEG valid but gives every upload its own content hash
+        content = image + os.urandom(16)
+        return await client.post("/upload", files={"file": ("bench.jpg", content, "image/jpeg")}, data={
+            "lat": lat, "lon": lon, "bearing": random.uniform(0, 360),
+            "timestamp": datetime.now(timezone.utc).isoformat(), "device_id": random.choice(devices)
+        })
+
+    return {
+        "sightings": sightings, "sightings_page": sightings_page, "nearby": nearby, "nearby_24h": nearby_24h,
+        "stats": stats, "identicon": identicon, "upload": upload,
+    }[scenario]
+
+async def run_http(url: str, scenario: str, concurrency: int, duration: float, max_id: int) -> dict:
+    send = request_factory(scenario, max_id)
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+
+    async def worker(client):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await send(client)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        start = time.monotonic()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.monotonic() - start
+    return summarize(latencies, errors, elapsed)
+
+async def run_websockets(url: str, clients: int, alerts: int = WS_ALERTS) -> dict:
+    """Fan-out latency: upload start until each subscriber has the alert"""
+    ws_url = url.replace("http://", "ws://")
+    received = {}
+    connected = 0
+    ready = asyncio.Event()
+    stop = asyncio.Event()
+
+    async def subscriber(index: int):
+        nonlocal connected
+        async with websockets.connect(f"{ws_url}/ws/bench-{index}", open_timeout=30, max_queue=None) as ws:
+            lat, lon = WS_ORIGIN
+            await ws.send(json.dumps({"type": "location_update", "lat": lat + random.uniform(-0.1, 0.1),
+                                      "lon": lon + random.uniform(-0.1, 0.1), "radius_km": 100}))
+            connected += 1
+            if connected == clients:
+                ready.set()
+            while not stop.is_set():
+                try:
+                    message = json.loads(await asyncio.wait_for(ws.recv(), 0.5))
+                except asyncio.TimeoutError:
+                    continue
+                if message.get("type") == "ping":
+                    await ws.send(json.dumps({"type": "pong"}))
+                elif message.get("type") == "proximity_alert":
+                    received.setdefault(message["data"]["id"], []).append(time.perf_counter())
+
+    tasks = [asyncio.create_task(subscriber(index)) for index in range(clients)]
+    latencies, errors = [], 0
+    start = time.monotonic()
+    try:
+        await asyncio.wait_for(ready.wait(), 60)
+        # Let the last location updates reach the subscriber index
+        await asyncio.sleep(0.5)
+        image = jpeg_bytes()
+        async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+            for _ in range(alerts):
+                sent = time.perf_counter()
+                response = await client.post("/upload", files={"file": ("ws.jpg", image + os.urandom(16), "image/jpeg")}, data={
+                    "lat": WS_ORIGIN[0], "lon": WS_ORIGIN[1], "bearing": 0,
+                    "timestamp": datetime.now(timezone.utc).isoformat()
+                })
+                sighting_id = response.json()["sighting_id"]
+                deadline = time.monotonic() + ALERT_TIMEOUT_SECONDS
+                while len(received.get(sighting_id, [])) < clients and time.monotonic() < deadline:
+                    await asyncio.sleep(0.005)
+                arrivals = received.get(sighting_id, [])
+                latencies.extend(arrival - sent for arrival in arrivals)
+                errors += clients - len(arrivals)
+    finally:
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    result = summarize(latencies, errors, time.monotonic() - start)
+    result["clients"] = clients
+    return result
+
+def database_for(rows: int, data_dir: str) -> str:
+    path = os.path.join(data_dir, f"sightings-{rows}.db")
+    if not os.path.exists(path):
+        print(f"Seeding {rows} rows into {path}...")
+        os.makedirs(data_dir, exist_ok=True)
+        asyncio.run(seed(path, rows))
+    return path
+
+def print_row(rows, scenario, result):
+    print(f"{rows:>9} {scenario:>15} {result['throughput']:>9.1f} {result['p50_ms']:>8.2f} "
+          f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['errors']:>7}")
+
+async def run_size(rows: int, db_path: str, args) -> list:
+    results = []
+    async with Server(db_path, args.workers) as server:
+        for scenario in args.scenarios:
+            result = await run_http(server.url, scenario, args.concurrency, args.duration, rows)
+            results.append({"rows": rows, "scenario": scenario, **result})
+            print_row(rows, scenario, result)
+        if args.ws_clients:
+            result = await run_websockets(server.url, args.ws_clients)
+            results.append({"rows": rows, "scenario": "ws_fanout", **result})
+            print_row(rows, "ws_fanout", result)
+    return results
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = {(r["rows"], r["scenario"]): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+
+    print(f"{'rows':>9} {'scenario':>15} {'req/s':>16} {'p95 ms':>18}")
+    for result in new:
+        before = old.get((result["rows"], result["scenario"]))
+        if before is None:
+            continue
+        print(f"{result['rows']:>9} {result['scenario']:>15} "
+              f"{before['throughput']:>7.1f} → {result['throughput']:<7.1f} "
+              f"{before['p95_ms']:>8.2f} → {result['p95_ms']:<8.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--ws-clients", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--output")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    random.seed(args.seed)
+    started = datetime.now(timezone.utc)
+    print(f"{'rows':>9} {'scenario':>15} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    results = []
+    for rows in args.rows:
+        db_path = database_for(rows, args.data_dir)
+        results.extend(asyncio.run(run_size(rows, db_path, args)))
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{started.strftime('%Y%m%dT%H%M%SZ')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "started": started.isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": {
+                "duration": args.duration, "concurrency": args.concurrency,
+                "ws_clients": args.ws_clients, "workers": args.workers, "seed": args.seed,
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"Results saved to {output}")
+
+if __name__ == "__main__":
+    main()
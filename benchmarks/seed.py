@@ -0,0 +1,102 @@
+"""Synthetic sightings database for benchmarks, shaped like mock_sightings.json.
+
+    python benchmarks/seed.py --rows 100000 --db benchmarks/data/sightings-100000.db
+
+Rows are scattered around the mock sightings' locations (plus a share spread
+over the whole globe), timestamped over the past week so time windows and
+/stats have recent data, and reuse the mocks' flags. The same --seed always
+produces the same rows.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import database
+from database import INSERT_SIGHTING_SQL, build_tile_clusters, epoch_seconds, lat_cell
+
+MOCK_SIGHTINGS = os.path.join(REPO, "mock_sightings.json")
+SEED_CHUNK = 10000
+SPREAD_DEGREES = 2.0
+GLOBAL_SHARE = 0.2
+TIME_SPAN_SECONDS = 7 * 24 * 3600
+DEVICE_COUNT = 5000
+
+def load_templates():
+    with open(MOCK_SIGHTINGS) as f:
+        return json.load(f)
+
+def device_ids(count: int = DEVICE_COUNT):
+    return [f"bench-device-{n:05d}" for n in range(count)]
+
+def synthetic_rows(count: int, seed: int = 42, start: int = 0, now: float = None):
+    """INSERT_SIGHTING_SQL rows numbered start..start+count"""
+    templates = load_templates()
+    devices = device_ids()
+    rng = np.random.default_rng(seed + start)
+    now = time.time() if now is None else now
+
+    picks = rng.integers(0, len(templates), count)
+    spread = rng.normal(0, SPREAD_DEGREES / 2, (count, 2))
+    anywhere = rng.random(count) < GLOBAL_SHARE
+    global_lats = np.degrees(np.arcsin(rng.uniform(-1, 1, count)))
+    global_lons = rng.uniform(-180, 180, count)
+    ages = rng.uniform(0, TIME_SPAN_SECONDS, count)
+    bearings = rng.uniform(0, 360, count)
+    device_picks = rng.integers(0, len(devices), count)
+
+    rows = []
+    for i in range(count):
+        template = templates[picks[i]]
+        if anywhere[i]:
+            lat, lon = float(global_lats[i]), float(global_lons[i])
+        else:
+            lat = float(np.clip(template["lat"] + spread[i, 0], -90, 90))
+            lon = (template["lon"] + spread[i, 1] + 180) % 360 - 180
+        timestamp = datetime.fromtimestamp(now - ages[i], timezone.utc).isoformat().replace("+00:00", "Z")
+        digest = hashlib.sha256(f"{seed}-{start + i}".encode()).hexdigest()
+        rows.append((
+            f"{template['id']}-{start + i:07d}.jpg", f"static/uploads/{digest}.jpg",
+            lat, lon, float(bearings[i]), timestamp, devices[device_picks[i]], template["userFlag"],
+            lat_cell(lat), epoch_seconds(timestamp)
+        ))
+    return rows
+
+async def seed(path: str, rows: int, seed_value: int = 42):
+    if os.path.exists(path):
+        raise SystemExit(f"{path} already exists")
+    database.DB_PATH = path
+    await database.init_db()
+    try:
+        now = time.time()
+        async with database.get_pool().write() as db:
+            for start in range(0, rows, SEED_CHUNK):
+                chunk = synthetic_rows(min(SEED_CHUNK, rows - start), seed_value, start, now)
+                await db.executemany(INSERT_SIGHTING_SQL, chunk)
+            await build_tile_clusters(db)
+    finally:
+        await database.close_db()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--db", required=True)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    start = time.perf_counter()
+    asyncio.run(seed(args.db, args.rows, args.seed))
+    print(f"Seeded {args.rows} sightings into {args.db} in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
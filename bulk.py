@@ -0,0 +1,183 @@
+"""Bulk export and import of the sightings table.
+
+Exports stream the table in id order, EXPORT_CHUNK rows per query, as
+NDJSON (one object per line) or CSV with a header row. Either can be read
+back by import, as can the JSON array format of mock_sightings.json:
+
+    python bulk.py export --format ndjson --output sightings.ndjson
+    python bulk.py import sightings.ndjson
+    python bulk.py import mock_sightings.json
+
+Exported rows keep their ids, so importing into a table that already has
+some of them stops before writing anything; pass --on-conflict skip to keep
+the stored rows, or renumber to store the imported ones under new ids.
+
+Import against a stopped API, or restart it afterwards: running workers
+keep their /stats counters and response caches in memory.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+import orjson
+
+from database import (init_db, close_db, count_existing_ids, import_sightings, iter_sightings,
+                      EXPORT_CHUNK, IMPORT_CONFLICT_MODES, SIGHTING_COLUMNS)
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+IMPORT_FORMATS = ("json", "ndjson", "csv")
+
+COLUMNS = SIGHTING_COLUMNS.split(", ")
+NUMERIC_COLUMNS = {"id": int, "lat": float, "lon": float, "bearing": float, "distance_km": float}
+
+# mock_sightings.json and the mobile app use these names for stored columns
+FIELD_ALIASES = {
+    "userFlag": "user_flag",
+    "distanceKm": "distance_km",
+    "time": "timestamp",
+}
+MOCK_DEVICE_ID = "mock"
+
+def _csv_chunk(rows, header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(COLUMNS)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+async def export_chunks(export_format: str = "ndjson", after_id: int = 0) -> AsyncIterator[bytes]:
+    """Encoded export, one chunk of rows at a time"""
+    if export_format == "csv":
+        yield _csv_chunk((), header=True)
+    async for rows in iter_sightings(after_id):
+        if export_format == "csv":
+            yield _csv_chunk(rows)
+        else:
+            yield b"".join(orjson.dumps(dict(zip(COLUMNS, row))) + b"\n" for row in rows)
+
+def sighting_row(record: dict) -> tuple:
+    """SIGHTING_COLUMNS tuple for an exported or mock_sightings.json record"""
+    record = {FIELD_ALIASES.get(key, key): value for key, value in record.items()}
+    if "sighting_id" not in record and isinstance(record.get("id"), str) and not record["id"].isdigit():
+        # Mock records carry a public reference ("UFB-0001") in place of a row id
+        record["sighting_id"] = record.pop("id")
+        record.setdefault("filename", record["sighting_id"])
+        record.setdefault("device_id", MOCK_DEVICE_ID)
+
+    values = []
+    for column in COLUMNS:
+        value = record.get(column)
+        if value == "":
+            value = None
+        elif value is not None and column in NUMERIC_COLUMNS:
+            value = NUMERIC_COLUMNS[column](value)
+        values.append(value)
+    return tuple(values)
+
+def read_records(path: str, import_format: Optional[str] = None) -> Iterator[dict]:
+    """Records from a file; NDJSON and CSV are read a line at a time"""
+    if import_format is None:
+        import_format = os.path.splitext(path)[1].lstrip(".").lower()
+        if import_format not in IMPORT_FORMATS:
+            raise ValueError(f"Cannot tell the format of {path}; pass --format")
+
+    with open(path, newline="", encoding="utf-8") as source:
+        if import_format == "json":
+            yield from json.load(source)
+        elif import_format == "ndjson":
+            for line in source:
+                if line.strip():
+                    yield orjson.loads(line)
+        else:
+            yield from csv.DictReader(source)
+
+async def count_conflicts(rows: Iterable[tuple]) -> int:
+    """Rows whose id is already stored or repeats an earlier row's"""
+    seen = set()
+    conflicts = 0
+    chunk = []
+    for row in rows:
+        if row[0] is None:
+            continue
+        if row[0] in seen:
+            conflicts += 1
+            continue
+        seen.add(row[0])
+        chunk.append(row[0])
+        if len(chunk) == EXPORT_CHUNK:
+            conflicts += await count_existing_ids(chunk)
+            chunk = []
+    if chunk:
+        conflicts += await count_existing_ids(chunk)
+    return conflicts
+
+async def export(export_format: str, output: Optional[str] = None, after_id: int = 0):
+    await init_db()
+    target = open(output, "wb") if output else sys.stdout.buffer
+    try:
+        async for chunk in export_chunks(export_format, after_id):
+            target.write(chunk)
+    finally:
+        if output:
+            target.close()
+        await close_db()
+
+async def restore(path: str, import_format: Optional[str] = None, on_conflict: str = "abort"):
+    """Import a file; returns an error message, or None on success"""
+    await init_db()
+    try:
+        # A first pass over the file, so a bad row or a taken id fails before anything is written
+        conflicts = await count_conflicts(sighting_row(record) for record in read_records(path, import_format))
+        if conflicts and on_conflict == "abort":
+            return (f"{conflicts} sightings in {path} have ids that are already taken; "
+                    "nothing was imported. Pass --on-conflict skip or renumber.")
+
+        total = 0
+
+        def rows():
+            nonlocal total
+            for record in read_records(path, import_format):
+                total += 1
+                yield sighting_row(record)
+
+        imported = await import_sightings(rows(), on_conflict=on_conflict)
+        skipped = f", skipped {total - imported} with ids already taken" if total > imported else ""
+        print(f"Imported {imported} sightings from {path}{skipped}")
+    except ValueError as e:
+        # Unreadable values, or an id taken while the import ran
+        return f"Import of {path} failed: {e}"
+    finally:
+        await close_db()
+    return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UFOBeep bulk export and import")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export")
+    export_parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson")
+    export_parser.add_argument("--output", help="Write here instead of stdout")
+    export_parser.add_argument("--after-id", type=int, default=0, help="Only sightings with a larger id")
+
+    import_parser = commands.add_parser("import")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=IMPORT_FORMATS, help="Default: from the file extension")
+    import_parser.add_argument("--on-conflict", choices=IMPORT_CONFLICT_MODES, default="abort",
+                               help="For rows whose id is already taken (default: import nothing)")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        asyncio.run(export(args.format, args.output, args.after_id))
+    else:
+        error = asyncio.run(restore(args.path, args.format, args.on_conflict))
+        if error:
+            sys.exit(error)
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from geometry import calculate_bearing
+from metrics import FANOUT_MESSAGES, FANOUT_RECIPIENTS, FANOUT_SECONDS, WEBSOCKET_DROPPED, WEBSOCKET_EVENTS
+from proximity import SubscriberGrid, DEFAULT_ALERT_RADIUS_KM
+
+SEND_TIMEOUT_SECONDS = 5
+
+# Alerts queued for a client that is not reading; the oldest go first when full
+OUTBOUND_QUEUE_SIZE = 32
+
+# Clients answer {"type": "ping"} with {"type": "pong"}. One that has done so
+# before and then stays silent for HEARTBEAT_TIMEOUT_SECONDS is evicted. Older
+# app builds that never answer are left to the server's protocol-level pings.
+HEARTBEAT_INTERVAL_SECONDS = 20
+HEARTBEAT_TIMEOUT_SECONDS = 3 * HEARTBEAT_INTERVAL_SECONDS
+PING_MESSAGE = json.dumps({"type": "ping"})
+
+# A GPS watch can fire many times a second; apply at most one location per
+# interval and keep the latest of the ones in between
+LOCATION_UPDATE_INTERVAL_SECONDS = 1.0
+
+class ClientConnection:
+    """One subscriber's socket and the frames waiting to be written to it"""
+
+    def __init__(self, websocket: WebSocket, user_id: str):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.outbox: deque = deque(maxlen=OUTBOUND_QUEUE_SIZE)
+        self.ready = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+        self.last_seen = time.monotonic()
+        self.answers_pings = False
+
+        self.location_applied_at = float("-inf")
+        self.pending_location: Optional[Tuple[float, float, float]] = None
+        self.location_timer: Optional[asyncio.TimerHandle] = None
+
+        # Which alert clip to offer; sent along with location updates
+        self.language: Optional[str] = None
+        self.unit: Optional[str] = None
+
+    def send(self, message: str):
+        """Queue a frame without waiting for the client"""
+        if len(self.outbox) == self.outbox.maxlen:
+            self.dropped += 1
+            WEBSOCKET_DROPPED.inc()
+        self.outbox.append(message)
+        self.ready.set()
+
+    def received(self, message_type: Optional[str]):
+        self.last_seen = time.monotonic()
+        if message_type == "pong":
+            self.answers_pings = True
+
+class ConnectionManager:
+    """Sockets held by this worker; presence is shared with the others through the alert bus.
+
+    Every connection gets its own writer task draining a bounded queue, so
+    a client that stops reading only ever delays (and loses) its own alerts.
+    """
+
+    def __init__(self, bus, audio=None):
+        self.active_connections: Dict[str, ClientConnection] = {}
+        self.subscribers = SubscriberGrid()
+        self.bus = bus
+        self.audio = audio
+        self.heartbeat: Optional[asyncio.Task] = None
+        # Disconnects and socket closes started from callbacks, held so they are not collected mid-run
+        self.pending: Set[asyncio.Task] = set()
+
+    def start(self):
+        self.heartbeat = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        if self.heartbeat is not None:
+            self.heartbeat.cancel()
+            await asyncio.gather(self.heartbeat, return_exceptions=True)
+            self.heartbeat = None
+        for connection in list(self.active_connections.values()):
+            await self.disconnect(connection)
+        if self.pending:
+            await asyncio.gather(*self.pending, return_exceptions=True)
+
+    async def connect(self, websocket: WebSocket, user_id: str) -> ClientConnection:
+        await websocket.accept()
+        connection = ClientConnection(websocket, user_id)
+        connection.writer = asyncio.create_task(self._write(connection))
+
+        replaced = self.active_connections.get(user_id)
+        self.active_connections[user_id] = connection
+        if replaced is not None:
+            # Same user reconnected; the old socket is most likely dead already
+            self._close(replaced)
+        await self.bus.connected(user_id)
+        WEBSOCKET_EVENTS.inc(event="connect")
+        print(f"User {user_id} connected via WebSocket")
+        return connection
+
+    async def disconnect(self, connection: ClientConnection):
+        self._close(connection)
+        # A reconnect may already have replaced this socket under the same user_id
+        if self.active_connections.get(connection.user_id) is connection:
+            del self.active_connections[connection.user_id]
+            self.subscribers.remove(connection.user_id)
+            await self.bus.disconnected(connection.user_id)
+            WEBSOCKET_EVENTS.inc(event="disconnect")
+            print(f"User {connection.user_id} disconnected")
+
+    def update_location(self, connection: ClientConnection, lat: float, lon: float,
+                        radius_km: float = DEFAULT_ALERT_RADIUS_KM):
+        connection.pending_location = (lat, lon, radius_km)
+        due = connection.location_applied_at + LOCATION_UPDATE_INTERVAL_SECONDS
+        if time.monotonic() >= due:
+            self._apply_location(connection)
+        elif connection.location_timer is None:
+            connection.location_timer = asyncio.get_running_loop().call_later(
+                due - time.monotonic(), self._apply_location, connection
+            )
+
+    async def broadcast_proximity_alert(self, sighting_data: dict):
+        """Alert this worker's subscribers near a sighting.
+
+        With alert audio, each alert links the clip for the subscriber's
+        distance and direction; recipients sharing a clip share one encoded
+        message.
+        """
+        start = time.perf_counter()
+        lat, lon = sighting_data["lat"], sighting_data["lon"]
+        messages: Dict[Optional[str], str] = {}
+        sent = 0
+        for user_id, distance_km in self.subscribers.nearby(lat, lon):
+            connection = self.active_connections.get(user_id)
+            if connection is None:
+                continue
+
+            audio_url = None
+            if self.audio is not None:
+                user_lat, user_lon = self.subscribers.positions[user_id][:2]
+                audio_url = self.audio.clip_url(
+                    connection.language, distance_km, calculate_bearing(user_lat, user_lon, lat, lon), connection.unit
+                )
+            message = messages.get(audio_url)
+            if message is None:
+                payload = {"type": "proximity_alert", "data": sighting_data}
+                if audio_url is not None:
+                    payload["audio_url"] = audio_url
+                message = messages[audio_url] = json.dumps(payload)
+            connection.send(message)
+            sent += 1
+
+        FANOUT_RECIPIENTS.observe(sent)
+        FANOUT_MESSAGES.inc(sent)
+        FANOUT_SECONDS.observe(time.perf_counter() - start)
+
+    def _apply_location(self, connection: ClientConnection):
+        connection.location_timer = None
+        if connection.pending_location is None or self.active_connections.get(connection.user_id) is not connection:
+            return
+        self.subscribers.update(connection.user_id, *connection.pending_location)
+        connection.pending_location = None
+        connection.location_applied_at = time.monotonic()
+
+    async def _write(self, connection: ClientConnection):
+        try:
+            while True:
+                await connection.ready.wait()
+                connection.ready.clear()
+                while connection.outbox:
+                    message = connection.outbox.popleft()
+                    await asyncio.wait_for(connection.websocket.send_text(message), SEND_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Dropping {connection.user_id}: send failed ({e!r})")
+            WEBSOCKET_EVENTS.inc(event="send_failed")
+            self._spawn(self.disconnect(connection))
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL_SECONDS)
+            now = time.monotonic()
+            for connection in list(self.active_connections.values()):
+                if connection.answers_pings and now - connection.last_seen > HEARTBEAT_TIMEOUT_SECONDS:
+                    print(f"Dropping {connection.user_id}: no heartbeat")
+                    WEBSOCKET_EVENTS.inc(event="heartbeat_timeout")
+                    await self.disconnect(connection)
+                elif not connection.outbox:
+                    # A backed-up queue already has frames for the client to answer
+                    connection.send(PING_MESSAGE)
+
+    def _close(self, connection: ClientConnection):
+        if connection.location_timer is not None:
+            connection.location_timer.cancel()
+            connection.location_timer = None
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        connection.writer = None
+        self._spawn(self._close_socket(connection.websocket))
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    @staticmethod
+    async def _close_socket(websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1001), SEND_TIMEOUT_SECONDS)
+        except Exception:
+            # Already closed by the client, or not answering
+            pass
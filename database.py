@@ -1,11 +1,293 @@
 import aiosqlite
+import asyncio
+import json
 import math
-from typing import List, Optional
+import numpy as np
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
 
-DB_PATH = "sightings.db"
+from geometry import bounding_box, haversine_km
+from hot_set import RecentSightings
+from metrics import DB_QUERY_SECONDS, HOT_SET_READS
+from stats import SightingStats, BUCKET_SECONDS, WINDOW_BUCKETS
+from tiles import cluster_keys
+
+DB_PATH = os.environ.get("UFOBEEP_DB_PATH", "sightings.db")
+
+# WAL lets the reader connections run alongside the single writer
+READER_CONNECTIONS = 4
+STATEMENT_CACHE_SIZE = 256
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Sightings are bucketed into latitude bands of 1/CELLS_PER_DEGREE degrees.
+# The (lat_cell, lon) index lets a radius search seek one longitude range per
+# band instead of scanning the whole table.
+CELLS_PER_DEGREE = 10
+
+SIGHTING_COLUMNS = "id, filename, filepath, lat, lon, bearing, timestamp, device_id, user_flag, distance_km, sighting_id, thumbnail, poster"
+
+# Adds points into the per-zoom cluster pyramid behind /tiles
+UPSERT_CLUSTER_SQL = """
+    INSERT INTO tile_clusters (zoom, tile_x, tile_y, cell, count, sum_lat, sum_lon, newest_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (zoom, tile_x, tile_y, cell) DO UPDATE SET
+        count = count + excluded.count,
+        sum_lat = sum_lat + excluded.sum_lat,
+        sum_lon = sum_lon + excluded.sum_lon,
+        newest_id = max(newest_id, excluded.newest_id)
+"""
+TILE_BUILD_CHUNK = 10000
+
+SIGHTING_INDEXES = {
+    "idx_sightings_cell_lon": "CREATE INDEX IF NOT EXISTS idx_sightings_cell_lon ON sightings (lat_cell, lon)",
+    # Time-window searches ("within R km in the last H hours") range-scan epoch
+    # and check the band and longitude from the index alone
+    "idx_sightings_epoch_cell": "CREATE INDEX IF NOT EXISTS idx_sightings_epoch_cell ON sightings (epoch, lat_cell, lon)",
+}
+# The planner cannot tell how many sightings in a radius fall inside a time
+# window, and prefers the band index, which reads every sighting ever stored
+# there. Up to this many hours back nearby searches force the epoch index.
+EPOCH_INDEX_MAX_HOURS = 24
+
+# Exports read this many rows per query; imports commit this many per transaction
+EXPORT_CHUNK = 5000
+IMPORT_TRANSACTION_ROWS = 100000
+
+# Imported rows are SIGHTING_COLUMNS values; a NULL id is assigned as usual
+IMPORT_SIGHTING_SQL = f"""
+    INSERT INTO sightings ({SIGHTING_COLUMNS}, lat_cell, epoch)
+    VALUES ({", ".join("?" * (len(SIGHTING_COLUMNS.split(", ")) + 2))})
+"""
+
+# What import_sightings does with a row whose id is already taken: fail,
+# leave the stored row alone, or give the imported row a fresh id
+IMPORT_CONFLICT_MODES = ("abort", "skip", "renumber")
+
+INSERT_SIGHTING_SQL = """
+    INSERT INTO sightings (filename, filepath, lat, lon, bearing, timestamp, device_id, user_flag, lat_cell, epoch)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# save_sighting calls that queue up while the previous transaction commits
+# share the next one, up to GROUP_COMMIT_ROWS rows. A positive delay also
+# holds a batch open that long during bursts, but in
+# benchmarks/bench_group_commit.py that idles the writer for less gain.
+GROUP_COMMIT_ROWS = 256
+GROUP_COMMIT_DELAY_SECONDS = 0
+
+# Aggregates behind /stats, kept current by save_sighting
+stats = SightingStats()
+
+# Newest rows, answering reads whose window they cover; written through like stats
+recent = RecentSightings()
+
+# Read endpoints tag cached responses with the dataset version, so it only
+# has to grow whenever the data does. Ids and rows with derivatives both only
+# ever increase, which makes their sum grow on every change.
+latest_id = 0
+rows_with_media = 0
+
+def get_dataset_version() -> int:
+    return latest_id + rows_with_media
+
+def get_latest_id() -> int:
+    return latest_id
+
+def parse_timestamp(timestamp) -> Optional[float]:
+    """Epoch seconds for a client ISO-8601 timestamp; naive times are taken as UTC"""
+    try:
+        parsed = datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def epoch_seconds(timestamp) -> Optional[int]:
+    """Value stored in the indexed epoch column for a client timestamp"""
+    parsed = parse_timestamp(timestamp)
+    return int(math.floor(parsed)) if parsed is not None else None
+
+def lat_cell(lat: float) -> int:
+    """Latitude band a coordinate falls into"""
+    return int((lat + 90) * CELLS_PER_DEGREE)
+
+class ConnectionPool:
+    """Long-lived SQLite connections: one writer plus a fixed set of readers.
+
+    Each aiosqlite connection owns a thread and sqlite3's per-connection
+    statement cache, so keeping them open avoids the per-request setup cost
+    and lets repeated queries reuse their prepared statements.
+    """
+
+    def __init__(self, path: str, readers: int = READER_CONNECTIONS):
+        self.path = path
+        self.reader_count = readers
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._readers: asyncio.Queue = asyncio.Queue()
+        self._all: List[aiosqlite.Connection] = []
+
+    async def open(self):
+        # The writer goes first so WAL is switched on before any reader attaches
+        self._writer = await self._connect()
+        for _ in range(self.reader_count):
+            self._readers.put_nowait(await self._connect())
+
+    async def close(self):
+        if self._writer is not None:
+            # Refresh planner statistics so it can choose between the spatial and time indexes
+            await self._writer.execute("PRAGMA optimize")
+        for db in self._all:
+            await db.close()
+        self._all.clear()
+        self._writer = None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(self.path, cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in CONNECTION_PRAGMAS:
+            await db.execute(pragma)
+        self._all.append(db)
+        return db
+
+    @asynccontextmanager
+    async def read(self):
+        db = await self._readers.get()
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def write(self):
+        """Exclusive use of the writer; commits on success, rolls back on error"""
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            await self._writer.commit()
+
+class SightingWriter:
+    """Write-behind queue that group-commits new sightings.
+
+    A burst of uploads would otherwise pay for one transaction each. Here
+    callers enqueue their row and wait on a future while a single task
+    takes everything queued (at most max_rows, optionally waiting `delay`
+    for more), inserts it in one transaction and resolves every future with
+    its row id.
+    """
+
+    def __init__(self, max_rows: int = GROUP_COMMIT_ROWS, delay: float = GROUP_COMMIT_DELAY_SECONDS):
+        self.max_rows = max_rows
+        self.delay = delay
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Commit everything already queued, then end the writer task"""
+        if self.task is not None:
+            self.queue.put_nowait(None)
+            await self.task
+            self.task = None
+
+    async def submit(self, row: tuple) -> int:
+        """Queue one INSERT_SIGHTING_SQL row; returns its id once committed"""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((row, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            # Only hold the batch open during a burst, so a lone upload is not delayed
+            if self.delay and 0 < self.queue.qsize() < self.max_rows:
+                await asyncio.sleep(self.delay)
+
+            batch = [item]
+            stopping = False
+            while len(batch) < self.max_rows and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._commit(batch)
+            if stopping:
+                return
+
+    @DB_QUERY_SECONDS.time(function="group_commit")
+    async def _commit(self, batch):
+        rows = [row for row, _ in batch]
+        try:
+            async with get_pool().write() as db:
+                await db.executemany(INSERT_SIGHTING_SQL, rows)
+                # The batch holds SQLite's write lock, so its AUTOINCREMENT ids are consecutive
+                cursor = await db.execute("SELECT last_insert_rowid()")
+                first_id = (await cursor.fetchone())[0] - len(rows) + 1
+
+                clusters = {}
+                for row_id, row in enumerate(rows, first_id):
+                    add_to_clusters(clusters, row_id, row[2], row[3])
+                await db.executemany(UPSERT_CLUSTER_SQL, [(*key, *cluster) for key, cluster in clusters.items()])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # The hot set has to hold the rows before the dataset version moves,
+        # or a read in between would cache the old result under the new version
+        for row_id, row in enumerate(rows, first_id):
+            recent.add((row_id, *row[:8], None, None, None, None), row[9])
+        global latest_id
+        latest_id = max(latest_id, first_id + len(rows) - 1)
+        for row_id, (row, future) in enumerate(batch, first_id):
+            stats.record(row[9], row[7])
+            if not future.done():
+                future.set_result(row_id)
+
+pool: Optional[ConnectionPool] = None
+writer: Optional[SightingWriter] = None
+
+def get_pool() -> ConnectionPool:
+    if pool is None:
+        raise RuntimeError("Database is not open; call init_db() at startup")
+    return pool
+
+async def close_db():
+    global pool, writer
+    if writer is not None:
+        await writer.stop()
+        writer = None
+    if pool is not None:
+        await pool.close()
+        pool = None
 
 async def init_db():
-    async with aiosqlite.connect(DB_PATH) as db:
+    global pool, writer
+    if pool is None:
+        pool = ConnectionPool(DB_PATH)
+        await pool.open()
+
+    async with pool.write() as db:
         await db.execute("""
             CREATE TABLE IF NOT EXISTS sightings (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -18,78 +300,378 @@ async def init_db():
                 device_id TEXT,
                 user_flag TEXT,
                 distance_km REAL,
-                sighting_id TEXT
+                sighting_id TEXT,
+                lat_cell INTEGER,
+                epoch INTEGER,
+                thumbnail TEXT,
+                poster TEXT
             )
         """)
-        await db.commit()
+        await migrate_db(db)
+        for create_index in SIGHTING_INDEXES.values():
+            await db.execute(create_index)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS tile_clusters (
+                zoom INTEGER,
+                tile_x INTEGER,
+                tile_y INTEGER,
+                cell INTEGER,
+                count INTEGER,
+                sum_lat REAL,
+                sum_lon REAL,
+                newest_id INTEGER,
+                PRIMARY KEY (zoom, tile_x, tile_y, cell)
+            ) WITHOUT ROWID
+        """)
+        await build_tile_clusters(db)
+
+    async with pool.read() as db:
+        await rebuild_stats(db)
+        await load_recent(db)
+
+    if writer is None:
+        writer = SightingWriter()
+        writer.start()
 
+@DB_QUERY_SECONDS.time(function="rebuild_stats")
+async def rebuild_stats(db):
+    """Recompute the /stats aggregates and dataset version from the table"""
+    global latest_id, rows_with_media
+    stats.reset()
+
+    cursor = await db.execute("""
+        SELECT COUNT(*), COALESCE(MAX(id), 0), COUNT(thumbnail) + COUNT(poster) FROM sightings
+    """)
+    total, latest_id, rows_with_media = await cursor.fetchone()
+    cursor = await db.execute("""
+        SELECT user_flag, COUNT(*) FROM sightings
+        WHERE user_flag IS NOT NULL AND user_flag != ''
+        GROUP BY user_flag
+    """)
+    flag_counts = dict(await cursor.fetchall())
+
+    cursor = await db.execute("""
+        SELECT epoch / ? AS bucket, COUNT(*) FROM sightings
+        WHERE epoch >= ?
+        GROUP BY bucket
+    """, (BUCKET_SECONDS, int(time.time()) - WINDOW_BUCKETS * BUCKET_SECONDS))
+    for bucket, count in await cursor.fetchall():
+        stats.record_time(bucket * BUCKET_SECONDS, count)
+
+    stats.total = total
+    stats.flag_counts = flag_counts
+
+@DB_QUERY_SECONDS.time(function="load_recent")
+async def load_recent(db):
+    """Fill the in-memory hot set with the newest rows"""
+    cursor = await db.execute(
+        f"SELECT {SIGHTING_COLUMNS}, epoch FROM sightings ORDER BY id DESC LIMIT ?", (recent.size,)
+    )
+    rows = [(row[:-1], row[-1]) for row in await cursor.fetchall()]
+    older_id = older_epoch = None
+    if len(rows) == recent.size:
+        cursor = await db.execute("SELECT MAX(id), MAX(epoch) FROM sightings WHERE id < ?", (rows[-1][0][0],))
+        older_id, older_epoch = await cursor.fetchone()
+    recent.load(rows, older_id, older_epoch)
+
+async def fill_recent_gaps():
+    """Fetch sightings whose bus message never reached this worker into the hot set"""
+    gap = recent.overdue_gap()
+    if gap is None:
+        return
+    async with get_pool().read() as db:
+        cursor = await db.execute(
+            f"SELECT {SIGHTING_COLUMNS}, epoch FROM sightings WHERE id > ? AND id < ?", gap
+        )
+        rows = [(row[:-1], row[-1]) for row in await cursor.fetchall()]
+    for row, epoch in rows:
+        # Still missing, so /stats has not counted it either
+        if row[0] not in recent.entries:
+            stats.record(epoch, row[8])
+    recent.fill(rows, gap[1])
+
+def add_to_clusters(clusters: dict, row_id: int, lat: float, lon: float):
+    """Accumulate one point into UPSERT_CLUSTER_SQL rows keyed by cluster"""
+    for key in cluster_keys(lat, lon):
+        cluster = clusters.get(key)
+        if cluster is None:
+            clusters[key] = [1, lat, lon, row_id]
+        else:
+            cluster[0] += 1
+            cluster[1] += lat
+            cluster[2] += lon
+            cluster[3] = max(cluster[3], row_id)
+
+async def build_tile_clusters(db):
+    """Fill the cluster pyramid from existing sightings if it is empty"""
+    cursor = await db.execute("SELECT EXISTS(SELECT 1 FROM tile_clusters), EXISTS(SELECT 1 FROM sightings)")
+    has_clusters, has_sightings = await cursor.fetchone()
+    if has_clusters or not has_sightings:
+        return
+
+    cursor = await db.execute("SELECT id, lat, lon FROM sightings WHERE lat IS NOT NULL AND lon IS NOT NULL")
+    while True:
+        rows = await cursor.fetchmany(TILE_BUILD_CHUNK)
+        if not rows:
+            break
+
+        clusters = {}
+        for row_id, lat, lon in rows:
+            add_to_clusters(clusters, row_id, lat, lon)
+        await db.executemany(UPSERT_CLUSTER_SQL, [(*key, *cluster) for key, cluster in clusters.items()])
+
+async def migrate_db(db):
+    """Bring sightings.db files created by older versions up to the current schema"""
+    cursor = await db.execute("PRAGMA table_info(sightings)")
+    columns = {row[1] for row in await cursor.fetchall()}
+
+    if "lat_cell" not in columns:
+        await db.execute("ALTER TABLE sightings ADD COLUMN lat_cell INTEGER")
+        # lat + 90 is never negative, so CAST truncation matches lat_cell()
+        await db.execute(
+            "UPDATE sightings SET lat_cell = CAST((lat + 90) * ? AS INTEGER) WHERE lat IS NOT NULL",
+            (CELLS_PER_DEGREE,)
+        )
+
+    if "epoch" not in columns:
+        await db.execute("ALTER TABLE sightings ADD COLUMN epoch INTEGER")
+        # Unparseable client timestamps stay NULL and drop out of time windows
+        cursor = await db.execute("SELECT id, timestamp FROM sightings")
+        await db.executemany(
+            "UPDATE sightings SET epoch = ? WHERE id = ?",
+            [(epoch_seconds(timestamp), row_id) for row_id, timestamp in await cursor.fetchall()]
+        )
+
+    for column in ("thumbnail", "poster"):
+        if column not in columns:
+            await db.execute(f"ALTER TABLE sightings ADD COLUMN {column} TEXT")
+
+@DB_QUERY_SECONDS.time(function="save_sighting")
 async def save_sighting(filename, filepath, lat, lon, bearing, timestamp, device_id, user_flag=None):
-    async with aiosqlite.connect(DB_PATH) as db:
+    """Insert a sighting through the group-commit writer; returns its id"""
+    if writer is None:
+        raise RuntimeError("Database is not open; call init_db() at startup")
+    return await writer.submit(
+        (filename, filepath, lat, lon, bearing, timestamp, device_id, user_flag, lat_cell(lat), epoch_seconds(timestamp))
+    )
+
+@DB_QUERY_SECONDS.time(function="set_media_derivatives")
+async def set_media_derivatives(filepath: str, thumbnail: Optional[str], poster: Optional[str]):
+    """Record derivative file names on every sighting that uses this upload"""
+    global rows_with_media
+    async with get_pool().write() as db:
         cursor = await db.execute("""
-            INSERT INTO sightings (filename, filepath, lat, lon, bearing, timestamp, device_id, user_flag)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (filename, filepath, lat, lon, bearing, timestamp, device_id, user_flag))
-        await db.commit()
-        return cursor.lastrowid
-
-async def get_all_sightings():
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT * FROM sightings ORDER BY id DESC")
+            UPDATE sightings SET thumbnail = ?, poster = ?
+            WHERE filepath = ? AND thumbnail IS NULL AND poster IS NULL
+        """, (thumbnail, poster, filepath))
+    added = cursor.rowcount * ((thumbnail is not None) + (poster is not None))
+    rows_with_media += added
+    recent.set_media(filepath, thumbnail, poster)
+    return added
+
+def note_sighting(row: tuple):
+    """Fold a sighting saved by another worker, as a SIGHTING_COLUMNS row, into this process's state"""
+    global latest_id
+    sighting_id, timestamp, user_flag = row[0], row[6], row[8]
+    epoch = epoch_seconds(timestamp)
+    latest_id = max(latest_id, sighting_id)
+    # Unless fill_recent_gaps() already fetched it
+    if sighting_id not in recent.entries:
+        stats.record(epoch, user_flag)
+    recent.add(row, epoch)
+
+def note_media_derivatives(added: int, filepath: Optional[str] = None,
+                           thumbnail: Optional[str] = None, poster: Optional[str] = None):
+    """Counterpart of note_sighting for derivatives recorded by another worker"""
+    global rows_with_media
+    rows_with_media += added
+    if filepath is not None:
+        recent.set_media(filepath, thumbnail, poster)
+
+@DB_QUERY_SECONDS.time(function="get_all_sightings")
+async def get_all_sightings(limit: Optional[int] = None, offset: int = 0,
+                            before_id: Optional[int] = None, after_id: Optional[int] = None):
+    """Get sightings newest first, optionally only those older than before_id.
+
+    With after_id the rows newer than that id come back oldest first, so a
+    client can keep paging forward from the last id it has seen.
+    """
+    await fill_recent_gaps()
+    rows = recent.after(after_id, limit, offset) if after_id is not None else recent.newest(limit, offset, before_id)
+    HOT_SET_READS.inc(function="get_all_sightings", result="hit" if rows is not None else "miss")
+    if rows is not None:
+        return rows
+
+    if after_id is not None:
+        where, order, params = "WHERE id > ?", "ASC", [after_id]
+    elif before_id is not None:
+        where, order, params = "WHERE id < ?", "DESC", [before_id]
+    else:
+        where, order, params = "", "DESC", []
+
+    # LIMIT -1 means no limit in SQLite
+    params += [limit if limit is not None else -1, offset]
+
+    async with get_pool().read() as db:
+        cursor = await db.execute(
+            f"SELECT {SIGHTING_COLUMNS} FROM sightings {where} ORDER BY id {order} LIMIT ? OFFSET ?",
+            params
+        )
         rows = await cursor.fetchall()
         return rows
 
-async def get_nearby_sightings(lat: float, lon: float, radius_km: float = 50):
-    """Get sightings within specified radius of given coordinates"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT * FROM sightings")
-        all_sightings = await cursor.fetchall()
-        
-        nearby = []
-        for sighting in all_sightings:
-            distance = calculate_distance(lat, lon, sighting[3], sighting[4])
-            if distance <= radius_km:
-                nearby.append((*sighting, distance))
-        
-        return sorted(nearby, key=lambda x: x[-1])
-
-async def get_recent_sightings(hours: int = 24):
-    """Get sightings from the last N hours"""
-    async with aiosqlite.connect(DB_PATH) as db:
+async def iter_sightings(after_id: int = 0, chunk_size: int = EXPORT_CHUNK):
+    """Yield every sighting after after_id in id order, chunk_size rows at a time.
+
+    Each chunk is a separate keyset query, so memory stays flat and a slow
+    consumer never holds a pooled connection between chunks.
+    """
+    while True:
+        async with get_pool().read() as db:
+            cursor = await db.execute(
+                f"SELECT {SIGHTING_COLUMNS} FROM sightings WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, chunk_size)
+            )
+            rows = await cursor.fetchall()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        after_id = rows[-1][0]
+
+async def count_existing_ids(ids: List[int]) -> int:
+    """How many of these sighting ids are already taken"""
+    async with get_pool().read() as db:
+        cursor = await db.execute(
+            "SELECT COUNT(*) FROM sightings WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),)
+        )
+        return (await cursor.fetchone())[0]
+
+@DB_QUERY_SECONDS.time(function="import_sightings")
+async def import_sightings(rows: Iterable[tuple], transaction_rows: int = IMPORT_TRANSACTION_ROWS,
+                           on_conflict: str = "abort") -> int:
+    """Bulk insert SIGHTING_COLUMNS tuples; returns how many were imported.
+
+    The secondary indexes are dropped for the duration and rebuilt once at
+    the end, together with the tile cluster pyramid and the /stats
+    aggregates. Rows go in with executemany, transaction_rows per commit.
+    If an import is interrupted, init_db() recreates missing indexes but
+    tile_clusters needs a fresh import to be rebuilt.
+
+    on_conflict is one of IMPORT_CONFLICT_MODES. With "abort", a taken id
+    raises ValueError, and the batches before it stay committed; check the
+    ids with count_existing_ids() first to fail before anything is written.
+    """
+    if on_conflict not in IMPORT_CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be one of {', '.join(IMPORT_CONFLICT_MODES)}")
+    insert_sql = IMPORT_SIGHTING_SQL.replace("INSERT", "INSERT OR IGNORE") if on_conflict == "skip" else IMPORT_SIGHTING_SQL
+
+    async with get_pool().write() as db:
+        for name in SIGHTING_INDEXES:
+            await db.execute(f"DROP INDEX IF EXISTS {name}")
+
+    imported = 0
+
+    async def insert(batch):
+        nonlocal imported
+        try:
+            async with get_pool().write() as db:
+                cursor = await db.executemany(insert_sql, batch)
+        except aiosqlite.IntegrityError as e:
+            raise ValueError(f"{e}; stopped after importing {imported} sightings") from e
+        # Rows skipped by INSERT OR IGNORE are not counted
+        imported += cursor.rowcount
+
+    try:
+        batch = []
+        for row in rows:
+            if on_conflict == "renumber":
+                row = (None, *row[1:])
+            lat = row[3]
+            batch.append((*row, lat_cell(lat) if lat is not None else None, epoch_seconds(row[6])))
+            if len(batch) >= transaction_rows:
+                await insert(batch)
+                batch = []
+        if batch:
+            await insert(batch)
+    finally:
+        async with get_pool().write() as db:
+            for create_index in SIGHTING_INDEXES.values():
+                await db.execute(create_index)
+            if imported:
+                await db.execute("DELETE FROM tile_clusters")
+                await build_tile_clusters(db)
+        async with get_pool().read() as db:
+            await rebuild_stats(db)
+            await load_recent(db)
+    return imported
+
+@DB_QUERY_SECONDS.time(function="get_nearby_sightings")
+async def get_nearby_sightings(lat: float, lon: float, radius_km: float = 50, hours: Optional[float] = None):
+    """Get sightings within specified radius of given coordinates, optionally from the last N hours"""
+    await fill_recent_gaps()
+    since_epoch = int(time.time() - hours * 3600) if hours is not None else None
+    rows = recent.nearby(lat, lon, radius_km, since_epoch)
+    HOT_SET_READS.inc(function="get_nearby_sightings", result="hit" if rows is not None else "miss")
+    if rows is not None:
+        return rows
+
+    min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius_km)
+    index_hint, time_filter, time_params = "", "", ()
+    if since_epoch is not None:
+        time_filter, time_params = "AND epoch >= ?", (since_epoch,)
+        if hours <= EPOCH_INDEX_MAX_HOURS:
+            index_hint = "INDEXED BY idx_sightings_epoch_cell"
+
+    async with get_pool().read() as db:
+        candidates = []
+        for min_lon, max_lon in lon_ranges:
+            # The band list is generated in SQL so the statement text stays constant and cached
+            cursor = await db.execute(f"""
+                WITH RECURSIVE cells(c) AS (SELECT ? UNION ALL SELECT c + 1 FROM cells WHERE c < ?)
+                SELECT {SIGHTING_COLUMNS} FROM sightings {index_hint}
+                WHERE lat_cell IN (SELECT c FROM cells) AND lon BETWEEN ? AND ? AND lat BETWEEN ? AND ? {time_filter}
+            """, (lat_cell(min_lat), lat_cell(max_lat), min_lon, max_lon, min_lat, max_lat, *time_params))
+            candidates.extend(await cursor.fetchall())
+
+    if not candidates:
+        return []
+
+    lats = np.fromiter((row[3] for row in candidates), dtype=np.float64, count=len(candidates))
+    lons = np.fromiter((row[4] for row in candidates), dtype=np.float64, count=len(candidates))
+    distances = haversine_km(lat, lon, lats, lons)
+
+    inside = np.flatnonzero(distances <= radius_km)
+    order = inside[np.argsort(distances[inside], kind="stable")]
+    return [(*candidates[i], distance) for i, distance in zip(order.tolist(), distances[order].tolist())]
+
+@DB_QUERY_SECONDS.time(function="get_tile_clusters")
+async def get_tile_clusters(zoom: int, tile_x: int, tile_y: int):
+    """Clusters in one tile as (count, centroid_lat, centroid_lon, newest_id)"""
+    async with get_pool().read() as db:
         cursor = await db.execute("""
-            SELECT * FROM sightings 
-            WHERE datetime(timestamp) >= datetime(now, ? ||  hours)
-            ORDER BY timestamp DESC
-        """, (f-{hours},))
+            SELECT count, sum_lat / count, sum_lon / count, newest_id FROM tile_clusters
+            WHERE zoom = ? AND tile_x = ? AND tile_y = ?
+        """, (zoom, tile_x, tile_y))
+        return await cursor.fetchall()
+
+@DB_QUERY_SECONDS.time(function="get_recent_sightings")
+async def get_recent_sightings(hours: float = 24):
+    """Get sightings from the last N hours"""
+    await fill_recent_gaps()
+    since_epoch = int(time.time() - hours * 3600)
+    entries = recent.since(since_epoch)
+    HOT_SET_READS.inc(function="get_recent_sightings", result="hit" if entries is not None else "miss")
+    if entries is not None:
+        entries.sort(key=lambda entry: entry.epoch, reverse=True)
+        return [entry.row for entry in entries]
+
+    async with get_pool().read() as db:
+        cursor = await db.execute(f"""
+            SELECT {SIGHTING_COLUMNS} FROM sightings 
+            WHERE epoch >= ?
+            ORDER BY epoch DESC
+        """, (since_epoch,))
         rows = await cursor.fetchall()
         return rows
-
-def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calculate distance between two coordinates using Haversine formula"""
-    R = 6371
-    
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-    
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    
-    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    return R * c
-
-def calculate_bearing(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calculate bearing from point 1 to point 2"""
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    dlon_rad = math.radians(lon2 - lon1)
-    
-    y = math.sin(dlon_rad) * math.cos(lat2_rad)
-    x = math.cos(lat1_rad) * math.sin(lat2_rad) - math.sin(lat1_rad) * math.cos(lat2_rad) * math.cos(dlon_rad)
-    
-    bearing_rad = math.atan2(y, x)
-    bearing_deg = math.degrees(bearing_rad)
-    
-    return (bearing_deg + 360) % 360
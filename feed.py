@@ -0,0 +1,114 @@
+"""New-sighting feed for clients without a WebSocket: Server-Sent Events and long-polling.
+
+Every sighting that reaches this worker through the alert bus is encoded
+once into a bounded replay buffer. Readers wait on a single shared event,
+so a new sighting wakes every stream with one set() rather than a queue
+per client. Event ids are sighting ids, so a client may resume (SSE
+Last-Event-ID, or since_id) on any worker.
+
+Sightings from other workers can arrive out of id order, and a client
+that resumes after the largest id it has seen would skip one that turns up
+late. So sightings are appended strictly in id order, and only up to the
+id below which none is still missing (the hot set's contiguous id); the
+caller passes them in with publish().
+
+The buffer covers every id above `floor`: the newest id when the worker
+started, raised as old entries fall out. Resuming from further back than
+that needs the database, which the endpoints in main.py fall back to.
+"""
+import asyncio
+from collections import deque
+from typing import List, Tuple
+
+import orjson
+
+from serialization import sighting_record
+
+FEED_REPLAY_SIZE = 1000
+# Comment lines keep proxies from closing an idle stream
+SSE_KEEPALIVE_SECONDS = 15
+# How long an EventSource waits before reconnecting
+SSE_RETRY_MS = 3000
+
+# (sequence number, sighting id, record, encoded SSE event)
+FeedEntry = Tuple[int, int, dict, bytes]
+
+def sse_event(event_id: int, record: dict, event: str = "sighting") -> bytes:
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, event.encode(), orjson.dumps(record))
+
+class SightingFeed:
+    def __init__(self, size: int = FEED_REPLAY_SIZE):
+        self.entries: "deque[FeedEntry]" = deque(maxlen=size)
+        self.seq = 0
+        self.floor = 0
+        # Every sighting up to here has been appended, or was never available
+        self.released_id = 0
+        self.changed = asyncio.Event()
+        self.streams = 0
+        self.closed = False
+
+    def start(self, floor: int):
+        """Begin covering the sightings added after floor"""
+        self.floor = max(self.floor, floor)
+        self.released_id = max(self.released_id, floor)
+        self.closed = False
+
+    def stop(self):
+        """Release every waiting reader"""
+        self.closed = True
+        self._notify()
+
+    def publish(self, rows: List[tuple], through_id: int, missing_below: int = 0):
+        """Append the sightings after released_id up to through_id, as SIGHTING_COLUMNS rows in id order.
+
+        missing_below: ids up to here that are absent from rows were never
+        available (e.g. evicted from the hot set), so the buffer stops
+        claiming to cover them.
+        """
+        if through_id <= self.released_id:
+            return
+        if missing_below > self.released_id:
+            self.floor = max(self.floor, missing_below)
+        for row in rows:
+            if len(self.entries) == self.entries.maxlen:
+                self.floor = max(self.floor, self.entries[0][1])
+            self.seq += 1
+            record = sighting_record(row)
+            self.entries.append((self.seq, row[0], record, sse_event(row[0], record)))
+        self.released_id = through_id
+        if rows:
+            self._notify()
+
+    def covers(self, last_id: int) -> bool:
+        return last_id >= self.floor
+
+    def after_id(self, last_id: int) -> List[FeedEntry]:
+        """Buffered entries for sightings newer than last_id, in id order"""
+        return [entry for entry in self.entries if entry[1] > last_id]
+
+    def after_seq(self, seq: int) -> List[FeedEntry]:
+        """Entries appended since sequence number seq"""
+        newer = []
+        for entry in reversed(self.entries):
+            if entry[0] <= seq:
+                break
+            newer.append(entry)
+        newer.reverse()
+        return newer
+
+    async def wait(self, seq: int, timeout: float) -> bool:
+        """Wait up to timeout for something newer than seq; False on timeout or shutdown"""
+        if self.seq > seq:
+            return True
+        if self.closed:
+            return False
+        changed = self.changed
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return self.seq > seq
+
+    def _notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
@@ -0,0 +1,226 @@
+"""The newest sightings, held in memory so common reads skip SQLite.
+
+Map loads, alert feeds and nearby checks almost always ask about recent
+sightings. RecentSightings keeps the newest HOT_SET_SIZE rows (as the same
+SIGHTING_COLUMNS tuples the database returns, so serializers work
+unchanged) in __slots__ records, indexed by id and by grid cell.
+
+It tracks exactly what it can answer for:
+
+- floor_id: every sighting with a larger id is held
+- evicted_epoch: every sighting seen at or after a later time is held
+- contiguous_id: ids up to here have no holes. Sightings from other
+  workers arrive over the alert bus a little late, or not at all when a
+  subscription drops, so the newest held id can run ahead of it.
+
+A query that needs anything older, or that comes while there is a hole,
+returns None and the caller falls back to the database. A hole still open
+after GAP_TIMEOUT_SECONDS is reported by overdue_gap() so the caller can
+fetch the missing rows with fill().
+"""
+import math
+import os
+import time
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from geometry import haversine_km
+from proximity import grid_cell, grid_cells_within
+
+HOT_SET_SIZE = int(os.environ.get("UFOBEEP_HOT_SET_SIZE", 20000))
+# An id missing for this long is fetched from the database rather than awaited from the bus
+GAP_TIMEOUT_SECONDS = 1
+
+# Positions in a SIGHTING_COLUMNS row
+ID, FILEPATH, LAT, LON = 0, 2, 3, 4
+THUMBNAIL, POSTER = 11, 12
+
+class HotSighting:
+    __slots__ = ("row", "epoch", "cell")
+
+    def __init__(self, row: tuple, epoch: Optional[int]):
+        self.row = row
+        self.epoch = epoch
+        self.cell = grid_cell(row[LAT], row[LON]) if row[LAT] is not None and row[LON] is not None else None
+
+class RecentSightings:
+    def __init__(self, size: int = HOT_SET_SIZE):
+        self.size = size
+        self.entries: Dict[int, HotSighting] = {}
+        # Held ids in ascending order; new ids almost always append
+        self.ids: List[int] = []
+        self.cells: Dict[Tuple[int, int], Dict[int, HotSighting]] = {}
+        self.by_filepath: Dict[str, List[int]] = {}
+
+        self.floor_id = 0
+        self.evicted_epoch = -math.inf
+        self.contiguous_id = 0
+        self.gap_since: Optional[float] = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def load(self, rows: List[Tuple[tuple, Optional[int]]], older_id: Optional[int], older_epoch: Optional[int]):
+        """Replace the contents with (row, epoch) pairs, given the newest id and epoch of the rows left out"""
+        self.entries.clear()
+        self.ids.clear()
+        self.cells.clear()
+        self.by_filepath.clear()
+        self.floor_id = older_id or 0
+        self.evicted_epoch = older_epoch if older_epoch is not None else -math.inf
+        self.contiguous_id = self.floor_id
+        self.gap_since = None
+        for row, epoch in sorted(rows, key=lambda pair: pair[0][ID]):
+            self.add(row, epoch)
+        # Holes in what was already stored are permanent, not in flight
+        self.contiguous_id = self.ids[-1] if self.ids else self.floor_id
+
+    def add(self, row: tuple, epoch: Optional[int]):
+        sighting_id = row[ID]
+        if sighting_id in self.entries or sighting_id <= self.floor_id:
+            return
+        entry = HotSighting(row, epoch)
+        self.entries[sighting_id] = entry
+        if not self.ids or sighting_id > self.ids[-1]:
+            self.ids.append(sighting_id)
+        else:
+            insort(self.ids, sighting_id)
+        if entry.cell is not None:
+            self.cells.setdefault(entry.cell, {})[sighting_id] = entry
+        if row[FILEPATH]:
+            self.by_filepath.setdefault(row[FILEPATH], []).append(sighting_id)
+
+        self._advance_contiguous()
+        while len(self.ids) > self.size:
+            self._evict(self.ids[0])
+
+    def set_media(self, filepath: str, thumbnail: Optional[str], poster: Optional[str]):
+        """Mirror set_media_derivatives: fill derivatives on rows that have none yet"""
+        for sighting_id in self.by_filepath.get(filepath, ()):
+            entry = self.entries[sighting_id]
+            if entry.row[THUMBNAIL] is None and entry.row[POSTER] is None:
+                entry.row = (*entry.row[:THUMBNAIL], thumbnail, poster, *entry.row[POSTER + 1:])
+
+    def complete(self) -> bool:
+        """Whether every id up to the newest held one is held or older than floor_id"""
+        self._advance_contiguous()
+        return not self.ids or self.ids[-1] <= self.contiguous_id
+
+    def contiguous(self) -> int:
+        """The id up to which every sighting is held or older than floor_id"""
+        self._advance_contiguous()
+        return self.contiguous_id
+
+    def between(self, after_id: int, through_id: int) -> List[tuple]:
+        """Held rows with after_id < id <= through_id, in id order"""
+        ids = self.ids[bisect_left(self.ids, after_id + 1):bisect_left(self.ids, through_id + 1)]
+        return [self.entries[sighting_id].row for sighting_id in ids]
+
+    def overdue_gap(self) -> Optional[Tuple[int, int]]:
+        """(after_id, before_id) around the missing ids, once a hole has been open GAP_TIMEOUT_SECONDS"""
+        self._advance_contiguous()
+        if self.gap_since is None or time.monotonic() - self.gap_since <= GAP_TIMEOUT_SECONDS:
+            return None
+        return self.contiguous_id, self.ids[-1]
+
+    def fill(self, rows: List[Tuple[tuple, Optional[int]]], before_id: int):
+        """Add the rows fetched for an overdue_gap(); ids below before_id still missing do not exist"""
+        for row, epoch in rows:
+            self.add(row, epoch)
+        self.contiguous_id = max(self.contiguous_id, before_id - 1)
+        self.gap_since = None
+        self._advance_contiguous()
+
+    def newest(self, limit: Optional[int], offset: int = 0, before_id: Optional[int] = None) -> Optional[List[tuple]]:
+        """Rows newest first, like get_all_sightings without after_id"""
+        if not self.complete():
+            return None
+        end = len(self.ids) if before_id is None else bisect_left(self.ids, before_id)
+        end -= offset
+        if limit is None:
+            if self.floor_id:
+                return None
+            start = 0
+        else:
+            start = end - limit
+            if start < 0 and self.floor_id:
+                return None
+        ids = self.ids[max(start, 0):max(end, 0)]
+        return [self.entries[sighting_id].row for sighting_id in reversed(ids)]
+
+    def after(self, after_id: int, limit: Optional[int], offset: int = 0) -> Optional[List[tuple]]:
+        """Rows with a larger id than after_id, oldest first"""
+        if after_id < self.floor_id or not self.complete():
+            return None
+        start = bisect_left(self.ids, after_id + 1) + offset
+        end = len(self.ids) if limit is None else start + limit
+        return [self.entries[sighting_id].row for sighting_id in self.ids[start:end]]
+
+    def since(self, epoch: float) -> Optional[List[HotSighting]]:
+        """Entries seen at or after epoch, or None if older ones might be missing"""
+        if epoch <= self.evicted_epoch or not self.complete():
+            return None
+        return [entry for entry in self.entries.values() if entry.epoch is not None and entry.epoch >= epoch]
+
+    def nearby(self, lat: float, lon: float, radius_km: float, since_epoch: Optional[float] = None):
+        """Rows within radius_km plus their distance, nearest first, like get_nearby_sightings"""
+        if since_epoch is None:
+            if self.floor_id:
+                return None
+        elif since_epoch <= self.evicted_epoch:
+            return None
+        if not self.complete():
+            return None
+
+        lat_cells, lon_cells = grid_cells_within(lat, lon, radius_km)
+        if len(lat_cells) * len(lon_cells) > len(self.cells):
+            cells = [cell for cell in self.cells if cell[0] in lat_cells and cell[1] in lon_cells]
+        else:
+            cells = [(lat_cell, lon_cell) for lat_cell in lat_cells for lon_cell in lon_cells]
+
+        candidates = []
+        for cell in cells:
+            for entry in self.cells.get(cell, {}).values():
+                if since_epoch is None or (entry.epoch is not None and entry.epoch >= since_epoch):
+                    candidates.append(entry.row)
+        if not candidates:
+            return []
+
+        lats = np.fromiter((row[LAT] for row in candidates), dtype=np.float64, count=len(candidates))
+        lons = np.fromiter((row[LON] for row in candidates), dtype=np.float64, count=len(candidates))
+        distances = haversine_km(lat, lon, lats, lons)
+
+        inside = np.flatnonzero(distances <= radius_km)
+        order = inside[np.argsort(distances[inside], kind="stable")]
+        return [(*candidates[i], distance) for i, distance in zip(order.tolist(), distances[order].tolist())]
+
+    def _advance_contiguous(self):
+        while self.contiguous_id + 1 in self.entries:
+            self.contiguous_id += 1
+        if self.ids and self.ids[-1] > self.contiguous_id:
+            if self.gap_since is None:
+                self.gap_since = time.monotonic()
+        else:
+            self.gap_since = None
+
+    def _evict(self, sighting_id: int):
+        entry = self.entries.pop(sighting_id)
+        del self.ids[0]
+        if entry.cell is not None:
+            members = self.cells[entry.cell]
+            del members[sighting_id]
+            if not members:
+                del self.cells[entry.cell]
+        filepath = entry.row[FILEPATH]
+        if filepath:
+            holders = self.by_filepath[filepath]
+            holders.remove(sighting_id)
+            if not holders:
+                del self.by_filepath[filepath]
+
+        self.floor_id = max(self.floor_id, sighting_id)
+        self.contiguous_id = max(self.contiguous_id, sighting_id)
+        if entry.epoch is not None:
+            self.evicted_epoch = max(self.evicted_epoch, entry.epoch)
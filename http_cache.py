@@ -0,0 +1,104 @@
+import functools
+import hashlib
+import inspect
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Optional, Tuple, Union
+
+from fastapi import Request, Response
+
+# For responses whose URL changes whenever their content does
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+RESPONSE_CACHE_SIZE = 512
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches etag (weak comparison, as RFC 9110 requires)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
+class ResponseCache:
+    """Encoded GET responses for read endpoints, tagged with the dataset version.
+
+    Entries are keyed by path, normalised query string, Accept header and
+    version, and the whole cache is dropped as soon as the version moves,
+    so a new sighting invalidates exactly what it could have changed.
+    """
+
+    def __init__(self, version_source: Callable[[], int], size: int = RESPONSE_CACHE_SIZE):
+        self.version_source = version_source
+        self.size = size
+        self.version = None
+        self.entries: "OrderedDict[tuple, Tuple[bytes, str, dict]]" = OrderedDict()
+
+    def cached(self, vary: Optional[Callable[[Request], Union[Hashable, Awaitable[Hashable]]]] = None):
+        """Decorate an endpoint that takes `request: Request` and returns a Response.
+
+        vary adds request-independent state (e.g. the current minute) to the
+        key for responses that change without new data; it may be async.
+        """
+        def decorator(endpoint):
+            @functools.wraps(endpoint)
+            async def wrapper(*args, **kwargs):
+                request: Request = kwargs["request"]
+                version = self.version_source()
+                if version != self.version:
+                    self.entries.clear()
+                    self.version = version
+
+                state = vary(request) if vary else None
+                if inspect.isawaitable(state):
+                    state = await state
+                key = (
+                    request.url.path,
+                    tuple(sorted(request.query_params.multi_items())),
+                    request.headers.get("accept"),
+                    state,
+                )
+                etag = self._etag(version, key)
+                headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+
+                if etag_matches(request.headers.get("if-none-match"), etag):
+                    return Response(status_code=304, headers=headers)
+
+                entry = self.entries.get(key)
+                if entry is not None:
+                    self.entries.move_to_end(key)
+                    body, media_type, extra_headers = entry
+                    return Response(content=body, media_type=media_type, headers={**extra_headers, **headers})
+
+                response = await endpoint(*args, **kwargs)
+                if response.status_code == 200:
+                    extra_headers = {
+                        name: value for name, value in response.headers.items()
+                        if name not in ("content-length", "content-type")
+                    }
+                    self._store(version, key, (response.body, response.media_type, extra_headers))
+                    response.headers.update(headers)
+                return response
+
+            return wrapper
+        return decorator
+
+    def _store(self, version: int, key: tuple, entry: Tuple[bytes, str, dict]):
+        # Computed against a version that has since moved on; don't keep it
+        if version != self.version:
+            return
+        self.entries[key] = entry
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    @staticmethod
+    def _etag(version: int, key: tuple) -> str:
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+        return f'W/"{version}-{digest}"'
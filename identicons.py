@@ -0,0 +1,54 @@
+import hashlib
+import os
+from functools import lru_cache
+
+import pydenticon
+
+from atomic_files import write_atomic
+
+IDENTICON_SIZE = 100
+# For identicon URLs without the current ?v=; the ETag makes revalidation cheap
+UNVERSIONED_CACHE_CONTROL = "public, max-age=86400"
+MEMORY_CACHE_SIZE = 4096
+# Set UFOBEEP_IDENTICON_CACHE_DIR to keep rendered PNGs across restarts
+DISK_CACHE_DIR = os.environ.get("UFOBEEP_IDENTICON_CACHE_DIR")
+
+# Bump when the generator settings change so clients and the disk cache drop old images:
+# it is part of identicon URLs (?v=), their ETags and the disk cache names
+STYLE_VERSION = "1"
+
+generator = pydenticon.Generator(
+    rows=5,
+    columns=5,
+    digest=hashlib.sha1,
+    foreground=[
+        "#1abc9c", "#3498db", "#9b59b6",
+        "#e67e22", "#e74c3c", "#f1c40f"
+    ],
+    background="#ffffff"
+)
+
+def device_digest(device_id: str) -> str:
+    return hashlib.sha256(device_id.encode('utf-8')).hexdigest()
+
+def identicon_etag(device_id: str) -> str:
+    """Strong ETag for a device's identicon, known without rendering it"""
+    return f'"{STYLE_VERSION}-{device_digest(device_id)[:32]}"'
+
+@lru_cache(maxsize=MEMORY_CACHE_SIZE)
+def render_identicon(device_id: str) -> bytes:
+    digest = device_digest(device_id)
+
+    if DISK_CACHE_DIR:
+        path = os.path.join(DISK_CACHE_DIR, f"{STYLE_VERSION}-{digest}.png")
+        try:
+            with open(path, "rb") as cached:
+                return cached.read()
+        except FileNotFoundError:
+            pass
+
+    png = generator.generate(digest, IDENTICON_SIZE, IDENTICON_SIZE, output_format="png")
+
+    if DISK_CACHE_DIR:
+        write_atomic(path, png)
+    return png
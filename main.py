@@ -1,16 +1,29 @@
-from fastapi import FastAPI, UploadFile, Form, File, Response, WebSocket, WebSocketDisconnect, Query
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, UploadFile, Form, File, Response, WebSocket, WebSocketDisconnect, Query, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import List, Optional
+from typing import Optional
+import asyncio
 import json
-import hashlib
-import pydenticon
-from datetime import datetime
+import os
+import time
 
-from upload_handler import save_upload_file
-from database import init_db, save_sighting, get_all_sightings, get_nearby_sightings
-from models import SightingResponse, ProximityAlert
+from upload_handler import save_upload_file, UploadSizeLimitMiddleware
+from database import init_db, close_db, save_sighting, get_all_sightings, get_nearby_sightings, get_recent_sightings, get_tile_clusters, get_dataset_version, get_latest_id, stats, note_sighting, fill_recent_gaps, note_media_derivatives, parse_timestamp, recent
+from alert_audio import AlertAudio
+from alert_bus import create_alert_bus
+from bulk import EXPORT_FORMATS, export_chunks
+from connections import ConnectionManager
+from proximity import DEFAULT_ALERT_RADIUS_KM
+from identicons import identicon_etag, render_identicon, STYLE_VERSION, UNVERSIONED_CACHE_CONTROL
+from feed import SightingFeed, SSE_KEEPALIVE_SECONDS, SSE_RETRY_MS, sse_event
+from hot_set import GAP_TIMEOUT_SECONDS
+from http_cache import etag_matches, IMMUTABLE_CACHE_CONTROL, ResponseCache
+from media import MediaPipeline
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Gauge, LoopLagMonitor, MetricsMiddleware, render_metrics
+from static_files import PrecompressedStaticFiles
+from serialization import render, sighting_record, nearby_record, event_record, COLUMN_INDEX
+from tiles import TileCache, MAX_CLUSTER_ZOOM, encode_tile, tile_bounds
+from triangulation import TriangulationEngine, EVENT_RETENTION_SECONDS
 
 app = FastAPI(title="UFOBeep API", description="Real-time UFO sighting alerts", version="2.0")
 
@@ -21,61 +34,144 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(UploadSizeLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Serve static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.user_locations = {}
-
-    async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        print(f"User {user_id} connected via WebSocket")
-
-    def disconnect(self, websocket: WebSocket, user_id: str):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        if user_id in self.user_locations:
-            del self.user_locations[user_id]
-        print(f"User {user_id} disconnected")
-
-    async def send_personal_message(self, message: str, websocket: WebSocket):
+static_files = PrecompressedStaticFiles(directory="static")
+app.mount("/static", static_files, name="static")
+
+alert_bus = create_alert_bus()
+alert_audio = AlertAudio()
+manager = ConnectionManager(alert_bus, alert_audio)
+tile_cache = TileCache()
+response_cache = ResponseCache(get_dataset_version)
+triangulation = TriangulationEngine()
+feed = SightingFeed()
+
+# Resuming clients further behind than this are told to reload instead
+FEED_RESUME_LIMIT = 500
+LONG_POLL_MAX_SECONDS = 30
+# Largest limit a list endpoint accepts
+MAX_PAGE = 1000
+
+def triangulate(sighting_id: int, lat: float, lon: float, bearing: Optional[float], timestamp, device_id: str):
+    # Reports are matched on when they were seen, falling back to when they arrived
+    epoch = parse_timestamp(timestamp)
+    triangulation.add(sighting_id, lat, lon, bearing, epoch if epoch is not None else time.time(), device_id)
+
+async def load_triangulation():
+    """Replay the sightings that can still belong to a live event"""
+    rows = await get_recent_sightings(EVENT_RETENTION_SECONDS / 3600)
+    columns = [COLUMN_INDEX[name] for name in ("id", "lat", "lon", "bearing", "timestamp", "device_id")]
+    for row in reversed(rows):
+        triangulate(*(row[index] for index in columns))
+
+# Bus messages received while startup loads the database; None once they have been applied
+startup_backlog: Optional[list] = []
+
+async def on_bus_message(message: dict, local: bool):
+    if startup_backlog is not None:
+        startup_backlog.append((message, local))
+        return
+    await apply_bus_message(message, local)
+
+async def apply_startup_backlog(loaded_id: int):
+    """Apply the messages held back during startup, skipping sightings the database load already covered"""
+    global startup_backlog
+    backlog, startup_backlog = startup_backlog, None
+    for message, local in backlog:
+        if message["type"] == "sighting" and message["data"]["id"] <= loaded_id:
+            continue
+        await apply_bus_message(message, local)
+
+async def apply_bus_message(message: dict, local: bool):
+    """Apply an event published by any worker, this one included"""
+    if message["type"] == "sighting":
+        data = message["data"]
+        row = tuple(data.get(name) for name in COLUMN_INDEX)
+        if not local:
+            # Saved by another worker: catch this process's caches and counters up
+            note_sighting(row)
+            tile_cache.invalidate(data["lat"], data["lon"])
+        triangulate(data["id"], data["lat"], data["lon"], data["bearing"], data["timestamp"], data["device_id"])
+        release_feed()
+        await manager.broadcast_proximity_alert(data)
+    elif message["type"] == "media" and not local:
+        note_media_derivatives(message["count"], message.get("filepath"), message.get("thumbnail"), message.get("poster"))
+
+def release_feed():
+    """Append the sightings the hot set now holds without holes to the feed, in id order"""
+    through = recent.contiguous()
+    if through > feed.released_id:
+        feed.publish(recent.between(feed.released_id, through), through, recent.floor_id)
+
+async def close_feed_gaps():
+    """Fetch sightings whose bus message is overdue, so the feed never waits on a hole for long"""
+    while True:
+        await asyncio.sleep(GAP_TIMEOUT_SECONDS)
         try:
-            await websocket.send_text(message)
-        except:
-            pass
+            await fill_recent_gaps()
+        except Exception as e:
+            print(f"Filling feed gaps failed: {e}")
+            continue
+        release_feed()
 
-    async def broadcast_proximity_alert(self, sighting_data: dict):
-        if not self.active_connections:
-            return
-            
-        message = json.dumps({
-            "type": "proximity_alert",
-            "data": sighting_data
-        })
-        
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                disconnected.append(connection)
-        
-        # Clean up disconnected clients
-        for conn in disconnected:
-            if conn in self.active_connections:
-                self.active_connections.remove(conn)
+feed_gap_task: Optional[asyncio.Task] = None
 
-manager = ConnectionManager()
+async def publish_media_derivatives(added: int, filepath: str, thumbnail: Optional[str], poster: Optional[str]):
+    await alert_bus.publish({"type": "media", "count": added, "filepath": filepath, "thumbnail": thumbnail, "poster": poster})
+
+media_pipeline = MediaPipeline(on_recorded=publish_media_derivatives)
+loop_lag_monitor = LoopLagMonitor()
+
+Gauge("ufobeep_websocket_connections", "WebSocket subscribers held by this worker",
+      source=lambda: len(manager.active_connections))
+Gauge("ufobeep_hot_set_rows", "Recent sightings held in memory", source=lambda: len(recent))
+Gauge("ufobeep_sse_streams", "Server-Sent Event streams held by this worker", source=lambda: feed.streams)
+
+def current_minute(request: Request):
+    return int(time.time() // 60)
+
+def time_window(request: Request):
+    # "Last N hours" results shift as time passes, not only when data arrives
+    return current_minute(request) if "hours" in request.query_params else None
+
+async def stats_state(request: Request):
+    return current_minute(request), await alert_bus.connection_count()
+
+MAX_TILE_ZOOM = 22
 
 @app.on_event("startup")
 async def startup():
+    await asyncio.to_thread(static_files.precompress)
+    # Subscribed before the database is read, so no sighting saved meanwhile by another worker is missed
+    await alert_bus.start(on_bus_message)
     await init_db()
+    feed.start(get_latest_id())
+    await load_triangulation()
+    await apply_startup_backlog(get_latest_id())
+    await alert_audio.start()
+    manager.start()
+    media_pipeline.start()
+    loop_lag_monitor.start()
+    global feed_gap_task
+    feed_gap_task = asyncio.create_task(close_feed_gaps())
+
+@app.on_event("shutdown")
+async def shutdown():
+    feed.stop()
+    if feed_gap_task is not None:
+        feed_gap_task.cancel()
+        await asyncio.gather(feed_gap_task, return_exceptions=True)
+    await loop_lag_monitor.stop()
+    await media_pipeline.stop()
+    await manager.stop()
+    await alert_bus.stop()
+    await alert_audio.stop()
+    await close_db()
 
 @app.post("/upload")
 async def upload(
@@ -89,8 +185,10 @@ async def upload(
 ):
     file_path = await save_upload_file(file)
     sighting_id = await save_sighting(file.filename, file_path, lat, lon, bearing, timestamp, device_id, user_flag)
+    tile_cache.invalidate(lat, lon)
+    media_pipeline.submit(file_path)
     
-    # Broadcast proximity alert to nearby users
+    # Proximity alerts go out from every worker that holds a nearby subscriber
     sighting_data = {
         "id": sighting_id,
         "lat": lat,
@@ -98,150 +196,277 @@ async def upload(
         "bearing": bearing,
         "timestamp": timestamp,
         "user_flag": user_flag,
-        "filename": file.filename
+        "device_id": device_id,
+        "filename": file.filename,
+        "filepath": file_path
     }
-    await manager.broadcast_proximity_alert(sighting_data)
+    await alert_bus.publish({"type": "sighting", "data": sighting_data})
     
-    return {"status": "success", "file_url": f"/static/uploads/{file.filename}", "sighting_id": sighting_id}
+    return {"status": "success", "file_url": f"/static/uploads/{os.path.basename(file_path)}", "sighting_id": sighting_id}
 
 @app.get("/sightings")
+@response_cache.cached()
 async def list_sightings(
-    limit: Optional[int] = Query(50, description="Maximum number of sightings to return"),
-    lat: Optional[float] = Query(None, description="Latitude for proximity search"),
-    lon: Optional[float] = Query(None, description="Longitude for proximity search"),
-    radius: Optional[float] = Query(50, description="Search radius in kilometers")
+    request: Request,
+    limit: int = Query(50, ge=1, le=MAX_PAGE, description="Maximum number of sightings to return"),
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Latitude for proximity search"),
+    lon: Optional[float] = Query(None, ge=-180, le=180, description="Longitude for proximity search"),
+    radius: float = Query(50, gt=0, allow_inf_nan=False, description="Search radius in kilometers"),
+    before_id: Optional[int] = Query(None, description="Only sightings older than this id (next page)"),
+    after_id: Optional[int] = Query(None, description="Only sightings newer than this id, oldest first"),
+    since_id: Optional[int] = Query(None, description="Delta sync: sightings added after this id, oldest first"),
+    accept: Optional[str] = Header(None)
 ):
+    if since_id is not None:
+        after_id = since_id
+
+    headers = {}
     if lat is not None and lon is not None:
-        rows = await get_nearby_sightings(lat, lon, radius)
-        # Handle the extra distance field in nearby results
-        rows = [row[:-1] for row in rows]  # Remove distance field for consistency
+        rows = (await get_nearby_sightings(lat, lon, radius))[:limit]
     else:
-        rows = await get_all_sightings()
-    
-    sightings = []
-    for i, row in enumerate(rows[:limit]):
-        sighting = {
-            "id": row[0],
-            "filename": row[1],
-            "url": f"https://ufobeep.com/static/uploads/{row[1]}",
-            "lat": row[3],
-            "lon": row[4],
-            "bearing": row[5],
-            "timestamp": row[6],
-            "device_id": row[7],
-            "user_flag": row[8] if len(row) > 8 else None,
-            "distance_km": row[9] if len(row) > 9 else None,
-            "sighting_id": row[10] if len(row) > 10 else None,
-            "identicon_url": f"https://ufobeep.com/identicon/{row[7]}.png"
-        }
-        sightings.append(sighting)
+        rows = await get_all_sightings(limit, before_id=before_id, after_id=after_id)
+        # Cursor for the next request: keep paging forward, or further back while pages are full
+        if after_id is not None:
+            headers["X-Next-Cursor"] = f"after_id={rows[-1][0] if rows else after_id}"
+        elif len(rows) == limit and rows:
+            headers["X-Next-Cursor"] = f"before_id={rows[-1][0]}"
     
-    return JSONResponse(content=sightings)
+    return render([sighting_record(row) for row in rows], accept, headers)
+
+@app.get("/sightings/export")
+async def export_sightings(
+    format: str = Query("ndjson", description="ndjson or csv"),
+    after_id: int = Query(0, description="Only sightings with a larger id")
+):
+    """The whole table in id order, streamed a chunk at a time"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    return StreamingResponse(
+        export_chunks(format, after_id),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="sightings.{format}"'}
+    )
+
+async def feed_records(since_id: int, limit: int) -> list:
+    """Sightings after since_id from the replay buffer, or from the database when it does not reach back"""
+    if feed.covers(since_id):
+        return [entry[2] for entry in feed.after_id(since_id)[:limit]]
+    return [sighting_record(row) for row in await get_all_sightings(limit, after_id=since_id)]
+
+@app.get("/sightings/updates")
+async def sighting_updates(
+    since_id: int = Query(..., description="Newest sighting id the client has"),
+    timeout: float = Query(25, description=f"Seconds to wait for a new sighting (at most {LONG_POLL_MAX_SECONDS})"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE, description="Maximum number of sightings to return"),
+    accept: Optional[str] = Header(None)
+):
+    """Long-poll delta feed: returns as soon as there is something newer than since_id"""
+    timeout = min(max(timeout, 0), LONG_POLL_MAX_SECONDS)
+    deadline = asyncio.get_running_loop().time() + timeout
+    seq = feed.seq
+    records = await feed_records(since_id, limit)
+    while not records:
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0 or not await feed.wait(seq, remaining):
+            break
+        newer = feed.after_seq(seq)
+        seq = newer[-1][0] if newer else feed.seq
+        records = [entry[2] for entry in newer if entry[1] > since_id][:limit]
+
+    next_id = max([since_id] + [record["id"] for record in records])
+    return render(records, accept, {"X-Next-Cursor": f"since_id={next_id}"})
+
+async def sse_stream(last_id: Optional[int]):
+    feed.streams += 1
+    try:
+        seq = feed.seq
+        resent = set()
+        yield b"retry: %d\n\n" % SSE_RETRY_MS
+        if last_id is not None:
+            if feed.covers(last_id):
+                for entry in feed.after_id(last_id):
+                    yield entry[3]
+            else:
+                rows = await get_all_sightings(FEED_RESUME_LIMIT + 1, after_id=last_id)
+                if len(rows) > FEED_RESUME_LIMIT:
+                    yield b"event: reset\ndata: {}\n\n"
+                else:
+                    # Anything published while we queried arrives live as well
+                    resent = {row[0] for row in rows}
+                    for row in rows:
+                        yield sse_event(row[0], sighting_record(row))
+
+        while not feed.closed:
+            if not await feed.wait(seq, SSE_KEEPALIVE_SECONDS):
+                yield b": keepalive\n\n"
+                continue
+            for entry in feed.after_seq(seq):
+                seq = entry[0]
+                if entry[1] not in resent:
+                    yield entry[3]
+    finally:
+        feed.streams -= 1
+
+@app.get("/events")
+async def event_stream(
+    since_id: Optional[int] = Query(None, description="Resume after this sighting id"),
+    last_event_id: Optional[str] = Header(None)
+):
+    """Server-Sent Events: one `sighting` event per new sighting, resumable with Last-Event-ID.
+
+    An `event: reset` means the client was too far behind to replay and
+    should reload /sightings.
+    """
+    if last_event_id and last_event_id.isdigit():
+        since_id = int(last_event_id)
+    return StreamingResponse(
+        sse_stream(since_id),
+        media_type="text/event-stream",
+        # Unbuffered through nginx
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/sightings/nearby")
+@response_cache.cached(vary=time_window)
 async def nearby_sightings(
-    lat: float = Query(..., description="Your latitude"),
-    lon: float = Query(..., description="Your longitude"),
-    radius: float = Query(50, description="Search radius in kilometers")
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90, description="Your latitude"),
+    lon: float = Query(..., ge=-180, le=180, description="Your longitude"),
+    radius: float = Query(50, gt=0, allow_inf_nan=False, description="Search radius in kilometers"),
+    hours: Optional[float] = Query(None, gt=0, allow_inf_nan=False, description="Only sightings from the last N hours"),
+    accept: Optional[str] = Header(None)
 ):
-    rows = await get_nearby_sightings(lat, lon, radius)
-    nearby = []
-    for row in rows:
-        # row[-1] is the calculated distance
-        sighting_data = row[:-1]  # All data except distance
-        distance = row[-1]  # The calculated distance
-        
-        sighting = {
-            "id": sighting_data[0],
-            "filename": sighting_data[1],
-            "url": f"https://ufobeep.com/static/uploads/{sighting_data[1]}",
-            "lat": sighting_data[3],
-            "lon": sighting_data[4],
-            "bearing": sighting_data[5],
-            "timestamp": sighting_data[6],
-            "device_id": sighting_data[7],
-            "user_flag": sighting_data[8] if len(sighting_data) > 8 else None,
-            "distance_km": distance,
-            "sighting_id": sighting_data[10] if len(sighting_data) > 10 else None,
-            "identicon_url": f"https://ufobeep.com/identicon/{sighting_data[7]}.png"
-        }
-        nearby.append(sighting)
-    
-    return JSONResponse(content=nearby)
+    rows = await get_nearby_sightings(lat, lon, radius, hours)
+    return render([nearby_record(row) for row in rows], accept)
+
+@app.get("/sightings/events")
+@response_cache.cached(vary=current_minute)
+async def sighting_events(
+    request: Request,
+    hours: Optional[float] = Query(24, description="Only events active in the last N hours"),
+    min_confidence: float = Query(0, description="Drop events below this confidence (0-1)"),
+    limit: int = Query(50, ge=1, le=MAX_PAGE, description="Maximum number of events to return"),
+    accept: Optional[str] = Header(None)
+):
+    """Objects located by crossing the bearings of concurrent reports, most recently active first"""
+    since = time.time() - hours * 3600 if hours is not None else float("-inf")
+    records = []
+    for event in triangulation.recent(since):
+        record = event_record(event)
+        if record["confidence"] >= min_confidence:
+            records.append(record)
+            if len(records) == limit:
+                break
+    return render(records, accept)
+
+@app.get("/sightings/events/{event_id}")
+@response_cache.cached()
+async def sighting_event(request: Request, event_id: int, accept: Optional[str] = Header(None)):
+    event = triangulation.get(event_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail="No such event")
+    return render(event_record(event, with_members=True), accept)
+
+@app.get("/tiles/{z}/{x}/{y}")
+async def tile(z: int, x: int, y: int):
+    """Pre-aggregated sighting clusters for one map tile"""
+    if not (0 <= z <= MAX_TILE_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        raise HTTPException(status_code=404, detail="No such tile")
+
+    if z > MAX_CLUSTER_ZOOM:
+        # Past the deepest level, cut the clusters of the covering tile down to this one
+        shift = z - MAX_CLUSTER_ZOOM
+        west, south, east, north = tile_bounds(z, x, y)
+        clusters = [
+            cluster for cluster in await get_tile_clusters(MAX_CLUSTER_ZOOM, x >> shift, y >> shift)
+            if south <= cluster[1] < north and west <= cluster[2] < east
+        ]
+        return Response(content=encode_tile(z, x, y, clusters), media_type="application/json")
+
+    payload = tile_cache.get((z, x, y))
+    if payload is None:
+        generation = tile_cache.generation
+        payload = encode_tile(z, x, y, await get_tile_clusters(z, x, y))
+        tile_cache.put((z, x, y), payload, generation)
+    return Response(content=payload, media_type="application/json")
 
 @app.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    await manager.connect(websocket, user_id)
+    connection = await manager.connect(websocket, user_id)
     try:
         while True:
             data = await websocket.receive_text()
-            message_data = json.loads(data)
+            try:
+                message_data = json.loads(data)
+            except ValueError:
+                continue
+            if not isinstance(message_data, dict):
+                continue
+            connection.received(message_data.get("type"))
             
-            # Store user location for proximity alerts
+            # Index user location for proximity alerts
             if message_data.get("type") == "location_update":
-                manager.user_locations[user_id] = {
-                    "lat": message_data.get("lat"),
-                    "lon": message_data.get("lon"),
-                    "timestamp": datetime.now().isoformat()
-                }
-                await manager.send_personal_message(f"Location updated for {user_id}", websocket)
+                try:
+                    lat = float(message_data["lat"])
+                    lon = float(message_data["lon"])
+                    radius = float(message_data.get("radius_km", DEFAULT_ALERT_RADIUS_KM))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                # Also turns away NaN, which every comparison fails
+                if not (-90 <= lat <= 90 and -180 <= lon <= 180 and radius >= 0):
+                    continue
+                # Optional: pick the spoken alert clip (e.g. "es", "mi")
+                if isinstance(message_data.get("language"), str):
+                    connection.language = message_data["language"]
+                if isinstance(message_data.get("units"), str):
+                    connection.unit = message_data["units"]
+                manager.update_location(connection, lat, lon, radius)
             
-    except WebSocketDisconnect:
-        manager.disconnect(websocket, user_id)
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: the socket was closed by an eviction while we were waiting on it
+        pass
+    finally:
+        await manager.disconnect(connection)
+
+@app.get("/alerts/audio/{language}/{unit}/{distance}/{direction}.mp3")
+async def alert_clip(language: str, unit: str, distance: int, direction: str,
+                     if_none_match: Optional[str] = Header(None)):
+    """One ready-to-play spoken alert, as linked from proximity_alert messages"""
+    key = (language, distance, direction, unit)
+    if not alert_audio.is_valid(key):
+        raise HTTPException(status_code=404, detail="No such alert clip")
+    headers = {"ETag": alert_audio.etag(key), "Cache-Control": "public, max-age=86400"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    clip = await alert_audio.get(key)
+    if clip is None:
+        raise HTTPException(status_code=404, detail="Sound pack is missing a segment of this clip")
+    return Response(content=clip, media_type="audio/mpeg", headers=headers)
 
 @app.get("/identicon/{device_id}.png")
-def identicon(device_id: str):
-    digest = hashlib.sha256(device_id.encode('utf-8')).hexdigest()
-    generator = pydenticon.Generator(
-        rows=5,
-        columns=5,
-        digest=hashlib.sha1,
-        foreground=[
-            "#1abc9c", "#3498db", "#9b59b6",
-            "#e67e22", "#e74c3c", "#f1c40f"
-        ],
-        background="#ffffff"
-    )
-    png = generator.generate(digest, 100, 100, output_format="png")
-    return Response(content=png, media_type="image/png")
+def identicon(device_id: str, v: Optional[str] = Query(None, description="Identicon style version"),
+              if_none_match: Optional[str] = Header(None)):
+    # Only a URL naming the current style can be cached for good
+    cache_control = IMMUTABLE_CACHE_CONTROL if v == STYLE_VERSION else UNVERSIONED_CACHE_CONTROL
+    headers = {"ETag": identicon_etag(device_id), "Cache-Control": cache_control}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=render_identicon(device_id), media_type="image/png", headers=headers)
 
 @app.get("/stats")
-async def get_stats():
-    try:
-        all_sightings = await get_all_sightings()
-        total_sightings = len(all_sightings)
-        
-        # Count recent (last 24h) - simplified
-        recent_count = 0
-        current_time = datetime.now()
-        for sighting in all_sightings:
-            try:
-                sighting_time = datetime.fromisoformat(sighting[6].replace('Z', '+00:00'))
-                if (current_time - sighting_time).days < 1:
-                    recent_count += 1
-            except:
-                pass
-        
-        # Count unique countries
-        countries = set()
-        for sighting in all_sightings:
-            if len(sighting) > 8 and sighting[8]:
-                countries.add(sighting[8])
-        
-        return {
-            "total_sightings": total_sightings,
-            "recent_24h": recent_count,
-            "active_websocket_connections": len(manager.active_connections),
-            "countries_represented": len(countries)
-        }
-    except Exception as e:
-        print(f"Stats error: {e}")
-        return {
-            "total_sightings": 12,
-            "recent_24h": 8,
-            "active_websocket_connections": len(manager.active_connections),
-            "countries_represented": 4
-        }
+@response_cache.cached(vary=stats_state)
+async def get_stats(request: Request, accept: Optional[str] = Header(None)):
+    return render({
+        "total_sightings": stats.total,
+        "recent_24h": stats.recent_count(),
+        "active_websocket_connections": await alert_bus.connection_count(),
+        "countries_represented": stats.distinct_flags
+    }, accept)
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
 
 @app.get("/")
 async def root():
@@ -3,9 +3,10 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from upload_handler import save_upload_file
-from database import init_db, save_sighting, get_all_sightings, get_nearby_sightings
-import math
-from datetime import datetime, timedelta
+from database import init_db, close_db, save_sighting, get_all_sightings, get_nearby_sightings
+from geometry import initial_bearing_deg
+import numpy as np
+from datetime import datetime
 from typing import Optional
 
 app = FastAPI(title="UFOBeep API", version="1.0.0")
@@ -25,6 +26,10 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 async def startup():
     await init_db()
 
+@app.on_event("shutdown")
+async def shutdown():
+    await close_db()
+
 @app.get("/")
 async def root():
     return {"message": "UFOBeep API v1.0.0", "status": "active"}
@@ -104,72 +109,41 @@ async def get_nearby_sightings_endpoint(
         if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
             raise HTTPException(status_code=400, detail="Invalid coordinates")
         
-        # Calculate time threshold
-        time_threshold = datetime.utcnow() - timedelta(hours=hours)
-        
-        # Get nearby sightings (simplified - in production use spatial database)
-        rows = await get_all_sightings(limit * 3, 0)  # Get more to filter
+        # Spatial and time-window filtering both happen in the database
+        rows = await get_nearby_sightings(lat, lon, radius_km, hours=hours)
+        rows = rows[:limit]
         nearby_sightings = []
         
-        for row in rows:
-            # Calculate distance using Haversine formula
-            sighting_lat, sighting_lon = row[3], row[4]
-            distance = calculate_distance(lat, lon, sighting_lat, sighting_lon)
+        # Bearing from user to each sighting, computed in one pass
+        bearings = initial_bearing_deg(
+            lat, lon,
+            np.array([row[3] for row in rows], dtype=np.float64),
+            np.array([row[4] for row in rows], dtype=np.float64)
+        ).round(1).tolist()
+        
+        for row, bearing_to_sighting in zip(rows, bearings):
+            sighting_lat, sighting_lon, distance = row[3], row[4], row[-1]
             
-            if distance <= radius_km:
-                # Calculate bearing from user to sighting
-                bearing_to_sighting = calculate_bearing(lat, lon, sighting_lat, sighting_lon)
-                
-                nearby_sightings.append({
-                    "id": row[0],
-                    "filename": row[1],
-                    "url": f"https://ufobeep.com/static/uploads/{row[1]}",
-                    "lat": sighting_lat,
-                    "lon": sighting_lon,
-                    "bearing": row[5],  # Original sighting bearing
-                    "bearing_to_sighting": bearing_to_sighting,  # Bearing from user to sighting
-                    "distance_km": round(distance, 2),
-                    "timestamp": row[6],
-                    "device_id": row[7],
-                    "media_type": row[8] if len(row) > 8 else "photo"
-                })
+            nearby_sightings.append({
+                "id": row[0],
+                "filename": row[1],
+                "url": f"https://ufobeep.com/static/uploads/{row[1]}",
+                "lat": sighting_lat,
+                "lon": sighting_lon,
+                "bearing": row[5],  # Original sighting bearing
+                "bearing_to_sighting": bearing_to_sighting,  # Bearing from user to sighting
+                "distance_km": round(distance, 2),
+                "timestamp": row[6],
+                "device_id": row[7],
+                "media_type": row[8] if len(row) > 8 else "photo"
+            })
         
-        # Sort by distance and limit results
-        nearby_sightings.sort(key=lambda x: x["distance_km"])
-        return JSONResponse(content=nearby_sightings[:limit])
+        # Rows already come back sorted by distance
+        return JSONResponse(content=nearby_sightings)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch nearby sightings: {str(e)}")
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points using Haversine formula"""
-    R = 6371  # Earth's radius in kilometers
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
-    
-    a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    return R * c
-
-def calculate_bearing(lat1, lon1, lat2, lon2):
-    """Calculate bearing from point 1 to point 2"""
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lon = math.radians(lon2 - lon1)
-    
-    y = math.sin(delta_lon) * math.cos(lat2_rad)
-    x = math.cos(lat1_rad) * math.sin(lat2_rad) - math.sin(lat1_rad) * math.cos(lat2_rad) * math.cos(delta_lon)
-    
-    bearing = math.atan2(y, x)
-    bearing = math.degrees(bearing)
-    bearing = (bearing + 360) % 360  # Normalize to 0-360
-    
-    return round(bearing, 1)
-
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -1,7 +1,7 @@
 from fastapi import FastAPI, UploadFile, Form, File
 from fastapi.staticfiles import StaticFiles
 from upload_handler import save_upload_file
-from database import init_db, save_sighting
+from database import init_db, close_db, save_sighting
 
 app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -10,6 +10,10 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 async def startup():
     await init_db()
 
+@app.on_event("shutdown")
+async def shutdown():
+    await close_db()
+
 @app.post("/upload")
 async def upload(
     file: UploadFile = File(...),
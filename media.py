@@ -0,0 +1,164 @@
+"""Thumbnails and video poster frames for uploaded media.
+
+Derivatives are rendered in a process pool so resizing never blocks the
+event loop, and are stored next to the original:
+
+    <hash>.jpg -> <hash>.thumb.jpg, <hash>.thumb.webp
+    <hash>.mp4 -> <hash>.poster.jpg, <hash>.thumb.jpg, <hash>.thumb.webp
+
+Backfill an existing uploads directory with:
+
+    python media.py backfill
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Optional, Set, Tuple
+
+from PIL import Image, ImageOps
+
+from atomic_files import atomic_path
+from database import init_db, close_db, set_media_derivatives
+from upload_handler import UPLOAD_DIR
+
+THUMBNAIL_SIZE = (320, 320)
+JPEG_QUALITY = 80
+WEBP_QUALITY = 75
+POSTER_OFFSET_SECONDS = 1
+MEDIA_WORKERS = int(os.environ.get("UFOBEEP_MEDIA_WORKERS", 2))
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".heic"}
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".m4v", ".webm", ".3gp", ".avi", ".mkv"}
+DERIVATIVE_MARKERS = (".thumb.", ".poster.")
+
+def is_derivative(filepath: str) -> bool:
+    return any(marker in os.path.basename(filepath) for marker in DERIVATIVE_MARKERS)
+
+def derivative_paths(filepath: str):
+    """(thumbnail_jpeg, thumbnail_webp, poster) paths for an original upload"""
+    stem = os.path.splitext(filepath)[0]
+    return f"{stem}.thumb.jpg", f"{stem}.thumb.webp", f"{stem}.poster.jpg"
+
+def _save_atomic(image: Image.Image, path: str, **options):
+    with atomic_path(path, prefix=".derivative-") as temp_path:
+        image.save(temp_path, **options)
+
+def _extract_poster(video_path: str, poster_path: str) -> bool:
+    if shutil.which("ffmpeg") is None:
+        return False
+    # Clips shorter than the offset produce no frame, so retry from the start
+    for offset in (POSTER_OFFSET_SECONDS, 0):
+        try:
+            # ffmpeg picks the output format from the .jpg suffix
+            with atomic_path(poster_path, prefix=".derivative-", suffix=".jpg") as temp_path:
+                subprocess.run(
+                    ["ffmpeg", "-y", "-loglevel", "error", "-ss", str(offset), "-i", video_path,
+                     "-frames:v", "1", "-q:v", "3", temp_path],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
+                )
+                if os.path.getsize(temp_path) == 0:
+                    raise subprocess.CalledProcessError(0, "ffmpeg")
+            return True
+        except subprocess.CalledProcessError:
+            continue
+    return False
+
+def render_derivatives(filepath: str) -> Tuple[Optional[str], Optional[str]]:
+    """Create the missing derivatives of one upload; returns (thumbnail, poster) file names.
+
+    Runs in a worker process. Files that already exist are reused, which is
+    also what makes repeated uploads of the same content free.
+    """
+    extension = os.path.splitext(filepath)[1].lower()
+    thumb_jpeg, thumb_webp, poster = derivative_paths(filepath)
+
+    if extension in VIDEO_EXTENSIONS:
+        if not os.path.exists(poster) and not _extract_poster(filepath, poster):
+            return None, None
+        source = poster
+    elif extension in IMAGE_EXTENSIONS:
+        source, poster = filepath, None
+    else:
+        return None, None
+
+    if not (os.path.exists(thumb_jpeg) and os.path.exists(thumb_webp)):
+        try:
+            with Image.open(source) as image:
+                image = ImageOps.exif_transpose(image).convert("RGB")
+                image.thumbnail(THUMBNAIL_SIZE)
+                _save_atomic(image, thumb_jpeg, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+                _save_atomic(image, thumb_webp, format="WEBP", quality=WEBP_QUALITY)
+        except (OSError, Image.DecompressionBombError):
+            # Not an image Pillow can read (or a corrupt one); keep serving the original only
+            return None, os.path.basename(poster) if poster else None
+
+    return os.path.basename(thumb_jpeg), os.path.basename(poster) if poster else None
+
+class MediaPipeline:
+    """Process pool fed by /upload; records finished derivatives in the database"""
+
+    def __init__(self, workers: int = MEDIA_WORKERS,
+                 on_recorded: Optional[Callable[[int, str, Optional[str], Optional[str]], Awaitable[None]]] = None):
+        self.workers = workers
+        # Called with the number of derivatives stored and (filepath, thumbnail, poster), e.g. to tell other workers
+        self.on_recorded = on_recorded
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.pending: Set[asyncio.Task] = set()
+
+    def start(self):
+        # Forking would copy a process whose event loop and aiosqlite threads are running
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def stop(self):
+        if self.pending:
+            await asyncio.gather(*self.pending, return_exceptions=True)
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def submit(self, filepath: str):
+        """Queue derivatives for an upload without waiting for them"""
+        task = asyncio.create_task(self.process(filepath))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def process(self, filepath: str):
+        loop = asyncio.get_running_loop()
+        try:
+            thumbnail, poster = await loop.run_in_executor(self.executor, render_derivatives, filepath)
+        except Exception as e:
+            print(f"Derivatives failed for {filepath}: {e}")
+            return
+        if thumbnail or poster:
+            added = await set_media_derivatives(filepath, thumbnail, poster)
+            if added and self.on_recorded is not None:
+                await self.on_recorded(added, filepath, thumbnail, poster)
+
+async def backfill(upload_dir: str = UPLOAD_DIR, workers: int = MEDIA_WORKERS):
+    """Render derivatives for every original already in upload_dir"""
+    await init_db()
+    pipeline = MediaPipeline(workers)
+    pipeline.start()
+    try:
+        originals = [
+            os.path.join(upload_dir, name) for name in sorted(os.listdir(upload_dir))
+            if not name.startswith(".") and not is_derivative(name)
+        ]
+        await asyncio.gather(*(pipeline.process(path) for path in originals))
+        print(f"Processed {len(originals)} uploads in {upload_dir}")
+    finally:
+        await pipeline.stop()
+        await close_db()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UFOBeep media derivatives")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--upload-dir", default=UPLOAD_DIR)
+    parser.add_argument("--workers", type=int, default=MEDIA_WORKERS)
+    args = parser.parse_args()
+
+    asyncio.run(backfill(args.upload_dir, args.workers))
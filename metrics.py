@@ -0,0 +1,228 @@
+"""Process-local metrics rendered in the Prometheus text format at /metrics.
+
+Recording is a dict lookup plus a bisect over the bucket bounds, so the
+hooks stay on in production. With several workers each process reports its
+own values; scrape each worker or aggregate with sum() in Prometheus.
+"""
+import asyncio
+import functools
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 5e7, 1e8, 2e8)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+LOOP_LAG_INTERVAL_SECONDS = 0.5
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(labels[name] for name in self.label_names)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self.samples()
+
+    def samples(self):
+        return iter(())
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self.values: Dict[Tuple, float] = {}
+        if not self.label_names:
+            self.values[()] = 0
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+class Gauge(Metric):
+    """Set directly, or read from `source` at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 source: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text, labels)
+        self.values: Dict[Tuple, float] = {}
+        self.source = source
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+    def samples(self):
+        if self.source is not None:
+            yield f"{self.name} {_format_value(self.source())}"
+            return
+        for key, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.bounds = tuple(sorted(buckets))
+        # Per label set: [count per bucket..., count above the last bound, sum]
+        self.series: Dict[Tuple, list] = {}
+        if not self.label_names:
+            self.series[()] = self._empty_series()
+
+    def _empty_series(self) -> list:
+        return [0] * (len(self.bounds) + 1) + [0.0]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = self._empty_series()
+        series[bisect_left(self.bounds, value)] += 1
+        series[-1] += value
+
+    def time(self, **labels):
+        """Decorator timing every call of an async function"""
+        def decorator(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    def samples(self):
+        for key, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), series):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(series[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+REGISTRY = []
+
+def render_metrics() -> bytes:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return ("\n".join(lines) + "\n").encode()
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "ufobeep_http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status")
+)
+DB_QUERY_SECONDS = Histogram(
+    "ufobeep_db_query_duration_seconds", "Time spent in database.py functions, including waits for a connection",
+    ("function",)
+)
+UPLOAD_BYTES = Histogram("ufobeep_upload_bytes", "Size of stored uploads", buckets=SIZE_BUCKETS)
+UPLOAD_SECONDS = Histogram("ufobeep_upload_duration_seconds", "Time to receive, hash and store an upload")
+WEBSOCKET_EVENTS = Counter(
+    "ufobeep_websocket_events_total", "WebSocket connects, disconnects and evictions", ("event",)
+)
+WEBSOCKET_DROPPED = Counter(
+    "ufobeep_websocket_dropped_messages_total", "Outbound frames dropped because a client's queue was full"
+)
+FANOUT_SECONDS = Histogram("ufobeep_alert_fanout_duration_seconds", "Time to match and queue one proximity alert")
+FANOUT_RECIPIENTS = Histogram(
+    "ufobeep_alert_fanout_recipients", "Messages queued per proximity alert", buckets=COUNT_BUCKETS
+)
+FANOUT_MESSAGES = Counter("ufobeep_alert_messages_total", "Proximity alert messages queued")
+HOT_SET_READS = Counter(
+    "ufobeep_hot_set_reads_total", "Reads answered from the in-memory recent sightings (hit) or SQLite (miss)",
+    ("function", "result")
+)
+LOOP_LAG_SECONDS = Histogram("ufobeep_event_loop_lag_seconds", "How late the event loop ran a timer")
+
+class MetricsMiddleware:
+    """ASGI middleware recording HTTP_REQUEST_SECONDS.
+
+    Requests are labelled with the matched route's path template (not the
+    raw URL), so /identicon/{device_id}.png stays one series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"], route=getattr(route, "path", "unmatched"), status=status
+            )
+
+class LoopLagMonitor:
+    """Sleeps LOOP_LAG_INTERVAL_SECONDS at a time and records how much later than asked it woke up"""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_SECONDS):
+        self.interval = interval
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - start - self.interval))
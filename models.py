@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class Sighting(BaseModel):
@@ -27,6 +27,21 @@ class SightingResponse(BaseModel):
     distance_km: Optional[float] = None
     sighting_id: Optional[str] = None
     identicon_url: str
+    thumbnail_url: Optional[str] = None
+    thumbnail_webp_url: Optional[str] = None
+    poster_url: Optional[str] = None
+
+class SightingEventResponse(BaseModel):
+    id: int
+    lat: float
+    lon: float
+    spread_km: float
+    confidence: float
+    observers: int
+    sighting_count: int
+    first_seen: str
+    last_seen: str
+    sighting_ids: Optional[List[int]] = None
 
 class ProximityAlert(BaseModel):
     sighting_id: str
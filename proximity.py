@@ -0,0 +1,97 @@
+import math
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+from geometry import bounding_box, haversine_km
+
+# Subscribers are bucketed into GRID_DEGREES x GRID_DEGREES cells so an alert
+# only looks at the cells its search circle overlaps.
+GRID_DEGREES = 1.0
+LON_CELLS = int(360 / GRID_DEGREES)
+
+DEFAULT_ALERT_RADIUS_KM = 50
+MAX_ALERT_RADIUS_KM = 500
+
+def grid_cell(lat: float, lon: float) -> Tuple[int, int]:
+    """Grid cell a coordinate falls into"""
+    return (
+        int(math.floor((lat + 90) / GRID_DEGREES)),
+        int(math.floor((lon + 180) / GRID_DEGREES)) % LON_CELLS
+    )
+
+def grid_cells_within(lat: float, lon: float, radius_km: float) -> Tuple[range, Set[int]]:
+    """(lat cells, lon cells) whose product covers a search circle"""
+    min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius_km)
+    lat_cells = range(grid_cell(min_lat, 0)[0], grid_cell(max_lat, 0)[0] + 1)
+
+    lon_cells = set()
+    for min_lon, max_lon in lon_ranges:
+        first = grid_cell(0, min_lon)[1]
+        last = grid_cell(0, max_lon)[1]
+        if max_lon >= 180:
+            last = LON_CELLS - 1
+        lon_cells.update(range(first, last + 1))
+    return lat_cells, lon_cells
+
+class SubscriberGrid:
+    """Last known position and alert radius of each connected user, indexed by grid cell"""
+
+    def __init__(self):
+        self.cells: Dict[Tuple[int, int], Set[str]] = {}
+        self.positions: Dict[str, Tuple[float, float, float, Tuple[int, int]]] = {}
+        self.radius_counts: Dict[float, int] = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def update(self, user_id: str, lat: float, lon: float, radius_km: float = DEFAULT_ALERT_RADIUS_KM):
+        radius_km = min(max(radius_km, 0), MAX_ALERT_RADIUS_KM)
+        self.remove(user_id)
+
+        cell = grid_cell(lat, lon)
+        self.cells.setdefault(cell, set()).add(user_id)
+        self.positions[user_id] = (lat, lon, radius_km, cell)
+        self.radius_counts[radius_km] = self.radius_counts.get(radius_km, 0) + 1
+
+    def remove(self, user_id: str):
+        entry = self.positions.pop(user_id, None)
+        if entry is None:
+            return
+
+        _, _, radius_km, cell = entry
+        members = self.cells[cell]
+        members.discard(user_id)
+        if not members:
+            del self.cells[cell]
+
+        self.radius_counts[radius_km] -= 1
+        if not self.radius_counts[radius_km]:
+            del self.radius_counts[radius_km]
+
+    def nearby(self, lat: float, lon: float) -> List[Tuple[str, float]]:
+        """(user_id, distance_km) for every subscriber whose alert radius covers the point"""
+        if not self.positions:
+            return []
+
+        search_radius = max(self.radius_counts)
+        candidates = [
+            user_id
+            for cell in self._cells_within(lat, lon, search_radius)
+            for user_id in self.cells.get(cell, ())
+        ]
+        if not candidates:
+            return []
+
+        entries = np.array([self.positions[user_id][:3] for user_id in candidates], dtype=np.float64)
+        distances = haversine_km(lat, lon, entries[:, 0], entries[:, 1])
+        inside = np.flatnonzero(distances <= entries[:, 2])
+        return [(candidates[i], distances[i].item()) for i in inside.tolist()]
+
+    def _cells_within(self, lat: float, lon: float, radius_km: float):
+        lat_cells, lon_cells = grid_cells_within(lat, lon, radius_km)
+
+        # A huge search area can cover more cells than are occupied
+        if len(lat_cells) * len(lon_cells) > len(self.cells):
+            return [cell for cell in list(self.cells) if cell[0] in lat_cells and cell[1] in lon_cells]
+        return [(lat_cell, lon_cell) for lat_cell in lat_cells for lon_cell in lon_cells]
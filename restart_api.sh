@@ -6,7 +6,15 @@ sleep 2
 
 echo "Starting enhanced UFOBeep API..."
 source venv/bin/activate
-nohup python3 -m uvicorn main:app --host 0.0.0.0 --port 8000 > api.log 2>&1 &
+# gzip/brotli variants of the pages nginx serves (gzip_static / brotli_static)
+python3 static_files.py precompress *.html site.webmanifest
+# Workers share proximity alerts and presence through the alert bus (see alert_bus.py)
+WORKERS=${UFOBEEP_WORKERS:-1}
+if [ "$WORKERS" -gt 1 ]; then
+    export UFOBEEP_ALERT_BUS=${UFOBEEP_ALERT_BUS:-sqlite}
+fi
+# Protocol-level pings catch dead sockets of app builds that predate the JSON heartbeat
+nohup python3 -m uvicorn main:app --host 0.0.0.0 --port 8000 --workers "$WORKERS" --ws-ping-interval 20 --ws-ping-timeout 20 > api.log 2>&1 &
 
 sleep 3
 if curl -s http://localhost:8000/ > /dev/null; then
@@ -0,0 +1,111 @@
+import os
+from datetime import datetime, timezone
+from operator import itemgetter
+from typing import Callable, Optional
+
+import msgpack
+import orjson
+from fastapi import Response
+
+from database import SIGHTING_COLUMNS
+from identicons import STYLE_VERSION
+from models import SightingResponse
+
+PUBLIC_URL = "https://ufobeep.com"
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+COLUMN_INDEX = {name: index for index, name in enumerate(SIGHTING_COLUMNS.split(", "))}
+
+def _media_url(row) -> str:
+    # Uploads are stored under a content-hash name, so link the stored file
+    filepath = row[COLUMN_INDEX["filepath"]]
+    name = os.path.basename(filepath) if filepath else row[COLUMN_INDEX["filename"]]
+    return f"{PUBLIC_URL}/static/uploads/{name}"
+
+def _identicon_url(row) -> str:
+    # Versioned, so the image can be cached as immutable and a style change still reaches clients
+    return f"{PUBLIC_URL}/identicon/{row[COLUMN_INDEX['device_id']]}.png?v={STYLE_VERSION}"
+
+def _derivative_url(column: str, extension: Optional[str] = None):
+    index = COLUMN_INDEX[column]
+
+    def url(row) -> Optional[str]:
+        name = row[index]
+        if not name:
+            return None
+        if extension:
+            name = os.path.splitext(name)[0] + extension
+        return f"{PUBLIC_URL}/static/uploads/{name}"
+
+    return url
+
+DERIVED_FIELDS = {
+    "url": _media_url,
+    "identicon_url": _identicon_url,
+    "thumbnail_url": _derivative_url("thumbnail"),
+    "thumbnail_webp_url": _derivative_url("thumbnail", ".webp"),
+    "poster_url": _derivative_url("poster"),
+}
+
+def build_row_mapper(model=SightingResponse, distance_index: Optional[int] = None) -> Callable[[tuple], dict]:
+    """Build a function turning a SIGHTING_COLUMNS row into a dict of model's fields.
+
+    The field list is resolved once into (name, getter) pairs, so a row only
+    costs one call per field. With distance_index, distance_km is read from
+    that position (the distance get_nearby_sightings appends) instead of the
+    stored column.
+    """
+    getters = []
+    for name in model.model_fields:
+        if name == "distance_km" and distance_index is not None:
+            getter = itemgetter(distance_index)
+        elif name in DERIVED_FIELDS:
+            getter = DERIVED_FIELDS[name]
+        elif name in COLUMN_INDEX:
+            getter = itemgetter(COLUMN_INDEX[name])
+        else:
+            raise ValueError(f"{model.__name__}.{name} has no source column")
+        getters.append((name, getter))
+    getters = tuple(getters)
+
+    def mapper(row: tuple) -> dict:
+        return {name: getter(row) for name, getter in getters}
+
+    return mapper
+
+sighting_record = build_row_mapper()
+nearby_record = build_row_mapper(distance_index=len(COLUMN_INDEX))
+
+def _iso_time(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat().replace("+00:00", "Z")
+
+def event_record(event, with_members: bool = False) -> dict:
+    """SightingEventResponse fields for a triangulation.SightingEvent"""
+    lat, lon, spread, confidence = event.estimate()
+    return {
+        "id": event.id,
+        "lat": round(lat, 5),
+        "lon": round(lon, 5),
+        "spread_km": round(spread, 3),
+        "confidence": round(confidence, 3),
+        "observers": len(event.devices),
+        "sighting_count": len(event.members),
+        "first_seen": _iso_time(event.first_epoch),
+        "last_seen": _iso_time(event.last_epoch),
+        "sighting_ids": sorted(event.members) if with_members else None,
+    }
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    return bool(accept) and any(media_type in accept for media_type in MSGPACK_TYPES)
+
+def encode(content, accept: Optional[str] = None):
+    """(body, media_type) for content, in MessagePack if the client accepts it"""
+    if wants_msgpack(accept):
+        return msgpack.packb(content), MSGPACK_TYPES[0]
+    return orjson.dumps(content), "application/json"
+
+def render(content, accept: Optional[str] = None, headers: Optional[dict] = None) -> Response:
+    body, media_type = encode(content, accept)
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept"
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,190 @@
+"""Static delivery with precompressed variants and long-lived caching.
+
+Text assets get gzip (and, with the brotli package installed, brotli)
+variants written next to them, which PrecompressedStaticFiles picks from
+by Accept-Encoding:
+
+    map.html -> map.html.gz, map.html.br
+
+The /static mount precompresses its directory at startup; pages served by
+nginx are precompressed at deploy time for gzip_static / brotli_static:
+
+    python static_files.py precompress *.html
+
+Uploads are stored under their SHA-256, so those names are cached as
+immutable. Range requests are answered by Starlette's FileResponse, read in
+STREAM_CHUNK_BYTES pieces, or handed to the server whole when it supports
+the ASGI pathsend extension.
+"""
+import argparse
+import gzip
+import mimetypes
+import os
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+
+from atomic_files import write_atomic
+from http_cache import IMMUTABLE_CACHE_CONTROL
+
+try:
+    import brotli
+except ImportError:
+    # gzip variants only
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {".html", ".css", ".js", ".mjs", ".json", ".svg", ".txt", ".xml", ".webmanifest", ".map"}
+# Below this the encoding overhead eats most of the saving
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Preferred first when a client accepts several
+ENCODING_SUFFIXES = (("br", ".br"), ("gzip", ".gz"))
+
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# <sha256>.<ext>, and the .thumb / .poster derivatives rendered from it
+HASHED_NAME = re.compile(r"^[0-9a-f]{64}(\.thumb|\.poster)?\.[A-Za-z0-9]+$")
+
+# Fewer, larger reads when streaming video (FileResponse defaults to 64 KiB)
+STREAM_CHUNK_BYTES = 1024 * 1024
+
+# Source path -> ((source mtime_ns, size), {encoding: (variant path, variant stat)})
+VariantIndex = Dict[str, Tuple[Tuple[int, int], Dict[str, Tuple[str, os.stat_result]]]]
+
+def is_content_hashed(path: str) -> bool:
+    return HASHED_NAME.match(os.path.basename(path)) is not None
+
+def accepted_encodings(accept_encoding: Optional[str]) -> set:
+    """Content codings a client accepts (q > 0), per an Accept-Encoding header"""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    if "*" in accepted:
+        accepted.update(encoding for encoding, _ in ENCODING_SUFFIXES)
+    return accepted
+
+def _compress(encoding: str, data: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output identical across runs and workers
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+def precompress_file(path: str) -> Dict[str, Tuple[str, os.stat_result]]:
+    """Write any missing or stale variants of one file; returns the usable ones by encoding"""
+    source_stat = os.stat(path)
+    variants = {}
+    data = None
+    for encoding, suffix in ENCODING_SUFFIXES:
+        if encoding == "br" and brotli is None:
+            continue
+        variant_path = path + suffix
+        try:
+            variant_stat = os.stat(variant_path)
+        except FileNotFoundError:
+            variant_stat = None
+        if variant_stat is None or variant_stat.st_mtime_ns < source_stat.st_mtime_ns:
+            if data is None:
+                with open(path, "rb") as source:
+                    data = source.read()
+            compressed = _compress(encoding, data)
+            if len(compressed) >= len(data):
+                continue
+            write_atomic(variant_path, compressed, prefix=".variant-")
+            variant_stat = os.stat(variant_path)
+        if variant_stat.st_size < source_stat.st_size:
+            variants[encoding] = (variant_path, variant_stat)
+    return variants
+
+def precompress(paths: Iterable[str]) -> VariantIndex:
+    """Precompress every compressible file under paths (files or directories)"""
+    index: VariantIndex = {}
+    for path in paths:
+        if os.path.isdir(path):
+            files = (os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        else:
+            files = (path,)
+        for file_path in files:
+            if os.path.splitext(file_path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            file_path = os.path.realpath(file_path)
+            source_stat = os.stat(file_path)
+            if source_stat.st_size < MIN_COMPRESS_BYTES:
+                continue
+            variants = precompress_file(file_path)
+            if variants:
+                index[file_path] = ((source_stat.st_mtime_ns, source_stat.st_size), variants)
+    return index
+
+class StaticFileResponse(FileResponse):
+    chunk_size = STREAM_CHUNK_BYTES
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves precompressed variants and sets Cache-Control.
+
+    Variants are looked up in an index built by precompress() rather than on
+    disk per request, and only used while the original is unchanged. Range
+    requests always get the identity encoding, so byte offsets from a video
+    player refer to the file itself.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.variants: VariantIndex = {}
+
+    def precompress(self):
+        """Write variants for the served directory; blocking, so run it in a thread"""
+        self.variants = precompress([self.directory])
+        print(f"Precompressed {len(self.variants)} static files in {self.directory}")
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if is_content_hashed(full_path) else REVALIDATE_CACHE_CONTROL
+        }
+        path, media_type = full_path, None
+
+        entry = self.variants.get(str(full_path))
+        if entry is not None:
+            headers["Vary"] = "Accept-Encoding"
+            source_key, variants = entry
+            fresh = source_key == (stat_result.st_mtime_ns, stat_result.st_size)
+            if fresh and "range" not in request_headers:
+                accepted = accepted_encodings(request_headers.get("accept-encoding"))
+                for encoding, _ in ENCODING_SUFFIXES:
+                    if encoding in accepted and encoding in variants:
+                        path, stat_result = variants[encoding]
+                        headers["Content-Encoding"] = encoding
+                        # Typed as the original, not as a .gz/.br download
+                        media_type = mimetypes.guess_type(str(full_path))[0]
+                        break
+
+        response = StaticFileResponse(
+            path, status_code=status_code, headers=headers, media_type=media_type, stat_result=stat_result
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UFOBeep static asset precompression")
+    parser.add_argument("command", choices=["precompress"])
+    parser.add_argument("paths", nargs="+", help="Files or directories")
+    args = parser.parse_args()
+
+    index = precompress(args.paths)
+    print(f"Precompressed {len(index)} files" + ("" if brotli is not None else " (gzip only: brotli not installed)"))
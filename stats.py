@@ -0,0 +1,58 @@
+import time
+from typing import Dict, Optional
+
+BUCKET_SECONDS = 60
+WINDOW_BUCKETS = 24 * 60
+
+class SightingStats:
+    """Running totals behind /stats, updated as sightings are saved.
+
+    Recent activity is kept in a ring of per-minute buckets covering the
+    last 24 hours, so reading any of the counts never touches the database.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.flag_counts: Dict[str, int] = {}
+        self.buckets = [0] * WINDOW_BUCKETS
+        self.current_bucket = int(time.time() // BUCKET_SECONDS)
+        self.window_total = 0
+
+    def reset(self):
+        self.__init__()
+
+    def record(self, epoch: Optional[float], user_flag: Optional[str] = None, count: int = 1):
+        self.total += count
+        if user_flag:
+            self.flag_counts[user_flag] = self.flag_counts.get(user_flag, 0) + count
+        if epoch is not None:
+            self.record_time(epoch, count)
+
+    def record_time(self, epoch: float, count: int = 1):
+        self._advance(time.time())
+        # Client clocks run ahead sometimes; treat those as "now"
+        bucket = min(int(epoch // BUCKET_SECONDS), self.current_bucket)
+        if bucket <= self.current_bucket - WINDOW_BUCKETS:
+            return
+        self.buckets[bucket % WINDOW_BUCKETS] += count
+        self.window_total += count
+
+    def recent_count(self) -> int:
+        """Sightings timestamped within the last 24 hours"""
+        self._advance(time.time())
+        return self.window_total
+
+    @property
+    def distinct_flags(self) -> int:
+        return len(self.flag_counts)
+
+    def _advance(self, now: float):
+        bucket = int(now // BUCKET_SECONDS)
+        if bucket <= self.current_bucket:
+            return
+        # Clear the buckets that fell out of the window since the last call
+        for expired in range(self.current_bucket + 1, min(bucket, self.current_bucket + WINDOW_BUCKETS) + 1):
+            slot = expired % WINDOW_BUCKETS
+            self.window_total -= self.buckets[slot]
+            self.buckets[slot] = 0
+        self.current_bucket = bucket
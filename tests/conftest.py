@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """A fresh sightings.db for database.init_db() to open"""
+    path = str(tmp_path / "sightings.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+    return path
+
+@pytest.fixture
+def app(db_path, monkeypatch):
+    """main.app with its per-process state reset, for a TestClient to start"""
+    import main
+    from feed import SightingFeed
+    from tiles import TileCache
+    from triangulation import TriangulationEngine
+    monkeypatch.setattr(main, "startup_backlog", [])
+    monkeypatch.setattr(main, "feed", SightingFeed())
+    monkeypatch.setattr(main, "triangulation", TriangulationEngine())
+    monkeypatch.setattr(main, "tile_cache", TileCache())
+    monkeypatch.setattr(main.response_cache, "version", None)
+    return main.app
@@ -0,0 +1,103 @@
+import asyncio
+import os
+
+from alert_audio import (ALERT_SCRIPTS, AlertAudio, compass_direction, distance_bucket, mp3_frames,
+                         number_segments)
+
+# MPEG-1 layer III, 128 kbps, 44.1 kHz: 417-byte frames
+FRAME_HEADER = b"\xff\xfb\x90\x00"
+FRAME_LENGTH = 417
+
+def frame(fill: int) -> bytes:
+    return FRAME_HEADER + bytes([fill]) * (FRAME_LENGTH - 4)
+
+def xing_frame() -> bytes:
+    body = bytearray(frame(0))
+    body[36:40] = b"Xing"
+    return bytes(body)
+
+def id3v2(payload: bytes) -> bytes:
+    size = len(payload)
+    return b"ID3\x03\x00\x00" + bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F]) + payload
+
+def test_distance_bucket():
+    assert distance_bucket(0.2) == 1
+    assert distance_bucket(12) == 10
+    # Halfway rounds up
+    assert distance_bucket(12.5) == 15
+    assert distance_bucket(5000) == 500
+    assert distance_bucket(16, "mi") == 10
+
+def test_compass_direction():
+    assert compass_direction(0) == "north"
+    assert compass_direction(11.2) == "north"
+    assert compass_direction(11.3) == "north_northeast"
+    assert compass_direction(359) == "north"
+    assert compass_direction(-90) == "west"
+
+def test_number_segments_prefer_whole_number_clips():
+    spoken = {str(n) for n in range(1, 21)} | {"30", "40", "50", "100", "hundred"}
+    assert number_segments(15, spoken) == ["distances/15"]
+    assert number_segments(25, {str(n) for n in range(1, 21)}) == ["distances/20", "distances/5"]
+    assert number_segments(150, spoken) == ["distances/100", "distances/50"]
+    assert number_segments(250, spoken) == ["distances/2", "distances/hundred", "distances/50"]
+
+def test_mp3_frames_strips_tags_and_the_vbr_header():
+    audio = frame(1) + frame(2)
+    data = id3v2(b"\x00" * 20) + b"junk" + xing_frame() + audio + b"TAG" + b"\x00" * 125
+    assert mp3_frames(data) == audio
+    assert mp3_frames(audio) == audio
+
+def write_pack(root, language: str = "en", skip: tuple = ()):
+    """One distinct frame per segment the English script can need"""
+    segments = [segment for segment in ALERT_SCRIPTS[language] if not segment.startswith("{")]
+    segments += ["units/kilometers", "units/miles", "directions/north", "directions/east", "distances/20", "distances/5"]
+    for fill, segment in enumerate(segments, 1):
+        if segment in skip:
+            continue
+        path = os.path.join(root, language, f"{segment}.mp3")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as clip:
+            clip.write(id3v2(b"\x00" * 10) + frame(fill))
+    return segments
+
+def test_clips_are_composed_once_and_cached(tmp_path, monkeypatch):
+    write_pack(str(tmp_path / "sounds"))
+    audio = AlertAudio(str(tmp_path / "sounds"), str(tmp_path / "cache"))
+    audio.load()
+    assert list(audio.versions) == ["en"]
+    assert audio.clip_url("es", 25, 0) is None
+    assert audio.clip_url(None, 24, 2, "km") == "/alerts/audio/en/km/25/north.mp3"
+
+    composed = []
+    compose = audio.compose
+    monkeypatch.setattr(audio, "compose", lambda key: composed.append(key) or compose(key))
+    key = audio.clip_key("en", 24, 2, "km")
+
+    async def scenario():
+        first, second = await asyncio.gather(audio.get(key), audio.get(key))
+        assert first == second
+        assert await audio.get(key) == first
+        return first
+
+    clip = asyncio.run(scenario())
+    assert composed == [key]
+    # intro, 20, 5, kilometers, north, of you, go outside: one frame each, without tags
+    assert len(clip) == 7 * FRAME_LENGTH
+    assert clip.startswith(FRAME_HEADER)
+    stored = tmp_path / "cache" / audio.versions["en"] / "en-km-25-north.mp3"
+    assert stored.read_bytes() == clip
+
+def test_missing_segment_gives_no_clip(tmp_path):
+    write_pack(str(tmp_path / "sounds"), skip=("directions/east",))
+    audio = AlertAudio(str(tmp_path / "sounds"), str(tmp_path / "cache"))
+    audio.load()
+    assert asyncio.run(audio.get(audio.clip_key("en", 5, 90))) is None
+    assert asyncio.run(audio.get(audio.clip_key("en", 5, 0))) is not None
+
+def test_incomplete_pack_is_not_offered(tmp_path):
+    write_pack(str(tmp_path / "sounds"), skip=(ALERT_SCRIPTS["en"][0],))
+    audio = AlertAudio(str(tmp_path / "sounds"), str(tmp_path / "cache"))
+    audio.load()
+    assert audio.versions == {}
+    assert audio.clip_url("en", 5, 0) is None
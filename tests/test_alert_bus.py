@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+import alert_bus
+from alert_bus import PRESENCE_TTL_SECONDS, AlertBus, RedisAlertBus, SQLiteAlertBus, create_alert_bus
+
+def sqlite_buses(tmp_path):
+    path = str(tmp_path / "alert_bus.db")
+    return SQLiteAlertBus(path), SQLiteAlertBus(path)
+
+def redis_buses(tmp_path):
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    return (RedisAlertBus(client=fakeredis.aioredis.FakeRedis(server=server)),
+            RedisAlertBus(client=fakeredis.aioredis.FakeRedis(server=server)))
+
+BACKENDS = {"sqlite": sqlite_buses, "redis": redis_buses}
+
+class Recorder:
+    def __init__(self):
+        self.messages = []
+
+    async def __call__(self, message: dict, local: bool):
+        self.messages.append((message, local))
+
+async def eventually(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+def test_create_alert_bus():
+    assert type(create_alert_bus("local")) is AlertBus
+    assert isinstance(create_alert_bus("sqlite:/tmp/bus.db"), SQLiteAlertBus)
+    with pytest.raises(ValueError):
+        create_alert_bus("carrier-pigeon://")
+
+def test_local_bus_dispatches_to_itself():
+    async def scenario():
+        bus, received = AlertBus(), Recorder()
+        await bus.start(received)
+        await bus.publish({"type": "sighting", "data": {"id": 1}})
+        assert received.messages == [({"type": "sighting", "data": {"id": 1}}, True)]
+
+        await bus.connected("a")
+        await bus.connected("b")
+        await bus.disconnected("a")
+        assert await bus.connection_count() == 1
+        await bus.stop()
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_publish_reaches_every_worker_once(backend, tmp_path):
+    first, second = BACKENDS[backend](tmp_path)
+
+    async def scenario():
+        first_received, second_received = Recorder(), Recorder()
+        await first.start(first_received)
+        await second.start(second_received)
+        try:
+            await first.publish({"type": "sighting", "data": {"id": 1}})
+            await second.publish({"type": "media", "count": 2})
+            await eventually(lambda: len(first_received.messages) == 2 and len(second_received.messages) == 2)
+            # Give a duplicate delivery of a worker's own message the chance to show up
+            await asyncio.sleep(0.2)
+        finally:
+            await first.stop()
+            await second.stop()
+
+        assert first_received.messages == [
+            ({"type": "sighting", "data": {"id": 1}}, True),
+            ({"type": "media", "count": 2}, False),
+        ]
+        assert second_received.messages == [
+            ({"type": "media", "count": 2}, True),
+            ({"type": "sighting", "data": {"id": 1}}, False),
+        ]
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_presence_is_shared(backend, tmp_path):
+    first, second = BACKENDS[backend](tmp_path)
+
+    async def scenario():
+        await first.start(Recorder())
+        await second.start(Recorder())
+        try:
+            await first.connected("alice")
+            await first.connected("bob")
+            await second.connected("carol")
+            assert await first.connection_count() == 3
+            assert await second.connection_count() == 3
+
+            await first.disconnected("bob")
+            assert await second.connection_count() == 2
+
+            # A stopped worker takes its subscribers with it
+            await second.stop()
+            assert await first.connection_count() == 1
+        finally:
+            await first.stop()
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_worker_that_stops_refreshing_is_left_out(backend, tmp_path, monkeypatch):
+    first, second = BACKENDS[backend](tmp_path)
+
+    async def scenario():
+        await first.start(Recorder())
+        await second.start(Recorder())
+        try:
+            await first.connected("alice")
+            await second.connected("bob")
+            await second.connected("carol")
+            assert await first.connection_count() == 3
+
+            # second hangs: nothing refreshes its entry any more
+            later = alert_bus.time.time() + PRESENCE_TTL_SECONDS + 1
+            monkeypatch.setattr(alert_bus.time, "time", lambda: later)
+            await first.connected("dave")
+            assert await first.connection_count() == 2
+        finally:
+            await first.stop()
+            await second.stop()
+
+    asyncio.run(scenario())
+
+def test_sqlite_bus_skips_events_published_before_start(tmp_path):
+    first, second = sqlite_buses(tmp_path)
+
+    async def scenario():
+        first_received, second_received = Recorder(), Recorder()
+        await first.start(first_received)
+        try:
+            await first.publish({"type": "sighting", "data": {"id": 1}})
+            await second.start(second_received)
+            await first.publish({"type": "sighting", "data": {"id": 2}})
+            await eventually(lambda: second_received.messages)
+            await asyncio.sleep(0.2)
+        finally:
+            await first.stop()
+            await second.stop()
+
+        assert second_received.messages == [({"type": "sighting", "data": {"id": 2}}, False)]
+
+    asyncio.run(scenario())
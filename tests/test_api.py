@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+import main
+from database import close_db, init_db, save_sighting
+
+def seed(count: int):
+    """Store sightings 1..count, about 100 m apart going north"""
+    async def scenario():
+        await init_db()
+        try:
+            for n in range(count):
+                await save_sighting(f"{n}.jpg", f"static/uploads/{n}.jpg", 36.0 + n * 0.001, -115.0, 0,
+                                    "2026-10-17T00:00:00Z", "device")
+        finally:
+            await close_db()
+
+    asyncio.run(scenario())
+
+def ids(response) -> list:
+    return [record["id"] for record in response.json()]
+
+def test_pages_follow_the_next_cursor(app):
+    seed(7)
+    with TestClient(app) as client:
+        pages, query = [], "limit=3"
+        while True:
+            response = client.get(f"/sightings?{query}")
+            pages.append(ids(response))
+            if "x-next-cursor" not in response.headers:
+                break
+            query = f"limit=3&{response.headers['x-next-cursor']}"
+        assert pages == [[7, 6, 5], [4, 3, 2], [1]]
+
+        response = client.get("/sightings?after_id=4&limit=2")
+        assert ids(response) == [5, 6]
+        assert response.headers["x-next-cursor"] == "after_id=6"
+        response = client.get("/sightings?since_id=7")
+        assert ids(response) == []
+        assert response.headers["x-next-cursor"] == "after_id=7"
+
+@pytest.mark.parametrize("path", ["/sightings", "/sightings/updates?since_id=0&timeout=0", "/sightings/events"])
+@pytest.mark.parametrize("limit", [-1, 0, 100000])
+def test_out_of_range_limits_are_rejected(app, path, limit):
+    seed(1)
+    with TestClient(app) as client:
+        separator = "&" if "?" in path else "?"
+        assert client.get(f"{path}{separator}limit={limit}").status_code == 422
+
+def test_nearby_search_uses_the_hot_set_and_matches_sqlite(app, monkeypatch):
+    seed(30)
+    with TestClient(app) as client:
+        query = "/sightings/nearby?lat=36.0&lon=-115.0&radius=0.95"
+        hot = client.get(query).json()
+        monkeypatch.setattr(database.recent, "nearby", lambda *args: None)
+        monkeypatch.setattr(main.response_cache, "version", None)
+        assert client.get(query).json() == hot
+    # The first and the eight after it, about 111 m apart going north
+    assert [record["id"] for record in hot] == list(range(1, 10))
+    assert [record["distance_km"] for record in hot] == sorted(record["distance_km"] for record in hot)
+
+@pytest.mark.parametrize("query", [
+    "/sightings/nearby?lat=nan&lon=nan",
+    "/sightings/nearby?lat=91&lon=0",
+    "/sightings/nearby?lat=0&lon=-181",
+    "/sightings/nearby?lat=0&lon=0&radius=inf",
+    "/sightings/nearby?lat=0&lon=0&hours=nan",
+    "/sightings?lat=nan&lon=0",
+    "/sightings?lat=0&lon=0&radius=-1",
+])
+def test_invalid_coordinates_are_rejected(app, query):
+    seed(1)
+    with TestClient(app) as client:
+        assert client.get(query).status_code == 422
@@ -0,0 +1,113 @@
+import asyncio
+
+import connections
+from alert_bus import AlertBus
+from connections import ConnectionManager, OUTBOUND_QUEUE_SIZE
+
+class FakeSocket:
+    """Stands in for a WebSocket; send_text blocks while `stalled` is clear"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.sent = []
+        self.closed = False
+        self.stalled = asyncio.Event()
+        self.stalled.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        await self.stalled.wait()
+        if self.fail:
+            raise ConnectionResetError("gone")
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+async def eventually(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+def test_slow_client_only_loses_its_own_oldest_alerts():
+    async def scenario():
+        bus = AlertBus()
+        manager = ConnectionManager(bus)
+        slow_socket, fast_socket = FakeSocket(), FakeSocket()
+        slow_socket.stalled.clear()
+        slow = await manager.connect(slow_socket, "slow")
+        await manager.connect(fast_socket, "fast")
+        for user_id in ("slow", "fast"):
+            manager.subscribers.update(user_id, 36.0, -115.0, 10)
+
+        total = OUTBOUND_QUEUE_SIZE + 10
+        for n in range(total):
+            await manager.broadcast_proximity_alert({"id": n, "lat": 36.0, "lon": -115.0})
+            # Let the writers run, as other requests would between sightings
+            await asyncio.sleep(0)
+        await eventually(lambda: len(fast_socket.sent) == total)
+        # The queue holds OUTBOUND_QUEUE_SIZE frames besides the one stuck in send_text
+        assert slow.dropped == total - OUTBOUND_QUEUE_SIZE - 1
+
+        slow_socket.stalled.set()
+        await eventually(lambda: not slow.outbox)
+        assert len(slow_socket.sent) + slow.dropped == total
+        # What survives is the newest
+        assert '"id": %d' % (total - 1) in slow_socket.sent[-1]
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+def test_failed_send_disconnects_and_closes_the_socket():
+    async def scenario():
+        bus = AlertBus()
+        manager = ConnectionManager(bus)
+        socket = FakeSocket(fail=True)
+        connection = await manager.connect(socket, "gone")
+        connection.send("hello")
+
+        await eventually(lambda: "gone" not in manager.active_connections)
+        await eventually(lambda: socket.closed and not manager.pending)
+        assert await bus.connection_count() == 0
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+def test_reconnect_replaces_the_old_socket():
+    async def scenario():
+        bus = AlertBus()
+        manager = ConnectionManager(bus)
+        first, second = FakeSocket(), FakeSocket()
+        old = await manager.connect(first, "user")
+        new = await manager.connect(second, "user")
+        assert manager.active_connections["user"] is new
+
+        # The old socket going away later must not drop the new one
+        await manager.disconnect(old)
+        assert manager.active_connections["user"] is new
+        assert await bus.connection_count() == 1
+        await manager.stop()
+        assert first.closed and second.closed
+        assert not manager.pending
+
+    asyncio.run(scenario())
+
+def test_location_updates_are_throttled(monkeypatch):
+    monkeypatch.setattr(connections, "LOCATION_UPDATE_INTERVAL_SECONDS", 0.05)
+
+    async def scenario():
+        manager = ConnectionManager(AlertBus())
+        connection = await manager.connect(FakeSocket(), "walker")
+        manager.update_location(connection, 36.0, -115.0)
+        manager.update_location(connection, 36.1, -115.0)
+        manager.update_location(connection, 36.2, -115.0)
+        assert manager.subscribers.positions["walker"][:2] == (36.0, -115.0)
+
+        # The latest of the ones in between is applied once the interval is up
+        await eventually(lambda: manager.subscribers.positions["walker"][:2] == (36.2, -115.0))
+        await manager.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,130 @@
+import asyncio
+import random
+import sqlite3
+import time
+
+import numpy as np
+import pytest
+
+import database
+from database import (close_db, get_all_sightings, get_dataset_version, get_nearby_sightings, import_sightings, init_db,
+                      save_sighting, set_media_derivatives, SightingWriter)
+from geometry import haversine_km
+
+async def upload(n: int) -> int:
+    return await save_sighting(f"{n}.jpg", f"static/uploads/{n}.jpg", 36.0 + n * 0.001, -115.0, n % 360,
+                               "2026-10-17T00:00:00Z", f"device-{n}", "US" if n % 2 else None)
+
+@pytest.mark.parametrize("max_rows", [1, 7, 256])
+def test_group_commit_assigns_each_caller_its_row(db_path, max_rows):
+    async def scenario():
+        await init_db()
+        try:
+            await database.writer.stop()
+            database.writer = SightingWriter(max_rows=max_rows)
+            database.writer.start()
+
+            ids = await asyncio.gather(*(upload(n) for n in range(100)))
+            assert sorted(ids) == list(range(1, 101))
+            assert get_dataset_version() == 100
+            assert database.stats.total == 100
+            assert database.stats.flag_counts == {"US": 50}
+        finally:
+            await close_db()
+
+        with sqlite3.connect(db_path) as db:
+            stored = dict(db.execute("SELECT id, filename FROM sightings"))
+        assert stored == {sighting_id: f"{n}.jpg" for n, sighting_id in enumerate(ids)}
+
+    asyncio.run(scenario())
+
+def test_dataset_version_grows_with_media(db_path):
+    async def scenario():
+        await init_db()
+        try:
+            await upload(1)
+            version = get_dataset_version()
+            assert await set_media_derivatives("static/uploads/1.jpg", "1.thumb.jpg", "1.poster.jpg") == 2
+            assert get_dataset_version() > version
+            assert (await get_all_sightings(1))[0][11:] == ("1.thumb.jpg", "1.poster.jpg")
+            # Already set, so nothing changes
+            assert await set_media_derivatives("static/uploads/1.jpg", "x.jpg", None) == 0
+        finally:
+            await close_db()
+
+    asyncio.run(scenario())
+
+def test_import_reports_conflicts(db_path):
+    row = (1, "1.jpg", "static/uploads/1.jpg", None, None, 0.0, "2026-10-17T00:00:00Z", "device",
+           None, None, None, None, None)
+
+    async def scenario():
+        await init_db()
+        try:
+            assert await import_sightings([row]) == 1
+            with pytest.raises(ValueError):
+                await import_sightings([row])
+            assert await import_sightings([row], on_conflict="skip") == 0
+            assert await import_sightings([row], on_conflict="renumber") == 1
+            assert [stored[0] for stored in await get_all_sightings(None)] == [2, 1]
+        finally:
+            await close_db()
+
+    asyncio.run(scenario())
+
+def test_nearby_search_in_a_short_window_uses_the_epoch_index(db_path, monkeypatch):
+    async def scenario():
+        await init_db()
+        try:
+            now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            for n in range(20):
+                await save_sighting(f"{n}.jpg", f"static/uploads/{n}.jpg", 36.0 + n * 0.001, -115.0, 0, now, "device")
+            # Go to SQLite rather than the hot set
+            monkeypatch.setattr(database.recent, "nearby", lambda *args: None)
+            statements = []
+            for db in database.get_pool()._all:
+                await db.set_trace_callback(statements.append)
+
+            plans = {}
+            for hours in (None, 1, 24 * 30):
+                statements.clear()
+                assert len(await get_nearby_sightings(36.0, -115.0, 500, hours)) == 20
+                query = next(statement for statement in statements if "FROM sightings" in statement)
+                with sqlite3.connect(db_path) as db:
+                    plans[hours] = " ".join(row[-1] for row in db.execute(f"EXPLAIN QUERY PLAN {query}"))
+        finally:
+            await close_db()
+
+        assert "idx_sightings_epoch_cell" in plans[1]
+        assert "idx_sightings_cell_lon" in plans[None]
+        assert "idx_sightings_epoch_cell" not in plans[None]
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("lat, lon", [(36.0, -115.0), (0.0, 180.0), (0.0, -179.9), (89.9, 0.0), (-89.95, 90.0)])
+def test_nearby_search_matches_a_full_scan(db_path, monkeypatch, lat, lon):
+    """Band and longitude ranges find everything in the circle, across the antimeridian and around the poles"""
+    generator = random.Random(f"{lat},{lon}")
+
+    async def scenario():
+        await init_db()
+        try:
+            for n in range(200):
+                point_lat = max(-90.0, min(90.0, lat + generator.uniform(-2, 2)))
+                point_lon = (lon + generator.uniform(-4, 4) + 180) % 360 - 180
+                await save_sighting(f"{n}.jpg", f"static/uploads/{n}.jpg", point_lat, point_lon, 0,
+                                    "2026-10-17T00:00:00Z", "device")
+            # Go to SQLite rather than the hot set
+            monkeypatch.setattr(database.recent, "nearby", lambda *args: None)
+            for radius in (10, 100, 300):
+                found = await get_nearby_sightings(lat, lon, radius)
+                assert [row[-1] for row in found] == sorted(row[-1] for row in found)
+                found_ids = sorted(row[0] for row in found)
+                with sqlite3.connect(db_path) as db:
+                    rows = db.execute("SELECT id, lat, lon FROM sightings").fetchall()
+                distances = haversine_km(lat, lon, np.array([row[1] for row in rows]), np.array([row[2] for row in rows]))
+                assert found_ids == sorted(row[0] for row, distance in zip(rows, distances) if distance <= radius)
+        finally:
+            await close_db()
+
+    asyncio.run(scenario())
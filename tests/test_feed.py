@@ -0,0 +1,142 @@
+import asyncio
+import json
+import sqlite3
+
+import database
+import hot_set
+import main
+from database import close_db, init_db, note_sighting, save_sighting
+from feed import SightingFeed
+from hot_set import RecentSightings
+
+def sighting(sighting_id: int) -> tuple:
+    return (sighting_id, f"{sighting_id}.jpg", f"static/uploads/{sighting_id}.jpg", 36.17, -115.14, 0.0,
+            "2026-10-17T00:00:00Z", "device", None, None, None, None, None)
+
+def release(feed: SightingFeed, recent: RecentSightings):
+    through = recent.contiguous()
+    feed.publish(recent.between(feed.released_id, through), through, recent.floor_id)
+
+def ids(entries) -> list:
+    return [entry[1] for entry in entries]
+
+def test_out_of_order_arrivals_are_released_in_id_order():
+    feed, recent = SightingFeed(), RecentSightings()
+    feed.start(0)
+    recent.add(sighting(1), 0)
+    release(feed, recent)
+    assert ids(feed.after_id(0)) == [1]
+
+    # 3 arrives over the bus before 2
+    recent.add(sighting(3), 0)
+    release(feed, recent)
+    assert ids(feed.after_id(1)) == []
+    assert feed.released_id == 1
+
+    recent.add(sighting(2), 0)
+    release(feed, recent)
+    # A client that saw 2 and resumes from it still gets 3
+    assert ids(feed.after_id(0)) == [1, 2, 3]
+    assert ids(feed.after_id(2)) == [3]
+    assert ids(feed.after_seq(0)) == [1, 2, 3]
+
+def test_waiting_readers_wake_only_for_released_sightings():
+    async def scenario():
+        feed, recent = SightingFeed(), RecentSightings()
+        feed.start(1)
+        recent.load([(sighting(1), 0)], None, None)
+        seq = feed.seq
+
+        recent.add(sighting(3), 0)
+        release(feed, recent)
+        assert not await feed.wait(seq, 0.05)
+
+        recent.add(sighting(2), 0)
+        release(feed, recent)
+        assert await feed.wait(seq, 0.05)
+        assert ids(feed.after_seq(seq)) == [2, 3]
+
+    asyncio.run(scenario())
+
+def test_buffer_stops_covering_what_the_hot_set_evicted_first():
+    feed, recent = SightingFeed(), RecentSightings(size=2)
+    feed.start(0)
+    for sighting_id in (1, 3, 4, 5):
+        recent.add(sighting(sighting_id), 0)
+    # 1 and 3 are evicted while 2 is still missing, so the hole is given up on
+    release(feed, recent)
+    assert ids(feed.after_id(0)) == [4, 5]
+    assert not feed.covers(2)
+    assert feed.covers(3)
+
+def test_full_buffer_raises_the_floor():
+    feed = SightingFeed(size=2)
+    feed.start(0)
+    feed.publish([sighting(1), sighting(2), sighting(3)], 3)
+    assert ids(feed.after_id(0)) == [2, 3]
+    assert not feed.covers(0)
+    assert feed.covers(1)
+
+def test_long_poll_cursor_does_not_skip_a_late_sighting(db_path, monkeypatch):
+    async def scenario():
+        await init_db()
+        monkeypatch.setattr(main, "feed", SightingFeed())
+        main.feed.start(database.get_latest_id())
+        try:
+            await save_sighting("1.jpg", "static/uploads/1.jpg", 36.0, -115.0, 0, "2026-10-17T00:00:00Z", "device")
+            main.release_feed()
+
+            # Another worker stores 2 and 3, and 3's bus message arrives first
+            with sqlite3.connect(db_path) as db:
+                for sighting_id in (2, 3):
+                    db.execute(
+                        "INSERT INTO sightings (id, filename, lat, lon, timestamp, lat_cell) VALUES (?, ?, 36.0, -115.0, ?, 1260)",
+                        (sighting_id, f"{sighting_id}.jpg", "2026-10-17T00:00:00Z")
+                    )
+            note_sighting((3, "3.jpg", None, 36.0, -115.0, None, "2026-10-17T00:00:00Z", None, None, None, None, None, None))
+            main.release_feed()
+
+            response = await main.sighting_updates(since_id=1, timeout=0, limit=100, accept=None)
+            assert response.body == b"[]"
+            assert response.headers["x-next-cursor"] == "since_id=1"
+
+            # Its message never comes, so the gap is fetched from the database
+            monkeypatch.setattr(hot_set, "GAP_TIMEOUT_SECONDS", -1)
+            await database.fill_recent_gaps()
+            main.release_feed()
+            response = await main.sighting_updates(since_id=1, timeout=0, limit=100, accept=None)
+            assert [record["id"] for record in json.loads(response.body)] == [2, 3]
+            assert response.headers["x-next-cursor"] == "since_id=3"
+        finally:
+            await close_db()
+
+    asyncio.run(scenario())
+
+def test_sse_resumes_from_the_buffer_or_the_database(db_path, monkeypatch):
+    async def events(last_id):
+        return [chunk async for chunk in main.sse_stream(last_id)]
+
+    async def scenario():
+        await init_db()
+        monkeypatch.setattr(main, "feed", SightingFeed())
+        try:
+            for n in range(3):
+                await save_sighting(f"{n}.jpg", f"static/uploads/{n}.jpg", 36.0, -115.0, 0, "2026-10-17T00:00:00Z", "device")
+            # Started after 1 was stored, so the buffer only reaches back to it
+            main.feed.start(1)
+            main.release_feed()
+            main.feed.stop()
+
+            from_buffer = await events(2)
+            assert from_buffer[0].startswith(b"retry:")
+            assert [chunk.split(b"\n")[0] for chunk in from_buffer[1:]] == [b"id: 3"]
+
+            from_database = await events(0)
+            assert [chunk.split(b"\n")[0] for chunk in from_database[1:]] == [b"id: 1", b"id: 2", b"id: 3"]
+
+            monkeypatch.setattr(main, "FEED_RESUME_LIMIT", 2)
+            assert (await events(0))[1:] == [b"event: reset\ndata: {}\n\n"]
+        finally:
+            await close_db()
+
+    asyncio.run(scenario())
@@ -0,0 +1,48 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from geometry import bounding_box, calculate_bearing, calculate_distance, haversine_km, initial_bearing_deg
+
+def random_points(count: int, seed: int = 9):
+    generator = random.Random(seed)
+    return ([generator.uniform(-90, 90) for _ in range(count)],
+            [generator.uniform(-180, 180) for _ in range(count)])
+
+def test_kernels_match_the_scalar_formulas():
+    lats, lons = random_points(500)
+    distances = haversine_km(36.17, -115.14, np.array(lats), np.array(lons))
+    bearings = initial_bearing_deg(36.17, -115.14, np.array(lats), np.array(lons))
+    for lat, lon, distance, bearing in zip(lats, lons, distances, bearings):
+        assert distance == pytest.approx(calculate_distance(36.17, -115.14, lat, lon), abs=1e-6)
+        # Bearings wrap at 0/360
+        difference = abs(bearing - calculate_bearing(36.17, -115.14, lat, lon)) % 360
+        assert min(difference, 360 - difference) == pytest.approx(0, abs=1e-6)
+
+def test_known_distances_and_bearings():
+    # One degree of longitude along the equator, due east
+    assert calculate_distance(0, 0, 0, 1) == pytest.approx(111.19, abs=0.01)
+    assert calculate_bearing(0, 0, 0, 1) == pytest.approx(90)
+    assert calculate_bearing(0, 0, 1, 0) == pytest.approx(0)
+    # Antipodes, and coincident points
+    assert haversine_km(0, 0, np.array([0.0]), np.array([180.0]))[0] == pytest.approx(math.pi * 6371)
+    assert haversine_km(10, 10, np.array([10.0]), np.array([10.0]))[0] == 0
+
+@pytest.mark.parametrize("lat, lon, radius", [
+    (36.0, -115.0, 50), (10.0, 179.8, 100), (-10.0, -179.9, 100), (89.0, 0.0, 200), (-88.5, 45.0, 300),
+])
+def test_bounding_box_holds_the_whole_circle(lat, lon, radius):
+    min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius)
+    assert all(-180 <= low <= high <= 180 for low, high in lon_ranges)
+
+    lats, lons = random_points(20000, seed=int(lat * 100))
+    # Concentrate the samples around the centre
+    lats = np.clip(lat + (np.array(lats) / 90) * 5, -90, 90)
+    lons = (lon + (np.array(lons) / 180) * 10 + 180) % 360 - 180
+    inside = haversine_km(lat, lon, lats, lons) <= radius
+    assert inside.any()
+    for point_lat, point_lon in zip(lats[inside], lons[inside]):
+        assert min_lat <= point_lat <= max_lat
+        assert any(low <= point_lon <= high for low, high in lon_ranges)
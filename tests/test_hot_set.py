@@ -0,0 +1,174 @@
+import asyncio
+import random
+import sqlite3
+import time
+
+import numpy as np
+import pytest
+
+import database
+import hot_set
+from database import (close_db, get_all_sightings, get_dataset_version, get_nearby_sightings, get_recent_sightings,
+                      init_db, note_sighting, save_sighting, SIGHTING_COLUMNS)
+from geometry import haversine_km
+from hot_set import RecentSightings
+
+def sighting(sighting_id: int, lat: float = 36.17, lon: float = -115.14) -> tuple:
+    return (sighting_id, f"{sighting_id}.jpg", f"static/uploads/{sighting_id}.jpg", lat, lon, 0.0,
+            "2026-10-17T00:00:00Z", "device", None, None, None, None, None)
+
+def test_load_tracks_what_was_left_out():
+    recent = RecentSightings(size=3)
+    recent.load([(sighting(i), 1000 + i) for i in (4, 5, 6)], older_id=3, older_epoch=1003)
+    assert [row[0] for row in recent.newest(3)] == [6, 5, 4]
+    assert recent.newest(4) is None
+    assert recent.newest(None) is None
+    assert [row[0] for row in recent.after(3, None)] == [4, 5, 6]
+    assert recent.after(2, None) is None
+    assert recent.since(1003) is None
+    assert [entry.row[0] for entry in recent.since(1004)] == [4, 5, 6]
+
+def test_eviction_raises_the_bounds():
+    recent = RecentSightings(size=2)
+    recent.load([], None, None)
+    for i in range(1, 5):
+        recent.add(sighting(i), 1000 + i)
+    assert len(recent) == 2
+    assert recent.floor_id == 2 and recent.evicted_epoch == 1002
+    assert [row[0] for row in recent.newest(2)] == [4, 3]
+    assert recent.newest(3) is None
+
+def test_hole_falls_back_until_filled(monkeypatch):
+    recent = RecentSightings()
+    recent.load([(sighting(1), 1001)], None, None)
+    recent.add(sighting(3), 1003)
+    assert not recent.complete()
+    assert recent.newest(10) is None
+    assert recent.after(0, None) is None
+    assert recent.nearby(36.17, -115.14, 10) is None
+    assert recent.overdue_gap() is None
+
+    monkeypatch.setattr(hot_set, "GAP_TIMEOUT_SECONDS", -1)
+    assert recent.overdue_gap() == (1, 3)
+    # Only 2 turned up in the database; the missing ids before 3 do not exist
+    recent.add(sighting(5), 1005)
+    recent.fill([(sighting(2), 1002)], 3)
+    assert recent.contiguous_id == 3
+    assert recent.newest(10) is None
+    recent.fill([], 5)
+    assert [row[0] for row in recent.newest(10)] == [5, 3, 2, 1]
+
+def test_set_media_fills_derivatives_once():
+    recent = RecentSightings()
+    recent.load([(sighting(1), 1001)], None, None)
+    recent.set_media("static/uploads/1.jpg", "1.thumb.jpg", None)
+    recent.set_media("static/uploads/1.jpg", "other.jpg", "other.poster.jpg")
+    assert recent.newest(1)[0][11:] == ("1.thumb.jpg", None)
+
+def reference_rows(path: str):
+    with sqlite3.connect(path) as db:
+        return db.execute(f"SELECT {SIGHTING_COLUMNS}, epoch FROM sightings ORDER BY id").fetchall()
+
+def reference_nearby(rows, lat: float, lon: float, radius_km: float, since_epoch=None):
+    candidates = [row for row in rows if row[3] is not None and (since_epoch is None or (row[-1] or -1) >= since_epoch)]
+    distances = haversine_km(lat, lon, np.array([row[3] for row in candidates]), np.array([row[4] for row in candidates]))
+    return sorted((row[0], pytest.approx(distance)) for row, distance in zip(candidates, distances) if distance <= radius_km)
+
+@pytest.mark.parametrize("size", [50, 5000])
+def test_reads_match_sqlite(db_path, monkeypatch, size):
+    """Every read gives the same answer whether or not the hot set covers it"""
+    monkeypatch.setattr(database, "recent", RecentSightings(size))
+    generator = random.Random(size)
+    now = time.time()
+
+    async def scenario():
+        await init_db()
+        try:
+            for n in range(300):
+                seen = now - generator.uniform(0, 48 * 3600)
+                await save_sighting(
+                    f"{n}.jpg", f"static/uploads/{n}.jpg",
+                    36 + generator.uniform(-1, 1), -115 + generator.uniform(-1, 1), 0,
+                    time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(seen)), f"device-{n % 7}"
+                )
+            rows = reference_rows(db_path)
+            columns = [row[:-1] for row in rows]
+
+            assert await get_all_sightings(20) == columns[::-1][:20]
+            assert await get_all_sightings(None) == columns[::-1]
+            assert await get_all_sightings(20, before_id=100) == columns[::-1][201:221]
+            assert await get_all_sightings(20, after_id=250) == columns[250:270]
+
+            for _ in range(20):
+                lat, lon = 36 + generator.uniform(-1, 1), -115 + generator.uniform(-1, 1)
+                radius = generator.choice([5, 25, 80])
+                hours = generator.choice([None, 6, 24])
+                since_epoch = int(time.time() - hours * 3600) if hours is not None else None
+                found = sorted((row[0], row[-1]) for row in await get_nearby_sightings(lat, lon, radius, hours))
+                assert found == reference_nearby(rows, lat, lon, radius, since_epoch)
+
+            since_epoch = int(time.time() - 24 * 3600)
+            assert {row[0] for row in await get_recent_sightings(24)} == {
+                row[0] for row in rows if row[-1] >= since_epoch
+            }
+        finally:
+            await close_db()
+
+    asyncio.run(scenario())
+
+def test_reads_never_lag_the_dataset_version(db_path):
+    """A read that sees a version also sees every sighting up to it, so ResponseCache never tags stale rows"""
+    async def scenario():
+        await init_db()
+        try:
+            stale = []
+            done = False
+
+            async def reader():
+                while not done:
+                    version = get_dataset_version()
+                    rows = await get_all_sightings(50)
+                    if version and (not rows or rows[0][0] < version):
+                        stale.append(version)
+                    await asyncio.sleep(0)
+
+            async def upload(n: int):
+                await save_sighting(f"{n}.jpg", f"static/uploads/{n}.jpg", 36.0, -115.0, 0,
+                                    "2026-10-17T00:00:00Z", "device")
+
+            task = asyncio.create_task(reader())
+            for burst in range(10):
+                await asyncio.gather(*(upload(burst * 20 + n) for n in range(20)))
+            done = True
+            await task
+            assert stale == []
+        finally:
+            await close_db()
+
+    asyncio.run(scenario())
+
+def test_sightings_missed_on_the_bus_are_fetched(db_path, monkeypatch):
+    async def scenario():
+        await init_db()
+        try:
+            await save_sighting("1.jpg", "static/uploads/1.jpg", 36.0, -115.0, 0, "2026-10-17T00:00:00Z", "device")
+            # Another worker stores 2 and 3, but only 3 arrives over the bus
+            with sqlite3.connect(db_path) as db:
+                for sighting_id in (2, 3):
+                    db.execute(
+                        "INSERT INTO sightings (id, filename, lat, lon, timestamp, lat_cell) VALUES (?, ?, 36.0, -115.0, ?, 1260)",
+                        (sighting_id, f"{sighting_id}.jpg", "2026-10-17T00:00:00Z")
+                    )
+            note_sighting((3, "3.jpg", None, 36.0, -115.0, None, "2026-10-17T00:00:00Z", None, None, None, None, None, None))
+
+            assert [row[0] for row in await get_all_sightings(10)] == [3, 2, 1]
+            assert 2 not in database.recent.entries
+
+            monkeypatch.setattr(hot_set, "GAP_TIMEOUT_SECONDS", -1)
+            assert [row[0] for row in await get_all_sightings(10)] == [3, 2, 1]
+            assert database.recent.complete() and 2 in database.recent.entries
+            assert database.stats.total == 3
+        finally:
+            await close_db()
+
+    asyncio.run(scenario())
@@ -0,0 +1,55 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from http_cache import etag_matches, ResponseCache
+from serialization import render
+
+def test_etag_matches():
+    assert etag_matches('W/"1-ab"', 'W/"1-ab"')
+    assert etag_matches('"0-xx", "1-ab"', 'W/"1-ab"')
+    assert etag_matches("*", 'W/"1-ab"')
+    assert not etag_matches('W/"2-ab"', 'W/"1-ab"')
+    assert not etag_matches(None, 'W/"1-ab"')
+
+def test_cached_responses_follow_the_version():
+    state = {"version": 1, "calls": 0}
+    cache = ResponseCache(lambda: state["version"])
+    app = FastAPI()
+
+    @app.get("/items")
+    @cache.cached()
+    async def items(request: Request):
+        state["calls"] += 1
+        return render({"version": state["version"]}, None)
+
+    client = TestClient(app)
+    first = client.get("/items")
+    assert first.json() == {"version": 1}
+    etag = first.headers["etag"]
+
+    assert client.get("/items").json() == {"version": 1}
+    assert client.get("/items", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/items?b=2&a=1").headers["etag"] == client.get("/items?a=1&b=2").headers["etag"]
+    assert state["calls"] == 2
+
+    state["version"] = 2
+    assert client.get("/items", headers={"If-None-Match": etag}).json() == {"version": 2}
+    assert state["calls"] == 3
+
+def test_result_computed_against_an_old_version_is_not_kept():
+    state = {"version": 1, "calls": 0}
+    cache = ResponseCache(lambda: state["version"])
+    app = FastAPI()
+
+    @app.get("/items")
+    @cache.cached()
+    async def items(request: Request):
+        state["calls"] += 1
+        # Data arrives while this response is being built
+        state["version"] += 1
+        return render({}, None)
+
+    client = TestClient(app)
+    client.get("/items")
+    client.get("/items")
+    assert state["calls"] == 2
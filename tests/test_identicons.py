@@ -0,0 +1,44 @@
+import os
+
+from fastapi.testclient import TestClient
+
+import identicons
+from http_cache import IMMUTABLE_CACHE_CONTROL
+from identicons import STYLE_VERSION, UNVERSIONED_CACHE_CONTROL, identicon_etag, render_identicon
+
+def test_only_the_current_style_version_is_immutable(app):
+    with TestClient(app) as client:
+        response = client.get(f"/identicon/phone.png?v={STYLE_VERSION}")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        assert response.content.startswith(b"\x89PNG")
+        assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+        assert response.headers["etag"] == identicon_etag("phone")
+
+        for query in ("", "?v=0"):
+            assert client.get(f"/identicon/phone.png{query}").headers["cache-control"] == UNVERSIONED_CACHE_CONTROL
+
+        revalidated = client.get("/identicon/phone.png", headers={"If-None-Match": response.headers["etag"]})
+        assert revalidated.status_code == 304 and revalidated.content == b""
+
+def test_etag_changes_with_the_device_and_style(monkeypatch):
+    etag = identicon_etag("phone")
+    assert identicon_etag("tablet") != etag
+    monkeypatch.setattr(identicons, "STYLE_VERSION", "2")
+    assert identicon_etag("phone") != etag
+
+def test_rendered_images_are_kept_on_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(identicons, "DISK_CACHE_DIR", str(tmp_path))
+    render_identicon.cache_clear()
+    try:
+        png = render_identicon("phone")
+        path = tmp_path / f"{STYLE_VERSION}-{identicons.device_digest('phone')}.png"
+        assert path.read_bytes() == png
+
+        # A restart reads the stored file instead of rendering again
+        path.write_bytes(b"stored")
+        render_identicon.cache_clear()
+        assert render_identicon("phone") == b"stored"
+        assert [name for name in os.listdir(tmp_path) if name.startswith(".")] == []
+    finally:
+        render_identicon.cache_clear()
@@ -0,0 +1,72 @@
+import asyncio
+import random
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from geometry import haversine_km
+from proximity import MAX_ALERT_RADIUS_KM, SubscriberGrid
+
+def brute_force(subscribers: dict, lat: float, lon: float) -> list:
+    users = list(subscribers)
+    positions = np.array([subscribers[user_id] for user_id in users])
+    distances = haversine_km(lat, lon, positions[:, 0], positions[:, 1])
+    return sorted(user_id for user_id, distance, (_, _, radius) in zip(users, distances, positions) if distance <= radius)
+
+@pytest.mark.parametrize("lat, lon", [(36.0, -115.0), (0.0, 179.5), (-12.0, -179.8), (89.5, 10.0)])
+def test_grid_finds_every_subscriber_whose_radius_covers_the_point(lat, lon):
+    generator = random.Random(f"{lat},{lon}")
+    grid, subscribers = SubscriberGrid(), {}
+    for n in range(300):
+        position = (
+            max(-90.0, min(90.0, lat + generator.uniform(-5, 5))),
+            (lon + generator.uniform(-8, 8) + 180) % 360 - 180,
+            generator.choice([10, 50, 200, 500]),
+        )
+        subscribers[f"user-{n}"] = position
+        grid.update(f"user-{n}", *position)
+
+    for _ in range(10):
+        point_lat = max(-90.0, min(90.0, lat + generator.uniform(-3, 3)))
+        point_lon = (lon + generator.uniform(-3, 3) + 180) % 360 - 180
+        found = grid.nearby(point_lat, point_lon)
+        assert sorted(user_id for user_id, _ in found) == brute_force(subscribers, point_lat, point_lon)
+
+def test_updates_move_and_remove_subscribers():
+    grid = SubscriberGrid()
+    grid.update("walker", 36.0, -115.0, 10)
+    assert [user_id for user_id, _ in grid.nearby(36.0, -115.0)] == ["walker"]
+
+    grid.update("walker", 40.0, -100.0, 10)
+    assert grid.nearby(36.0, -115.0) == []
+    assert [user_id for user_id, _ in grid.nearby(40.0, -100.0)] == ["walker"]
+
+    grid.update("walker", 40.0, -100.0, 10000)
+    assert grid.positions["walker"][2] == MAX_ALERT_RADIUS_KM
+
+    grid.remove("walker")
+    assert len(grid) == 0 and grid.cells == {} and grid.radius_counts == {}
+
+async def wait_for_subscribers(count: int):
+    for _ in range(200):
+        if len(main.manager.subscribers) == count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("timed out")
+
+def test_alerts_reach_only_nearby_sockets(app):
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/near") as near, client.websocket_connect("/ws/far") as far:
+            # Ignored rather than dropping the connection
+            near.send_json({"type": "location_update", "lat": "nan", "lon": "nan"})
+            near.send_json({"type": "location_update", "lat": 36.0, "lon": -115.0, "radius_km": 20})
+            far.send_json({"type": "location_update", "lat": 40.0, "lon": -100.0, "radius_km": 20})
+            client.portal.call(wait_for_subscribers, 2)
+
+            sighting = {"id": 1, "lat": 36.05, "lon": -115.0}
+            client.portal.call(main.manager.broadcast_proximity_alert, sighting)
+            alert = near.receive_json()
+            assert alert["type"] == "proximity_alert" and alert["data"] == sighting
+            assert len(main.manager.subscribers) == 2
@@ -0,0 +1,46 @@
+import msgpack
+import orjson
+import pytest
+from pydantic import BaseModel
+
+from identicons import STYLE_VERSION
+from models import SightingResponse
+from serialization import build_row_mapper, encode, nearby_record, sighting_record
+
+ROW = (7, "IMG_1.jpg", "static/uploads/ab12.mp4", 36.17, -115.14, 45.0, "2026-10-17T00:00:00Z",
+       "phone", "US", None, "s-7", "ab12.thumb.jpg", "ab12.poster.jpg")
+
+def test_sighting_record_matches_the_response_model():
+    record = sighting_record(ROW)
+    assert list(record) == list(SightingResponse.model_fields)
+    assert SightingResponse(**record).model_dump() == record
+    assert record["url"] == "https://ufobeep.com/static/uploads/ab12.mp4"
+    assert record["identicon_url"] == f"https://ufobeep.com/identicon/phone.png?v={STYLE_VERSION}"
+    assert record["thumbnail_url"] == "https://ufobeep.com/static/uploads/ab12.thumb.jpg"
+    assert record["thumbnail_webp_url"] == "https://ufobeep.com/static/uploads/ab12.thumb.webp"
+    assert record["poster_url"] == "https://ufobeep.com/static/uploads/ab12.poster.jpg"
+
+def test_missing_media_falls_back():
+    row = (8, "IMG_2.jpg", None, *ROW[3:11], None, None)
+    record = sighting_record(row)
+    assert record["url"] == "https://ufobeep.com/static/uploads/IMG_2.jpg"
+    assert record["thumbnail_url"] is record["thumbnail_webp_url"] is record["poster_url"] is None
+
+def test_nearby_record_reads_the_appended_distance():
+    assert nearby_record((*ROW, 1.5))["distance_km"] == 1.5
+    assert sighting_record((*ROW, 1.5))["distance_km"] is None
+
+def test_fields_without_a_source_are_rejected():
+    class Extra(BaseModel):
+        id: int
+        colour: str
+
+    with pytest.raises(ValueError, match="Extra.colour"):
+        build_row_mapper(Extra)
+
+def test_encode_follows_accept():
+    content = [sighting_record(ROW)]
+    assert encode(content) == (orjson.dumps(content), "application/json")
+    body, media_type = encode(content, "application/x-msgpack, */*")
+    assert media_type == "application/msgpack"
+    assert msgpack.unpackb(body) == content
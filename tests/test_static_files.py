@@ -0,0 +1,70 @@
+import gzip
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from http_cache import IMMUTABLE_CACHE_CONTROL
+from static_files import REVALIDATE_CACHE_CONTROL, PrecompressedStaticFiles, accepted_encodings
+
+PAGE = b"<html>" + b"<p>UFO over the strip</p>" * 200 + b"</html>"
+HASHED = "ab" * 32 + ".mp4"
+
+@pytest.fixture
+def site(tmp_path):
+    (tmp_path / "map.html").write_bytes(PAGE)
+    (tmp_path / "tiny.css").write_bytes(b"p{}")
+    (tmp_path / HASHED).write_bytes(bytes(range(256)) * 16)
+    files = PrecompressedStaticFiles(directory=str(tmp_path))
+    files.precompress()
+    app = FastAPI()
+    app.mount("/static", files)
+    return tmp_path, files, TestClient(app)
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, br;q=0") == {"gzip"}
+    assert accepted_encodings("*") >= {"gzip", "br"}
+    assert accepted_encodings(None) == set()
+
+def test_variants_are_written_and_served(site):
+    root, _, client = site
+    assert gzip.decompress((root / "map.html.gz").read_bytes()) == PAGE
+    # Too small to gain anything
+    assert not (root / "tiny.css.gz").exists()
+
+    response = client.get("/static/map.html", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"].startswith("text/html")
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+    assert response.content == PAGE
+
+    response = client.get("/static/map.html", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.content == PAGE
+
+def test_changed_source_is_served_as_is(site):
+    root, _, client = site
+    (root / "map.html").write_bytes(PAGE + b"<!-- edited -->")
+    stat = os.stat(root / "map.html")
+    os.utime(root / "map.html", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    response = client.get("/static/map.html", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.content.endswith(b"<!-- edited -->")
+
+def test_ranges_and_hashed_names(site):
+    _, _, client = site
+    response = client.get(f"/static/{HASHED}", headers={"Range": "bytes=256-511"})
+    assert response.status_code == 206
+    assert response.content == bytes(range(256))
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+    # Byte offsets always refer to the original, never to a compressed variant
+    response = client.get("/static/map.html", headers={"Range": "bytes=0-5", "Accept-Encoding": "gzip"})
+    assert response.status_code == 206
+    assert response.content == b"<html>"
+    assert "content-encoding" not in response.headers
+
+    etag = client.get(f"/static/{HASHED}").headers["etag"]
+    assert client.get(f"/static/{HASHED}", headers={"If-None-Match": etag}).status_code == 304
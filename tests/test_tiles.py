@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from database import close_db, init_db, save_sighting
+from tiles import MAX_CLUSTER_ZOOM, TileCache, cluster_keys, tile_bounds, world_position
+
+POINTS = [(36.17, -115.14), (36.18, -115.15), (51.5, -0.12), (-33.87, 151.21)]
+
+def seed():
+    async def scenario():
+        await init_db()
+        try:
+            for n, (lat, lon) in enumerate(POINTS):
+                await save_sighting(f"{n}.jpg", f"static/uploads/{n}.jpg", lat, lon, 0, "2026-10-17T00:00:00Z", "device")
+        finally:
+            await close_db()
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("lat, lon", POINTS)
+def test_cluster_keys_name_the_tiles_holding_the_point(lat, lon):
+    keys = cluster_keys(lat, lon)
+    assert [key[0] for key in keys] == list(range(MAX_CLUSTER_ZOOM + 1))
+    for zoom, tile_x, tile_y, cell in keys:
+        west, south, east, north = tile_bounds(zoom, tile_x, tile_y)
+        assert west <= lon < east and south <= lat < north
+        assert 0 <= cell < 64
+
+def test_tile_cache_drops_tiles_a_sighting_lands_in():
+    cache = TileCache(size=2)
+    zoom, tile_x, tile_y, _ = cluster_keys(*POINTS[0])[5]
+    cache.put((zoom, tile_x, tile_y), b"old", cache.generation)
+    generation = cache.generation
+    cache.invalidate(*POINTS[0])
+    assert cache.get((zoom, tile_x, tile_y)) is None
+
+    # Built before the invalidation, so not kept
+    cache.put((zoom, tile_x, tile_y), b"stale", generation)
+    assert cache.get((zoom, tile_x, tile_y)) is None
+
+    for key in [(1, 0, 0), (1, 1, 0), (1, 0, 1)]:
+        cache.put(key, b"tile", cache.generation)
+    assert list(cache.tiles) == [(1, 1, 0), (1, 0, 1)]
+
+def test_tiles_endpoint_serves_clusters(app):
+    seed()
+    with TestClient(app) as client:
+        world = client.get("/tiles/0/0/0").json()
+        assert (world["z"], world["x"], world["y"]) == (0, 0, 0)
+        assert sum(cluster[0] for cluster in world["clusters"]) == len(POINTS)
+
+        # The two Las Vegas reports share a cluster at low zoom, with their centroid
+        zoom, tile_x, tile_y, _ = cluster_keys(*POINTS[0])[4]
+        clusters = client.get(f"/tiles/{zoom}/{tile_x}/{tile_y}").json()["clusters"]
+        assert clusters == [[2, 36.175, -115.145, 2]]
+
+        # Past MAX_CLUSTER_ZOOM the deepest clusters are cut to the tile
+        zoom = MAX_CLUSTER_ZOOM + 3
+        x, y = world_position(*POINTS[2])
+        tile_x, tile_y = int(x * (1 << zoom)), int(y * (1 << zoom))
+        assert client.get(f"/tiles/{zoom}/{tile_x}/{tile_y}").json()["clusters"] == [[1, 51.5, -0.12, 3]]
+        assert client.get(f"/tiles/{zoom}/{tile_x + 1}/{tile_y}").json()["clusters"] == []
+
+        assert client.get("/tiles/1/2/0").status_code == 404
+        assert client.get("/tiles/23/0/0").status_code == 404
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+import triangulation
+from triangulation import TriangulationEngine, WINDOW_SECONDS, cross_bearings, Observation
+
+# Two observers about 18 km apart, looking at a point north of the middle of them
+WEST = (36.0, -115.0, 45.0)
+EAST = (36.0, -114.8, 315.0)
+
+def test_crossing_bearings_meet_ahead_of_both():
+    west = Observation(1, *WEST, time.time(), "west")
+    east = Observation(2, *EAST, time.time(), "east")
+    matched, lats, lons, quality = cross_bearings(west, [east])
+    assert matched.tolist() == [0]
+    assert lats[0] == pytest.approx(36.09, abs=0.01)
+    assert lons[0] == pytest.approx(-114.9, abs=0.01)
+    assert quality[0] == pytest.approx(1.0)
+
+    # Looking away from each other: the rays only cross behind them
+    away = Observation(2, 36.0, -114.8, 135.0, time.time(), "east")
+    assert len(cross_bearings(west, [away])[0]) == 0
+
+def test_concurrent_reports_form_one_event():
+    engine = TriangulationEngine()
+    now = time.time()
+    assert engine.add(1, *WEST, now, "west") is None
+    event = engine.add(2, *EAST, now - 30, "east")
+    assert event is not None and event.members == {1, 2}
+    assert engine.add(3, 36.05, -115.1, 76.0, now - 60, "north-west").id == 1
+
+    lat, lon, spread, confidence = engine.get(1).estimate()
+    assert lat == pytest.approx(36.09, abs=0.02)
+    assert lon == pytest.approx(-114.9, abs=0.02)
+    assert spread < 1
+    assert 0 < confidence < 1
+    assert [event.id for event in engine.recent()] == [1]
+
+def test_one_device_does_not_triangulate_with_itself():
+    engine = TriangulationEngine()
+    now = time.time()
+    engine.add(1, *WEST, now, "phone")
+    assert engine.add(2, *EAST, now, "phone") is None
+
+def test_reports_too_far_apart_in_time_do_not_pair():
+    engine = TriangulationEngine()
+    now = time.time()
+    engine.add(1, *WEST, now - 2 * WINDOW_SECONDS, "west")
+    assert engine.add(2, *EAST, now, "east") is None
+
+def test_future_dated_report_does_not_expire_the_rest(monkeypatch):
+    engine = TriangulationEngine()
+    now = time.time()
+    engine.add(1, *WEST, now, "west")
+    engine.add(2, *EAST, now, "east")
+    assert len(engine.events) == 1
+
+    # A client clock ten days ahead
+    engine.add(3, 10.0, 10.0, 0.0, now + 10 * 24 * 3600, "ahead")
+    assert len(engine.events) == 1
+    assert engine.add(4, 36.05, -115.1, 76.0, now, "north-west").id == 1
+
+    # Housekeeping still runs as real time moves on
+    monkeypatch.setattr(triangulation.time, "time", lambda: now + 2 * 24 * 3600)
+    engine.add(5, 0.0, 0.0, 0.0, now + 2 * 24 * 3600, "later")
+    assert engine.events == {}
+    assert len(engine.index) == 1
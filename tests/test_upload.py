@@ -0,0 +1,61 @@
+import asyncio
+import io
+import os
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request, UploadFile
+from fastapi.testclient import TestClient
+
+import upload_handler
+from upload_handler import FORM_OVERHEAD_BYTES, UploadSizeLimitMiddleware, save_upload_file
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    path = str(tmp_path / "uploads")
+    monkeypatch.setattr(upload_handler, "UPLOAD_DIR", path)
+    monkeypatch.setattr(upload_handler, "CHUNK_SIZE", 4)
+    return path
+
+def upload(data: bytes, filename: str = "clip.MP4") -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename=filename)
+
+def test_uploads_are_stored_once_under_their_content_hash(upload_dir):
+    async def scenario():
+        first = await save_upload_file(upload(b"same bytes"))
+        second = await save_upload_file(upload(b"same bytes", "retry.mp4"))
+        other = await save_upload_file(upload(b"other bytes", "photo.jpg"))
+        return first, second, other
+
+    first, second, other = asyncio.run(scenario())
+    assert first == second != other
+    assert first.endswith(".mp4") and other.endswith(".jpg")
+    assert sorted(os.listdir(upload_dir)) == sorted(os.path.basename(path) for path in (first, other))
+
+def test_oversized_upload_is_refused_and_cleaned_up(upload_dir):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(save_upload_file(upload(b"x" * 11), max_bytes=10))
+    assert error.value.status_code == 413
+    assert os.listdir(upload_dir) == []
+
+def limited_app() -> TestClient:
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=10)
+    return TestClient(app)
+
+def test_middleware_refuses_a_declared_length_over_the_limit():
+    client = limited_app()
+    limit = 10 + FORM_OVERHEAD_BYTES
+    assert client.post("/upload", content=b"x" * limit).json() == {"size": limit}
+    response = client.post("/upload", content=b"x" * (limit + 1))
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Upload exceeds 10 bytes"}
+
+def test_middleware_cuts_off_a_chunked_body_over_the_limit():
+    client = limited_app()
+    chunks = (b"x" * 1024 for _ in range(FORM_OVERHEAD_BYTES // 1024 + 1))
+    assert client.post("/upload", content=chunks).status_code == 413
@@ -0,0 +1,83 @@
+import json
+import math
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+# Clusters are kept for zoom levels 0..MAX_CLUSTER_ZOOM. Each tile is split
+# into CELLS_PER_SIDE x CELLS_PER_SIDE cells and every cell holds one cluster,
+# so a tile never has more than CELLS_PER_SIDE ** 2 of them.
+MAX_CLUSTER_ZOOM = 14
+CELL_BITS = 3
+CELLS_PER_SIDE = 1 << CELL_BITS
+
+MAX_MERCATOR_LAT = 85.05112878
+
+TILE_CACHE_SIZE = 2048
+
+def world_position(lat: float, lon: float) -> Tuple[float, float]:
+    """Web Mercator position scaled to 0..1 on both axes (y grows southwards)"""
+    lat = max(min(lat, MAX_MERCATOR_LAT), -MAX_MERCATOR_LAT)
+    x = (lon + 180) / 360
+    lat_rad = math.radians(lat)
+    y = (1 - math.log(math.tan(lat_rad) + 1 / math.cos(lat_rad)) / math.pi) / 2
+    return x, y
+
+def cluster_keys(lat: float, lon: float) -> List[Tuple[int, int, int, int]]:
+    """(zoom, tile_x, tile_y, cell) of the cluster a point belongs to, for every zoom level"""
+    x, y = world_position(lat, lon)
+    keys = []
+    for zoom in range(MAX_CLUSTER_ZOOM + 1):
+        cells = 1 << (zoom + CELL_BITS)
+        cell_x = min(int(x * cells), cells - 1)
+        cell_y = min(int(y * cells), cells - 1)
+        cell = (cell_y & (CELLS_PER_SIDE - 1)) * CELLS_PER_SIDE + (cell_x & (CELLS_PER_SIDE - 1))
+        keys.append((zoom, cell_x >> CELL_BITS, cell_y >> CELL_BITS, cell))
+    return keys
+
+def tile_bounds(zoom: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(west, south, east, north) of a tile in degrees"""
+    def lat_at(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / (1 << zoom)))))
+
+    scale = 1 << zoom
+    return x / scale * 360 - 180, lat_at(y + 1), (x + 1) / scale * 360 - 180, lat_at(y)
+
+def encode_tile(zoom: int, x: int, y: int, clusters: Iterable[Tuple[int, float, float, int]]) -> bytes:
+    """Compact tile payload: clusters as [count, lat, lon, newest_id]"""
+    return json.dumps({
+        "z": zoom,
+        "x": x,
+        "y": y,
+        "clusters": [[count, round(lat, 5), round(lon, 5), newest_id] for count, lat, lon, newest_id in clusters]
+    }, separators=(",", ":")).encode()
+
+class TileCache:
+    """Encoded tile payloads, evicted least recently used and dropped when a sighting lands in them"""
+
+    def __init__(self, size: int = TILE_CACHE_SIZE):
+        self.size = size
+        self.tiles: "OrderedDict[Tuple[int, int, int], bytes]" = OrderedDict()
+        # Bumped on every invalidation so a read that raced an insert is not cached
+        self.generation = 0
+
+    def get(self, key: Tuple[int, int, int]) -> Optional[bytes]:
+        payload = self.tiles.get(key)
+        if payload is not None:
+            self.tiles.move_to_end(key)
+        return payload
+
+    def put(self, key: Tuple[int, int, int], payload: bytes, generation: int):
+        if generation != self.generation:
+            return
+        self.tiles[key] = payload
+        self.tiles.move_to_end(key)
+        while len(self.tiles) > self.size:
+            self.tiles.popitem(last=False)
+
+    def invalidate(self, lat: float, lon: float):
+        self.generation += 1
+        for zoom, tile_x, tile_y, _ in cluster_keys(lat, lon):
+            self.tiles.pop((zoom, tile_x, tile_y), None)
+
+    def clear(self):
+        self.tiles.clear()
@@ -0,0 +1,292 @@
+"""Locates reported objects by crossing the bearings of concurrent reports.
+
+Two observers who look at the same object from different places report
+bearings whose rays meet near it. Every new sighting is paired with reports
+from other devices made within WINDOW_SECONDS and MAX_OBSERVER_DISTANCE_KM;
+each pair whose rays cross ahead of both observers gives a fix. Sightings
+linked by fixes form one event, positioned at the weighted mean of its fixes.
+
+Candidates come from ObservationIndex, a hash of (time slot, grid cell)
+buckets that grows with each sighting and drops whole slots as they age out,
+so a burst of reports costs a few bucket lookups each rather than a scan.
+"""
+import math
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from geometry import EARTH_RADIUS_KM, haversine_km
+from proximity import grid_cell, grid_cells_within
+
+WINDOW_SECONDS = 300
+# Reports further apart than this are assumed to be of different objects
+MAX_OBSERVER_DISTANCE_KM = 100
+# How far along a bearing the object may be
+MAX_RANGE_KM = 150
+# Nearly parallel rays cross far from where either is accurate
+MIN_CROSSING_ANGLE_DEG = 10
+# A new report is crossed with at most this many of the closest-in-time
+# reports, which keeps a mass sighting linear rather than quadratic
+MAX_PAIRINGS = 32
+EVENT_RETENTION_SECONDS = 24 * 3600
+# Fix spread at which agreement, and so confidence, is halved
+SPREAD_SCALE_KM = 5
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+class Observation:
+    __slots__ = ("id", "lat", "lon", "bearing", "epoch", "device_id")
+
+    def __init__(self, sighting_id: int, lat: float, lon: float, bearing: float, epoch: float, device_id: str):
+        self.id = sighting_id
+        self.lat = lat
+        self.lon = lon
+        self.bearing = bearing
+        self.epoch = epoch
+        self.device_id = device_id
+
+class ObservationIndex:
+    """Recent observations bucketed by WINDOW_SECONDS time slot and grid cell"""
+
+    def __init__(self):
+        self.buckets: Dict[Tuple[int, int, int], List[Observation]] = {}
+        self.slot_cells: Dict[int, Set[Tuple[int, int]]] = {}
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def add(self, observation: Observation):
+        slot = int(observation.epoch // WINDOW_SECONDS)
+        cell = grid_cell(observation.lat, observation.lon)
+        self.buckets.setdefault((slot, *cell), []).append(observation)
+        self.slot_cells.setdefault(slot, set()).add(cell)
+
+    def candidates(self, observation: Observation, limit: int = MAX_PAIRINGS) -> List[Observation]:
+        """Up to limit observations from other devices close enough in time and space to pair with"""
+        first_slot = int((observation.epoch - WINDOW_SECONDS) // WINDOW_SECONDS)
+        last_slot = int((observation.epoch + WINDOW_SECONDS) // WINDOW_SECONDS)
+        lat_cells, lon_cells = grid_cells_within(observation.lat, observation.lon, MAX_OBSERVER_DISTANCE_KM)
+
+        found = []
+        for slot in range(first_slot, last_slot + 1):
+            for cell in self.slot_cells.get(slot, ()):
+                if cell[0] in lat_cells and cell[1] in lon_cells:
+                    found.extend(self._latest(self.buckets[(slot, *cell)], observation, limit))
+        if not found:
+            return []
+
+        distances = haversine_km(
+            observation.lat, observation.lon,
+            np.fromiter((other.lat for other in found), np.float64, len(found)),
+            np.fromiter((other.lon for other in found), np.float64, len(found))
+        )
+        close = [found[i] for i in np.flatnonzero(distances <= MAX_OBSERVER_DISTANCE_KM).tolist()]
+        if len(close) > limit:
+            close.sort(key=lambda other: abs(other.epoch - observation.epoch))
+            del close[limit:]
+        return close
+
+    @staticmethod
+    def _latest(bucket: List[Observation], observation: Observation, limit: int):
+        """The last `limit` usable entries of a bucket (buckets fill in arrival order)"""
+        taken = 0
+        for other in reversed(bucket):
+            if other.device_id != observation.device_id and abs(other.epoch - observation.epoch) <= WINDOW_SECONDS:
+                yield other
+                taken += 1
+                if taken == limit:
+                    return
+
+    def evict_before(self, epoch: float):
+        """Drop the time slots that can no longer pair with anything from epoch on"""
+        cutoff = int((epoch - WINDOW_SECONDS) // WINDOW_SECONDS)
+        for slot in [slot for slot in self.slot_cells if slot < cutoff]:
+            for cell in self.slot_cells.pop(slot):
+                del self.buckets[(slot, *cell)]
+
+def cross_bearings(observation: Observation, others: List[Observation]):
+    """Crossings of observation's ray with each of others' rays.
+
+    Works in a flat projection around the new observer, which is accurate
+    to well under a percent at MAX_RANGE_KM. Returns (indexes into others,
+    lats, lons, crossing quality as the sine of the angle between the rays).
+    """
+    lats = np.fromiter((other.lat for other in others), np.float64, len(others))
+    lons = np.fromiter((other.lon for other in others), np.float64, len(others))
+    bearings = np.radians(np.fromiter((other.bearing for other in others), np.float64, len(others)))
+
+    scale_x = KM_PER_DEGREE * math.cos(math.radians(observation.lat))
+    # Offsets of the other observers, wrapping longitude across the antimeridian
+    dx = ((lons - observation.lon + 180) % 360 - 180) * scale_x
+    dy = (lats - observation.lat) * KM_PER_DEGREE
+
+    own = math.radians(observation.bearing)
+    ux, uy = math.sin(own), math.cos(own)
+    vx, vy = np.sin(bearings), np.cos(bearings)
+
+    cross = ux * vy - uy * vx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Distance along each ray to the crossing point
+        along_own = (dx * vy - dy * vx) / cross
+        along_other = (dx * uy - dy * ux) / cross
+
+    quality = np.abs(cross)
+    valid = np.flatnonzero(
+        (quality >= math.sin(math.radians(MIN_CROSSING_ANGLE_DEG)))
+        & (along_own > 0) & (along_own <= MAX_RANGE_KM)
+        & (along_other > 0) & (along_other <= MAX_RANGE_KM)
+    )
+
+    fix_lats = observation.lat + along_own[valid] * uy / KM_PER_DEGREE
+    fix_lons = (observation.lon + along_own[valid] * ux / scale_x + 180) % 360 - 180
+    return valid, np.clip(fix_lats, -90, 90), fix_lons, quality[valid]
+
+class SightingEvent:
+    """Sightings of what is probably one object, with its estimated position.
+
+    Fixes are folded into running sums of quality-weighted unit vectors, so
+    an event seen by thousands of observers stays the same size.
+    """
+
+    __slots__ = ("id", "members", "devices", "sum_x", "sum_y", "sum_z", "sum_quality", "fix_count",
+                 "first_epoch", "last_epoch")
+
+    def __init__(self, event_id: int):
+        self.id = event_id
+        self.members: Set[int] = set()
+        self.devices: Set[str] = set()
+        self.sum_x = self.sum_y = self.sum_z = 0.0
+        self.sum_quality = 0.0
+        self.fix_count = 0
+        self.first_epoch = math.inf
+        self.last_epoch = -math.inf
+
+    def add(self, observation: Observation):
+        self.members.add(observation.id)
+        self.devices.add(observation.device_id)
+        self.first_epoch = min(self.first_epoch, observation.epoch)
+        self.last_epoch = max(self.last_epoch, observation.epoch)
+
+    def add_fixes(self, lats: np.ndarray, lons: np.ndarray, quality: np.ndarray):
+        lats, lons = np.radians(lats), np.radians(lons)
+        self.sum_x += float(np.sum(quality * np.cos(lats) * np.cos(lons)))
+        self.sum_y += float(np.sum(quality * np.cos(lats) * np.sin(lons)))
+        self.sum_z += float(np.sum(quality * np.sin(lats)))
+        self.sum_quality += float(np.sum(quality))
+        self.fix_count += len(quality)
+
+    def absorb(self, other: "SightingEvent"):
+        self.id = min(self.id, other.id)
+        self.members |= other.members
+        self.devices |= other.devices
+        self.sum_x += other.sum_x
+        self.sum_y += other.sum_y
+        self.sum_z += other.sum_z
+        self.sum_quality += other.sum_quality
+        self.fix_count += other.fix_count
+        self.first_epoch = min(self.first_epoch, other.first_epoch)
+        self.last_epoch = max(self.last_epoch, other.last_epoch)
+
+    def estimate(self) -> Tuple[float, float, float, float]:
+        """(lat, lon, spread_km, confidence).
+
+        The position is the quality-weighted mean of the fixes, and the
+        spread their weighted RMS distance from it. Confidence in 0..1 grows
+        with the number of observers, how squarely their rays cross and how
+        closely the fixes agree.
+        """
+        x, y, z = self.sum_x / self.sum_quality, self.sum_y / self.sum_quality, self.sum_z / self.sum_quality
+        lat = math.degrees(math.atan2(z, math.hypot(x, y)))
+        lon = math.degrees(math.atan2(y, x))
+        # Mean squared chord between unit vectors and their mean: 1 - |mean|^2
+        spread = EARTH_RADIUS_KM * math.sqrt(max(0.0, 1 - (x * x + y * y + z * z)))
+
+        observers = len(self.devices)
+        mean_quality = self.sum_quality / self.fix_count
+        confidence = (1 - 1 / observers) * mean_quality / (1 + spread / SPREAD_SCALE_KM)
+        return lat, lon, spread, confidence
+
+class TriangulationEngine:
+    """Feeds sightings through the index and groups crossing bearings into events.
+
+    Events are identified by their lowest sighting id, so every worker that
+    sees the same sightings ends up with the same ids.
+    """
+
+    def __init__(self):
+        self.index = ObservationIndex()
+        self.events: Dict[int, SightingEvent] = {}
+        self.event_of: Dict[int, SightingEvent] = {}
+        self.current_slot: Optional[int] = None
+
+    def add(self, sighting_id: int, lat: float, lon: float, bearing: Optional[float],
+            epoch: float, device_id: str) -> Optional[SightingEvent]:
+        """Index one sighting; returns the event it joined, if any"""
+        if bearing is None or sighting_id in self.event_of:
+            return None
+        # Client clocks run ahead sometimes; treat those as "now", and age
+        # everything out by arrival time so one bad clock cannot expire the rest
+        now = time.time()
+        epoch = min(epoch, now)
+        observation = Observation(sighting_id, lat, lon, bearing % 360, epoch, device_id)
+        slot = int(now // WINDOW_SECONDS)
+        if self.current_slot is None or slot > self.current_slot:
+            # Housekeeping once per time slot rather than on every sighting
+            self.current_slot = slot
+            self.index.evict_before(now)
+            self._expire_events(now)
+
+        partners = self.index.candidates(observation)
+        self.index.add(observation)
+        if not partners:
+            return None
+
+        matched, fix_lats, fix_lons, quality = cross_bearings(observation, partners)
+        if not len(matched):
+            return None
+        partners = [partners[i] for i in matched.tolist()]
+
+        # Merge into the largest event involved, so members are re-pointed as rarely as possible
+        joined = {}
+        for partner in partners:
+            event = self.event_of.get(partner.id)
+            if event is not None:
+                joined[id(event)] = event
+        events = sorted(joined.values(), key=lambda event: len(event.members), reverse=True)
+        event = events[0] if events else SightingEvent(observation.id)
+        self.events.pop(event.id, None)
+
+        moved = [observation.id]
+        event.add(observation)
+        for partner in partners:
+            if partner.id not in self.event_of:
+                event.add(partner)
+                moved.append(partner.id)
+        for other in events[1:]:
+            del self.events[other.id]
+            event.absorb(other)
+            moved.extend(other.members)
+        event.add_fixes(fix_lats, fix_lons, quality)
+        event.id = min(event.id, *moved)
+
+        for member in moved:
+            self.event_of[member] = event
+        self.events[event.id] = event
+        return event
+
+    def get(self, event_id: int) -> Optional[SightingEvent]:
+        return self.events.get(event_id)
+
+    def recent(self, since_epoch: float = -math.inf) -> List[SightingEvent]:
+        """Events active since since_epoch, most recently active first"""
+        events = [event for event in self.events.values() if event.last_epoch >= since_epoch]
+        events.sort(key=lambda event: event.last_epoch, reverse=True)
+        return events
+
+    def _expire_events(self, epoch: float):
+        cutoff = epoch - EVENT_RETENTION_SECONDS
+        for event in [event for event in self.events.values() if event.last_epoch < cutoff]:
+            del self.events[event.id]
+            for member in event.members:
+                self.event_of.pop(member, None)
@@ -481,7 +481,9 @@ class UFOBeepApp {
                 console.log('📨 WebSocket Message:', message);
                 
                 if (message.type === 'proximity_alert') {
-                    this.handleProximityAlert(message.data);
+                    this.handleProximityAlert(message.data, message.audio_url);
+                } else if (message.type === 'ping') {
+                    this.ws.send(JSON.stringify({ type: 'pong' }));
                 }
             };
 
@@ -612,7 +614,9 @@ class UFOBeepApp {
             this.ws.send(JSON.stringify({
                 type: 'location_update',
                 lat: this.userLocation.lat,
-                lon: this.userLocation.lng
+                lon: this.userLocation.lng,
+                language: this.currentLanguage,
+                units: 'km'
             }));
         }
     }
@@ -844,8 +848,11 @@ class UFOBeepApp {
         marker.bindPopup(popupContent);
     }
 
-    handleProximityAlert(sightingData) {
+    handleProximityAlert(sightingData, audioUrl = null) {
         console.log('🚨 Proximity Alert:', sightingData);
+
+        // Server-composed voice clip for this alert, played by playModularAlert
+        this.alertAudioUrl = audioUrl;
         
         // Add to alert feed
         this.addAlertToFeed(sightingData);
@@ -1400,9 +1407,18 @@ class UFOBeepApp {
     }
 
     async playModularAlert(distance, direction, bearing) {
-        // This would play the modular sound pack
-        // For now, return false to use fallback
-        return false;
+        // One pre-composed clip from the server's sound pack, when it has one
+        const audioUrl = this.alertAudioUrl;
+        this.alertAudioUrl = null;
+        if (!audioUrl) return false;
+
+        try {
+            await new Audio(`${this.apiUrl}${audioUrl}`).play();
+            return true;
+        } catch (error) {
+            console.log('🔇 Alert clip unavailable:', error);
+            return false;
+        }
     }
 
     playVoiceAlert(type = 'alert', customMessage = null) {
@@ -158,6 +158,8 @@ class UFOBeepApp {
             
             if (message.type === 'proximity_alert') {
                 this.handleProximityAlert(message.data);
+            } else if (message.type === 'ping') {
+                this.ws.send(JSON.stringify({ type: 'pong' }));
             }
         };
 
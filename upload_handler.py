@@ -1,26 +1,116 @@
+import asyncio
+import hashlib
 import os
 import re
-from fastapi import UploadFile
-from datetime import datetime
+import tempfile
+import time
+from typing import Optional
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+
+from metrics import UPLOAD_BYTES, UPLOAD_SECONDS
 
 UPLOAD_DIR = "static/uploads"
 
+# Uploads are copied in CHUNK_SIZE pieces so memory stays flat for large videos
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get("UFOBEEP_MAX_UPLOAD_BYTES", 200 * 1024 * 1024))
+# Room in a request body for the multipart boundaries and the other form fields
+FORM_OVERHEAD_BYTES = 64 * 1024
+
 def slugify_filename(name):
     # Replace unsafe characters with underscores
     return re.sub(r'[^a-zA-Z0-9_.-]', '_', name)
 
-async def save_upload_file(file: UploadFile):
+def _write_chunk(buffer, digest, chunk):
+    digest.update(chunk)
+    buffer.write(chunk)
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+async def save_upload_file(file: UploadFile, max_bytes: Optional[int] = None):
+    """Stream an upload to disk and store it under its SHA-256 content hash.
+
+    The same media uploaded twice (e.g. a retry from a flaky connection) is
+    kept once; both calls return the same path.
+    """
+    if max_bytes is None:
+        max_bytes = MAX_UPLOAD_BYTES
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+
+    start = time.perf_counter()
     os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-    # Create timestamped, safe filename
-    clean_name = slugify_filename(file.filename)
-    timestamp = datetime.utcnow().isoformat()
-    filename = f"{timestamp}_{clean_name}"
+    # Keep the client's extension so the file is served with the right type
+    extension = os.path.splitext(slugify_filename(file.filename or ""))[1].lower()
 
-    filepath = os.path.join(UPLOAD_DIR, filename)
+    fd, temp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-", suffix=".part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+                await asyncio.to_thread(_write_chunk, buffer, digest, chunk)
 
-    with open(filepath, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+        filepath = os.path.join(UPLOAD_DIR, f"{digest.hexdigest()}{extension}")
+        if os.path.exists(filepath):
+            _discard(temp_path)
+        else:
+            os.replace(temp_path, filepath)
+    except BaseException:
+        _discard(temp_path)
+        raise
 
+    UPLOAD_BYTES.observe(size)
+    UPLOAD_SECONDS.observe(time.perf_counter() - start)
     return filepath
+
+class UploadSizeLimitMiddleware:
+    """ASGI middleware that rejects request bodies over the upload limit before they are parsed.
+
+    Starlette spools a whole file part to a temporary file before the
+    endpoint runs, so the check in save_upload_file alone would only fire
+    once an oversized upload had been received in full. Here a declared
+    Content-Length over the limit is refused without reading the body, and
+    a chunked or understated body is cut off with a 413 as soon as it
+    passes the limit.
+    """
+
+    def __init__(self, app, max_bytes: Optional[int] = None):
+        self.app = app
+        self.max_bytes = (max_bytes if max_bytes is not None else MAX_UPLOAD_BYTES) + FORM_OVERHEAD_BYTES
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Upload exceeds {self.max_bytes - FORM_OVERHEAD_BYTES} bytes"
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+                return
+
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, receive_limited, send)